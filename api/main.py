@@ -1,22 +1,217 @@
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import os
-from typing import Dict, Any, Optional, List
+import time
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Any, Optional, List, Tuple, Union
 from pathlib import Path
-from src.doc_ingestion.data_ingestion import DocHandler, DocumentComparator, ChatIngestor
+from src.doc_ingestion.data_ingestion import DocHandler, DocumentComparator, ChatIngestor, SharedIndexManager, FaissManager, load_federated_retriever
+from src.doc_ingestion.data_ingestion import INDEX_CACHE_MB, index_cache_stats, index_size_bytes, load_faiss_index
+from src.doc_ingestion.index_jobs import IndexJobQueue
 from src.doc_analyzer.data_analysis import DocumentAnalyzer
 from src.doc_compare.data_comparator import DocumentComparatorLLM
 from src.doc_chat.retrieval import ConversationalRAG
+from model.models import BatchQueryRequest
+from utils.session_janitor import SessionEntry, SessionJanitor
+from utils.blob_store import BlobStore
+from utils.file_io import UploadTooLargeError
+from utils.document_ops import FastAPIFileAdapter
+from utils.metrics import METRICS_ENABLED, HTTP_SECONDS, bind_trace_id, render_latest
+from utils.config_loader import load_config
+from utils.vector_search import AdaptiveTopK
+from utils.llm_governor import llm_context
+from utils.deadline import DEADLINE_HEADER, REQUEST_CANCELLATIONS, Deadline, RequestCancelled, deadline_scope
+from utils.admission import AdmissionController, Overloaded, hold_admission_slot
+from utils.warm_start import SessionUsage, WarmStart, preload_within_budget
+from utils.model_loader import ModelLoader
+from logger import GLOBAL_LOGGER as log
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 FAISS_BASE = os.getenv("FAISS_BASE", "faiss_index")
 UPLOAD_BASE = os.getenv("UPLOAD_BASE", "data")
 FAISS_INDEX_NAME = os.getenv("FAISS_INDEX_NAME", "index")
+FAISS_STORAGE_MODE = os.getenv("FAISS_STORAGE_MODE", "session_dirs")  # "session_dirs" | "shared"
+ANALYSIS_BASE = os.getenv("DATA_STORAGE_PATH", os.path.join("data", "document_analysis"))
+COMPARE_BASE = os.getenv("COMPARE_BASE", os.path.join("data", "document_compare"))
 
-app = FastAPI(title='Document Portal API', version='0.1.0')
+# Content-addressed upload store shared by analyze, compare and chat (dedup + page-text cache)
+BLOB_STORE_ENABLED = os.getenv("BLOB_STORE_ENABLED", "true").lower() == "true"
+
+JANITOR_ENABLED = os.getenv("JANITOR_ENABLED", "true").lower() == "true"
+
+# The blob store, janitor and index job queue create directories and open the job DB,
+# so they are built on first use (the lifespan, or a request) rather than on import.
+@lru_cache(maxsize=1)
+def _blob_store() -> Optional[BlobStore]:
+    return BlobStore(os.path.join(UPLOAD_BASE, "_blobs")) if BLOB_STORE_ENABLED else None
+
+def _drop_shared_session(entry: SessionEntry) -> None:
+    """
+    In shared storage mode a chat session's vectors live in a shard, not in a
+    directory the janitor sees: drop them when its upload directory is evicted.
+    """
+    if FAISS_STORAGE_MODE == "shared" and entry.root == Path(UPLOAD_BASE):
+        removed = SharedIndexManager(FAISS_BASE).drop_session(entry.path.name)
+        if removed is not None:
+            log.info("Shared index session evicted", session_id=entry.path.name, vectors=removed)
+
+@lru_cache(maxsize=1)
+def _janitor() -> SessionJanitor:
+    return SessionJanitor(
+        roots=[UPLOAD_BASE, ANALYSIS_BASE, COMPARE_BASE, FAISS_BASE],
+        state_path=os.path.join(UPLOAD_BASE, ".janitor_state.json"),
+        max_total_bytes=int(float(os.getenv("JANITOR_MAX_GB", "5")) * 1024 ** 3),
+        max_age_seconds=float(os.getenv("JANITOR_MAX_AGE_HOURS", "72")) * 3600,
+        batch_size=int(os.getenv("JANITOR_BATCH_SIZE", "20")),
+        interval_seconds=float(os.getenv("JANITOR_INTERVAL_SECONDS", "60")),
+        blob_store=_blob_store(),
+        on_evict=_drop_shared_session,
+        in_use=lambda: _index_jobs().active_sessions(),  # uploads of queued jobs must survive until they run
+    )
+
+@lru_cache(maxsize=1)
+def _index_jobs() -> IndexJobQueue:
+    return IndexJobQueue(
+        db_path=os.path.join(UPLOAD_BASE, "_jobs", "index_jobs.db"),
+        max_workers=int(os.getenv("INDEX_WORKERS", "2")),
+        per_tenant=int(os.getenv("INDEX_JOBS_PER_TENANT", "1")),
+        blob_store=_blob_store(),
+    )
+
+# /chat/query/batch: request size cap and LLM calls in flight per batch
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+BATCH_QUERY_CONCURRENCY = int(os.getenv("BATCH_QUERY_CONCURRENCY", "8"))
+
+# Per-route concurrency limits, bounded wait queues and RSS-based shedding (config: admission)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# Startup warm-up: shared model clients, hottest sessions' indexes preloaded (config: warm_start)
+WARM_START_ENABLED = os.getenv("WARM_START_ENABLED", "true").lower() == "true"
+warm_start = WarmStart()
+
+@lru_cache(maxsize=1)
+def _warm_start_config() -> Dict[str, Any]:
+    """The warm_start block of config/config.yaml, read on first use (defaults without one: startup must not fail)."""
+    try:
+        return load_config("config/config.yaml").get("warm_start") or {}
+    except FileNotFoundError:
+        return {}
+
+@lru_cache(maxsize=1)
+def _session_usage() -> SessionUsage:
+    """Decayed per-session query counts, persisted for the next process's preload."""
+    return SessionUsage(os.path.join(UPLOAD_BASE, ".session_usage.json"),
+                        half_life_s=float(_warm_start_config().get("half_life_hours", 24)) * 3600)
+
+def _warm_up():
+    """
+    Build the shared LLM/embedding clients, optionally make one warm-up call
+    to each (by default only to local ones: the stub LLM, local embeddings),
+    and preload the indexes of the hottest sessions within the memory budget.
+    """
+    cfg = _warm_start_config()
+    loader = warm_start.step("model_loader", ModelLoader)
+    if loader is None:
+        return warm_start.mark_ready()
+    embeddings = warm_start.step("embeddings", loader.load_embeddings)
+    llm = warm_start.step("llm", loader.load_llm)
+    ping = str(cfg.get("ping", "local"))
+    local_embeddings = type(embeddings).__name__ == "LocalHashingEmbeddings"  # fake mode uses it too
+    if llm is not None and (ping == "always" or (ping == "local" and loader.mode == "fake")):
+        warm_start.step("ping_llm", lambda: llm.invoke("ping"))
+    if embeddings is not None and (ping == "always" or (ping == "local" and local_embeddings)):
+        warm_start.step("ping_embeddings", lambda: embeddings.embed_query("ping"))
+
+    budget = int(float(cfg.get("memory_budget_mb", 256)) * 1024 * 1024)
+    candidates = _session_usage().hottest(int(cfg.get("max_sessions", 50)))
+    if FAISS_STORAGE_MODE == "shared":
+        manager = SharedIndexManager(FAISS_BASE, loader)
+        seen: set = set()
+
+        def size_of(session_id: str) -> int:
+            if not manager.has_session(session_id):
+                raise FileNotFoundError(session_id)
+            shard_dir = manager.shard_dir(session_id)
+            if shard_dir in seen:
+                return 0  # shares a shard with a hotter session
+            seen.add(shard_dir)
+            return sum(f.stat().st_size for f in shard_dir.glob("*") if f.is_file())
+
+        def load(session_id: str):
+            return manager.shard(session_id)
+    else:
+        budget = min(budget, int(INDEX_CACHE_MB * 1024 * 1024))
+
+        def size_of(session_id: str) -> int:
+            return index_size_bytes(os.path.join(FAISS_BASE, session_id))
+
+        def load(session_id: str):
+            return load_faiss_index(os.path.join(FAISS_BASE, session_id), embeddings)
+    preload = warm_start.step("preload", lambda: preload_within_budget(candidates, size_of, load, budget))
+    warm_start.mark_ready(sessions=preload or {})
+
+async def _persist_session_usage():
+    interval = float(_warm_start_config().get("persist_interval_s", 60))
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(_session_usage().save)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _index_jobs().start()
+    janitor = _janitor()  # built here, before requests can race to build it
+    janitor_task = asyncio.create_task(janitor.run_forever()) if JANITOR_ENABLED else None
+    # liveness is served at once; readiness (/health/ready) waits for the warm-up running behind it
+    warm_enabled = WARM_START_ENABLED and _warm_start_config().get("enabled", True)
+    warm_task = asyncio.create_task(asyncio.to_thread(_warm_up)) if warm_enabled else None
+    if not warm_enabled:
+        warm_start.mark_ready()
+    usage_task = asyncio.create_task(_persist_session_usage())
+    yield
+    _index_jobs().shutdown()
+    for task in (janitor_task, warm_task, usage_task):
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    _session_usage().save()
+
+app = FastAPI(title='Document Portal API', version='0.1.0', lifespan=lifespan)
+
+@lru_cache(maxsize=1)
+def _admission() -> Optional[AdmissionController]:
+    """Admission controller from the admission block of config/config.yaml; None when disabled or unconfigured."""
+    if not ADMISSION_ENABLED:
+        return None
+    try:
+        return AdmissionController.from_config(load_config("config/config.yaml").get("admission"))
+    except FileNotFoundError:
+        return None
+
+# Registered before CORS so that shed responses still carry the CORS headers
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """
+    Hold a slot of the route's limiter while the request runs. Excess requests
+    wait in a bounded queue; when it is full, the wait times out, or RSS is
+    over the limit, they get an immediate 503 with Retry-After, before their
+    upload is read.
+    """
+    controller = _admission() if request.method == "POST" else None
+    route = controller.route_for(request.method, request.url.path) if controller else None
+    if route is None:
+        return await call_next(request)
+    try:
+        async with controller.admit(route):  # type: ignore[union-attr]
+            return await call_next(request)
+    except Overloaded as e:
+        return JSONResponse(status_code=503, headers={"Retry-After": str(e.retry_after)},
+                            content={"detail": str(e), "reason": e.reason, "retry_after": e.retry_after})
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +221,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Bind a trace id (client-supplied X-Request-ID or a new one) to every log line
+    of the request, echo it back, and record request latency per route.
+    """
+    trace_id = bind_trace_id(request.headers.get("x-request-id"))
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = trace_id
+        return response
+    finally:
+        if METRICS_ENABLED:
+            route = request.scope.get("route")
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                 route=getattr(route, "path", "unmatched"), status=str(status))
+
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
@@ -34,69 +249,193 @@ async def serve_ui(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/health")
-def health() -> Dict[str, str]:
-    return {"status": "ok", "service": "document-portal"}
+def health() -> Dict[str, Any]:
+    """
+    Liveness: the process is up and serving. Whether it is warmed up is /health/ready.
+    """
+    return {"status": "ok", "service": "document-portal", "ready": warm_start.ready}
+
+@app.get("/health/ready")
+def health_ready() -> JSONResponse:
+    """
+    Readiness: 503 until the startup warm-up (model clients, hot session indexes) has finished.
+    """
+    return JSONResponse(status_code=200 if warm_start.ready else 503,
+                        content={**warm_start.snapshot(), "index_cache": index_cache_stats()})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, error counters, HTTP latency.
+    """
+    return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/storage")
+def storage_footprint() -> Dict[str, Any]:
+    """
+    Disk footprint of session directories as of the janitor's last scan.
+    """
+    return _janitor().footprint()
+
+@app.get("/admin/admission")
+def admission_state() -> Dict[str, Any]:
+    """
+    In-flight and queued requests per route, shed counts by reason and current RSS (autoscaler sizing).
+    """
+    controller = _admission()
+    return controller.snapshot() if controller else {"enabled": False}
+
+def _raise_for_upload(e: Exception):
+    """
+    Surface upload size violations (possibly wrapped in DocumentPortalException) as 413.
+    """
+    err: Optional[BaseException] = e
+    while err is not None:
+        if isinstance(err, UploadTooLargeError):
+            raise HTTPException(status_code=413, detail=str(err)) from e
+        err = err.__cause__
+
+@lru_cache(maxsize=1)
+def _deadline_config() -> Dict[str, Any]:
+    """The deadlines block of config/config.yaml, read on first use."""
+    return load_config("config/config.yaml").get("deadlines") or {}
 
-class FastAPIFileAdapter:
+def _request_deadline(request: Request, route: str) -> Deadline:
     """
-    Adapt FastAPI UploadFile -> .name + .getbuffer() API
+    Deadline from the X-Request-Timeout header (seconds, capped at deadlines.max_s)
+    or deadlines.routes[route]; without either the request can still be cancelled by a disconnect.
     """
-    def __init__(self, uf: UploadFile) -> None:
-        self._uf = uf
-        self.name = uf.filename
+    cfg = _deadline_config()
+    seconds = (cfg.get("routes") or {}).get(route) if cfg.get("enabled", True) else None
+    header = request.headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            seconds = float(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{DEADLINE_HEADER} must be a number of seconds.")
+        if seconds <= 0:
+            raise HTTPException(status_code=400, detail=f"{DEADLINE_HEADER} must be positive.")
+    if seconds and cfg.get("max_s"):
+        seconds = min(float(seconds), float(cfg["max_s"]))
+    return Deadline(float(seconds) if seconds else None)
 
-    def getbuffer(self) -> bytes:
-        self._uf.file.seek(0)
-        return self._uf.file.read()
+async def _run_cancellable(request: Request, route: str, work: Callable[[], Union[Any, Awaitable[Any]]]) -> Any:
+    """
+    Run a request's pipeline under its deadline while watching for the client
+    going away. Sync `work` runs on a worker thread (the event loop stays free
+    to notice disconnects); async `work` runs as a task. On expiry or
+    disconnect the LLM/embedding calls in flight are cancelled, the worker
+    stops at its next step, and the request ends with 504 (deadline) or 499
+    (client closed the request). The request's admission slot stays taken
+    until the worker has actually stopped.
+    """
+    deadline = _request_deadline(request, route)
+    # the admission slot is given back when the work ends, not when this request does
+    release_slot = hold_admission_slot()
+
+    def run_sync():
+        try:
+            return work()
+        finally:
+            release_slot()
+
+    with deadline_scope(deadline):
+        if asyncio.iscoroutinefunction(work):
+            task = asyncio.ensure_future(work())
+            task.add_done_callback(lambda t: release_slot())
+        else:
+            task = asyncio.ensure_future(asyncio.to_thread(run_sync))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())  # an abandoned worker's error is expected
+    poll = float(_deadline_config().get("disconnect_poll_s", 0.25))
+    try:
+        while not task.done():
+            remaining = deadline.remaining()
+            await asyncio.wait({task}, timeout=poll if remaining is None else min(poll, remaining))
+            if task.done() or deadline.cancelled:
+                break
+            if await request.is_disconnected():
+                deadline.cancel("disconnect")
+                break
+        if task.done() and deadline.reason is None:
+            return task.result()
+    finally:
+        if not task.done():
+            deadline.cancel(deadline.reason or "disconnect")  # e.g. the server cancelled this handler
+            task.cancel()
 
-def _read_pdf_via_handler(handler: DocHandler, path: str) -> str:
+    reason = deadline.reason or "deadline"
+    REQUEST_CANCELLATIONS.inc(route=route, reason=reason)
+    log.warning("Request cancelled", route=route, reason=reason,
+                elapsed_s=round(time.monotonic() - deadline.started, 3))
+    raise HTTPException(status_code=504 if reason == "deadline" else 499,
+                        detail=str(RequestCancelled(reason, route)))
+
+def _read_pdf_via_handler(handler: DocHandler, path: str) -> Tuple[List[str], Dict[str, Any]]:
     """
-    Helper function to read PDF using the provided handler.
+    Helper function to read a PDF's page texts and document metadata using the provided handler.
     """
     try:
-        return handler.read_pdf(path)
+        return handler.read_pages(path), handler.read_metadata(path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading PDF: {str(e)}")
     
 @app.post("/analyze")
-async def analyze_documents(file: UploadFile = File(...)) -> Any:
+async def analyze_documents(request: Request, file: UploadFile = File(...), tenant: Optional[str] = Form(None)) -> Any:
     try:
-        dh = DocHandler()
+        dh = DocHandler(data_dir=ANALYSIS_BASE, blob_store=_blob_store())
+        _janitor().touch(dh.session_path)
         save_path = dh.save_pdf(FastAPIFileAdapter(file))
-        text = _read_pdf_via_handler(dh, save_path)
-        analyzer = DocumentAnalyzer()
-        analysis_result = analyzer.analyze_document(text)
+
+        def analyze():
+            pages, pdf_metadata = _read_pdf_via_handler(dh, save_path)
+            analyzer = DocumentAnalyzer()
+            with llm_context(priority="batch", tenant=tenant or dh.session_id):
+                return analyzer.analyze_pages(pages, pdf_metadata)
+
+        analysis_result = await _run_cancellable(request, "analyze", analyze)
         return JSONResponse(content=analysis_result)
     
     except HTTPException:
         raise
 
     except Exception as e:
+        _raise_for_upload(e)
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
     
 @app.post("/compare")
-async def compare_documents(reference: UploadFile = File(...), actual: UploadFile = File(...)) -> Any:
+async def compare_documents(request: Request, reference: UploadFile = File(...), actual: UploadFile = File(...),
+                            tenant: Optional[str] = Form(None)) -> Any:
     try:
-        dc = DocumentComparator()
+        dc = DocumentComparator(base_dir=COMPARE_BASE, blob_store=_blob_store())
+        _janitor().touch(dc.session_path)
         ref_path, act_path = dc.save_uploaded_files(FastAPIFileAdapter(reference), FastAPIFileAdapter(actual))
         _ = ref_path, act_path
-        combined_text = dc.combine_documents()
-        comp = DocumentComparatorLLM()
-        df = comp.compare_documents(combined_text)
+
+        def compare():
+            combined_text = dc.combine_documents()
+            comp = DocumentComparatorLLM()
+            with llm_context(priority="batch", tenant=tenant or dc.session_id):
+                return comp.compare_documents(combined_text)
+
+        df = await _run_cancellable(request, "compare", compare)
         return {"rows": df.to_dict(orient='records'), 'session_id': dc.session_id}
     except HTTPException:
         raise
     except Exception as e:
+        _raise_for_upload(e)
         raise HTTPException(status_code=500, detail=f"Comparison failed: {str(e)}")
     
 @app.post("/chat/index")
 async def chat_build_index(
+    request: Request,
     files: List[UploadFile] = File(...),
     session_id: Optional[str] = Form(None),
     use_session_dirs: bool = Form(True),
     chunk_size: int = Form(1000),
     chunk_overlap: int = Form(100),
-    k: int = Form(5)
+    k: int = Form(5),
+    async_mode: bool = Form(False),
+    tenant: Optional[str] = Form(None)
 ) -> Any:
     try:
         wrapped = [FastAPIFileAdapter(f) for f in files]
@@ -104,47 +443,227 @@ async def chat_build_index(
             temp_base = UPLOAD_BASE,
             faiss_base = FAISS_BASE,
             use_session_dirs = use_session_dirs,
-            session_id = session_id or None
+            session_id = session_id or None,
+            storage_mode = FAISS_STORAGE_MODE,
+            blob_store = _blob_store()
         )
-        ci.build_retriever(wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k)
+        _janitor().touch(ci.temp_dir, ci.faiss_dir)
+
+        if async_mode:
+            # uploads must be on disk before the request ends; the rest runs on the job pool
+            paths = ci.save_uploads(wrapped)
+            job_id = _index_jobs().submit(ci.session_id, {
+                "paths": [str(p) for p in paths],
+                "temp_base": UPLOAD_BASE,
+                "faiss_base": FAISS_BASE,
+                "use_session_dirs": use_session_dirs,
+                "storage_mode": FAISS_STORAGE_MODE,
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "k": k,
+            }, tenant=tenant)
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id, "status": "queued", "session_id": ci.session_id,
+                "k": k, "use_session_dirs": use_session_dirs,
+            })
+
+        await _run_cancellable(request, "chat_index", lambda: ci.build_retriever(
+            wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k))
         return {"session_id": ci.session_id, "k": k, "use_session_dirs": use_session_dirs}
     except HTTPException:
         raise
     except Exception as e:
+        _raise_for_upload(e)
         raise HTTPException(status_code=500, detail=f"Indexing failed: {str(e)}")
     
+@app.get("/chat/index/{job_id}")
+def chat_index_status(job_id: str) -> Any:
+    status = _index_jobs().status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Index job not found: {job_id}")
+    return status
+
+@app.delete("/chat/index/{session_id}/documents/{document_id}")
+def chat_delete_document(session_id: str, document_id: str) -> Any:
+    """
+    Remove one document (by its saved file name) from a session index without a rebuild.
+    """
+    try:
+        if FAISS_STORAGE_MODE == "shared":
+            removed = SharedIndexManager(FAISS_BASE).delete_document(session_id, document_id)
+        else:
+            index_dir = os.path.join(FAISS_BASE, session_id)
+            if not os.path.isdir(index_dir):
+                raise HTTPException(status_code=404, detail=f"Index directory not found: {index_dir}")
+            removed = FaissManager(Path(index_dir)).delete_document(document_id)
+        if removed is None:
+            raise HTTPException(status_code=404, detail=f"Document not found in session {session_id}: {document_id}")
+
+        upload = Path(UPLOAD_BASE) / session_id / Path(document_id).name
+        upload.unlink(missing_ok=True)
+        _janitor().touch(Path(UPLOAD_BASE) / session_id, os.path.join(FAISS_BASE, session_id))
+        return {"session_id": session_id, "document_id": document_id, "chunks_removed": removed}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Document deletion failed: {str(e)}")
+
+def _session_list(session_id: Optional[str], session_ids: Optional[List[str]]) -> List[str]:
+    """
+    session_id plus session_ids (repeated fields or comma-separated), de-duplicated in order.
+    """
+    raw = ([session_id] if session_id else []) + [p for s in (session_ids or []) for p in s.split(",")]
+    return list(dict.fromkeys(s.strip() for s in raw if s and s.strip()))
+
+def _sources(docs, session_id: Optional[str]) -> List[Dict[str, Any]]:
+    return [{
+        "session_id": d.metadata.get("session_id", session_id),
+        "source": Path(str(d.metadata.get("source", "unknown"))).name,
+        "page": d.metadata.get("page"),
+        "section": d.metadata.get("section_path"),
+        "score": d.metadata.get("score"),
+    } for d in docs]
+
+@lru_cache(maxsize=1)
+def _retriever_config() -> Tuple[int, Optional[AdaptiveTopK]]:
+    """retriever.top_k and the adaptive top-k policy from config/config.yaml, read on first use."""
+    block = load_config("config/config.yaml").get("retriever") or {}
+    return int(block.get("top_k", 5)), AdaptiveTopK.from_config(block.get("adaptive"))
+
+def _resolve_k(k: Optional[int]) -> int:
+    """Requested k, or retriever.top_k when the request does not send one."""
+    if k is None:
+        return _retriever_config()[0]
+    if k < 1:
+        raise HTTPException(status_code=400, detail="k must be at least 1.")
+    return k
+
+def _load_federated_rag(session_ids: List[str], k: int, policy: Optional[AdaptiveTopK]) -> ConversationalRAG:
+    """
+    ConversationalRAG over several sessions: one query embedding, all indexes searched in parallel.
+    """
+    if FAISS_STORAGE_MODE == "shared":
+        manager = SharedIndexManager(FAISS_BASE)
+        missing = [s for s in session_ids if not manager.has_session(s)]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Sessions not found in shared index: {missing}")
+        _janitor().touch(*(Path(UPLOAD_BASE) / s for s in session_ids))  # keeps their shard vectors from eviction
+        retriever = manager.federated_retriever(session_ids, k=k, policy=policy)
+    else:
+        index_dirs = [os.path.join(FAISS_BASE, s) for s in session_ids]
+        missing = [d for d in index_dirs if not os.path.isdir(d)]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Index directories not found: {missing}")
+        _janitor().touch(*index_dirs)
+        retriever = load_federated_retriever(FAISS_BASE, session_ids, k=k, policy=policy)
+    return ConversationalRAG(session_id=",".join(session_ids), retriever=retriever)
+
+def _load_rag(session_id: Optional[str], use_session_dirs: bool, session_ids: Optional[List[str]] = None,
+              k: int = 5) -> ConversationalRAG:
+    """
+    ConversationalRAG bound to a session's index (shared shard or per-session FAISS dir),
+    or federated over several sessions when more than one is given. Retrieval
+    fetches up to `k` chunks, trimmed by the adaptive top-k policy when enabled.
+    """
+    policy = _retriever_config()[1]
+    sessions = _session_list(session_id, session_ids)
+    _session_usage().record(*sessions)
+    if use_session_dirs and len(sessions) > 1:
+        return _load_federated_rag(sessions, k, policy)
+    session_id = sessions[0] if sessions else None
+    if use_session_dirs and not session_id:
+        raise HTTPException(status_code=400, detail="Session ID is required when using session directories.")
+
+    if use_session_dirs and FAISS_STORAGE_MODE == "shared":
+        manager = SharedIndexManager(FAISS_BASE)
+        if not manager.has_session(session_id): # type: ignore
+            raise HTTPException(status_code=404, detail=f"Session not found in shared index: {session_id}")
+        _janitor().touch(Path(UPLOAD_BASE) / session_id)  # type: ignore
+        return ConversationalRAG(session_id=session_id, retriever=manager.as_retriever(session_id, k=k, policy=policy)) # type: ignore
+
+    #Prepare faiss index path
+    index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE #type: ignore
+    if not os.path.isdir(index_dir):
+        raise HTTPException(status_code=404, detail=f"Index directory not found: {index_dir}")
+    _janitor().touch(index_dir)
+
+    #Initialize LCEL-style RAG pipeline
+    rag = ConversationalRAG(session_id=session_id) # type: ignore
+    rag.load_retriever_from_faiss(index_dir, k=k, policy=policy)
+    return rag
+
 @app.post("/chat/query")
 async def chat_query(
+    request: Request,
     query: str = Form(...),
     session_id: Optional[str] = Form(None),
     use_session_dirs: bool = Form(True),
-    k: int = Form(5)
+    k: Optional[int] = Form(None),
+    session_ids: Optional[List[str]] = Form(None),
+    tenant: Optional[str] = Form(None)
     ) -> Any:
     try:
-        if use_session_dirs and not session_id:
-            raise HTTPException(status_code=400, detail="Session ID is required when using session directories.")
+        k = _resolve_k(k)
 
-        #Prepare faiss index path
-        index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE #type: ignore
-        if not os.path.isdir(index_dir):
-            raise HTTPException(status_code=404, detail=f"Index directory not found: {index_dir}")
-        
-        #Initialize LCEL-style RAG pipeline
-        rag = ConversationalRAG(session_id=session_id) # type: ignore
-        rag.load_retriever_from_faiss(index_dir)
+        def answer():
+            rag = _load_rag(session_id, use_session_dirs, session_ids, k=k)
+            #optional for now we pass empty chat history
+            with llm_context(priority="interactive", tenant=tenant or rag.session_id):
+                return rag.invoke_with_sources(query, chat_history=[])
 
-        #optional for now we pass empty chat history
-        response = rag.invoke(query, chat_history=[])
+        response, docs = await _run_cancellable(request, "chat_query", answer)
 
         return {
             "answer": response,
             "session_id": session_id,
+            "session_ids": _session_list(session_id, session_ids),
             "k": k,
+            "sources": _sources(docs, session_id),
             "engine": "LCEL-RAG"
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+
+@app.post("/chat/query/batch")
+async def chat_query_batch(request: BatchQueryRequest, http_request: Request) -> Any:
+    """
+    Many questions against one session: one index load, one batched embedding
+    call, one multi-vector search, then answers generated concurrently
+    (BATCH_QUERY_CONCURRENCY). Results are in input order; failed items carry
+    an "error" instead of an "answer".
+    """
+    try:
+        if not request.questions:
+            raise HTTPException(status_code=400, detail="At least one question is required.")
+        if len(request.questions) > BATCH_MAX_QUESTIONS:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch.")
+        k = _resolve_k(request.k)
+        start = time.perf_counter()
+
+        async def answer_all():
+            # the index load is blocking: off the event loop, and under the deadline/disconnect watch
+            rag = await asyncio.to_thread(_load_rag, request.session_id, request.use_session_dirs,
+                                          request.session_ids, k=k)
+            with llm_context(priority="batch", tenant=request.tenant or rag.session_id):
+                return await rag.ainvoke_batch(request.questions, k=k, max_concurrency=BATCH_QUERY_CONCURRENCY)
+
+        results = await _run_cancellable(http_request, "chat_query_batch", answer_all)
+        elapsed = time.perf_counter() - start
+        return {
+            "session_id": request.session_id,
+            "k": k,
+            "results": results,
+            "count": len(results),
+            "errors": sum(1 for r in results if "error" in r),
+            "seconds": round(elapsed, 3),
+            "questions_per_second": round(len(results) / elapsed, 2) if elapsed > 0 else None,
+            "engine": "LCEL-RAG",
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch query failed: {str(e)}")
     
 # python -m uvicorn main:app --reload
\ No newline at end of file
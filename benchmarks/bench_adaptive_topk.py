@@ -0,0 +1,119 @@
+"""
+Adaptive top-k vs. fixed top-k: context size and whether the relevant chunk survives.
+
+Offline (MODEL_PROVIDER=fake) in a scratch working directory. One generated
+PDF is indexed, then the same questions are retrieved with the adaptive policy
+disabled (always `k` chunks) and enabled (config `retriever.adaptive`, with
+--relative-drop / --token-budget / --min-k overrides). Reports chunks per
+query, estimated context tokens per query, the share of tokens saved, a hit
+rate (some returned chunk mentions the asked topic and region) and
+/chat/query p50 latency.
+
+Usage:
+    python benchmarks/bench_adaptive_topk.py --pages 50 --queries 100 --k 10
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import TOPICS, make_pdf  # noqa: E402
+
+
+def _write_retriever_config(path: Path, k: int, adaptive: dict):
+    config = yaml.safe_load(path.read_text())
+    config["retriever"] = {"top_k": k, "adaptive": adaptive}
+    path.write_text(yaml.safe_dump(config))
+
+
+def run_mode(api, client, session_id: str, questions, k: int) -> dict:
+    from utils.vector_search import estimate_tokens
+
+    api._retriever_config.cache_clear()
+    retriever = api._load_rag(session_id, True, k=k).retriever
+    chunks, tokens, hits = [], [], 0
+    for question, topic, region in questions:
+        docs = retriever.invoke(question)
+        chunks.append(len(docs))
+        tokens.append(sum(estimate_tokens(d.page_content) for d in docs))
+        hits += any(topic in d.page_content and f"region {region}." in d.page_content for d in docs)
+
+    latencies = []
+    for question, _, _ in questions:
+        t0 = time.perf_counter()
+        client.post("/chat/query", data={"query": question, "session_id": session_id}).raise_for_status()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return {
+        "avg_chunks": round(statistics.mean(chunks), 2),
+        "avg_context_tokens": round(statistics.mean(tokens), 1),
+        "hit_rate": round(hits / len(questions), 3),
+        "query_p50_ms": round(statistics.median(latencies), 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", type=int, default=50)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--min-k", type=int, default=2)
+    ap.add_argument("--relative-drop", type=float, default=0.15)
+    ap.add_argument("--token-budget", type=int, default=3000)
+    ap.add_argument("--storage-mode", choices=["session_dirs", "shared"], default="session_dirs")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    config_path = Path(tmp) / "config" / "config.yaml"
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", JANITOR_ENABLED="false", FAISS_STORAGE_MODE=args.storage_mode)
+
+    from fastapi.testclient import TestClient
+    import api.main as api
+
+    questions = []
+    for i in range(args.queries):
+        topic, region = TOPICS[i % len(TOPICS)], (i * 7) % 40
+        questions.append((f"How did {topic} move in region {region}?", topic, region))
+
+    adaptive = {"enabled": True, "min_k": args.min_k, "min_similarity": None,
+                "relative_drop": args.relative_drop, "token_budget": args.token_budget}
+    results = {}
+    try:
+        with TestClient(api.app) as client:
+            r = client.post("/chat/index", files=[("files", ("corpus.pdf", io.BytesIO(make_pdf(args.pages)),
+                                                             "application/pdf"))])
+            r.raise_for_status()
+            session_id = r.json()["session_id"]
+
+            _write_retriever_config(config_path, args.k, {"enabled": False})
+            results["fixed"] = run_mode(api, client, session_id, questions, args.k)
+            _write_retriever_config(config_path, args.k, adaptive)
+            results["adaptive"] = run_mode(api, client, session_id, questions, args.k)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    fixed, adapt = results["fixed"]["avg_context_tokens"], results["adaptive"]["avg_context_tokens"]
+    print(json.dumps({
+        "pages": args.pages, "queries": len(questions), "k": args.k, "policy": adaptive,
+        **results,
+        "tokens_saved_pct": round(100 * (1 - adapt / fixed), 1) if fixed else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Burst of /analyze requests: unlimited admission vs. per-route limits with load shedding.
+
+Offline (MODEL_PROVIDER=fake) in a scratch working directory. --burst
+distinct PDFs are posted to /analyze at once (in-process ASGI client); each
+analysis makes LLM calls of --llm-latency-ms. Modes:
+  unlimited  ADMISSION_ENABLED=false: every request is accepted and they
+             all compete for the worker threads and the LLM
+  admission  analyze limited to --concurrency running plus --max-queue
+             waiting (--max-wait-s each); the rest get 503 + Retry-After
+Reports statuses, latency of the accepted requests (p50/p99), time to the
+503s, peak RSS growth and the shed/queued counts from /admin/admission.
+
+Usage:
+    python benchmarks/bench_admission.py --burst 24 --concurrency 2 --max-queue 4 --llm-latency-ms 300
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import _pct, make_pdf  # noqa: E402
+
+
+def _write_config(args):
+    import yaml
+    path = Path("config/config.yaml")
+    cfg = yaml.safe_load(path.read_text())
+    cfg["admission"]["routes"]["analyze"].update(max_concurrent=args.concurrency, max_queue=args.max_queue,
+                                                 max_wait_s=args.max_wait_s)
+    path.write_text(yaml.safe_dump(cfg, sort_keys=False))
+
+
+async def _burst(app, pdfs) -> list:
+    import httpx
+    from utils.admission import current_rss_bytes
+
+    peak = {"rss": current_rss_bytes()}
+
+    async def sample():
+        while True:
+            peak["rss"] = max(peak["rss"], current_rss_bytes())
+            await asyncio.sleep(0.02)
+
+    async def one(client, pdf):
+        t0 = time.perf_counter()
+        r = await client.post("/analyze", files={"file": ("doc.pdf", pdf, "application/pdf")})
+        return r.status_code, (time.perf_counter() - t0) * 1000, r.headers.get("retry-after")
+
+    sampler = asyncio.create_task(sample())
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=600) as client:
+        results = await asyncio.gather(*(one(client, pdf) for pdf in pdfs))
+        state = (await client.get("/admin/admission")).json()
+    sampler.cancel()
+    return [results, peak["rss"], state]
+
+
+def run_mode(mode: str, args, pdfs) -> dict:
+    from utils.admission import current_rss_bytes
+    os.environ["ADMISSION_ENABLED"] = "true" if mode == "admission" else "false"
+    import api.main as api
+    api = importlib.reload(api)  # re-reads ADMISSION_ENABLED and the admission config
+
+    rss0 = current_rss_bytes()
+    t0 = time.perf_counter()
+    results, peak_rss, state = asyncio.run(_burst(api.app, pdfs))
+    wall = time.perf_counter() - t0
+    ok = [ms for status, ms, _ in results if status == 200]
+    shed = [ms for status, ms, _ in results if status == 503]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    analyze = (state.get("routes") or {}).get("analyze", {})
+    return {
+        "mode": mode,
+        "statuses": statuses,
+        "accepted_p50_ms": round(statistics.median(ok), 1) if ok else None,
+        "accepted_p99_ms": round(_pct(ok, 0.99), 1) if ok else None,
+        "shed_p50_ms": round(statistics.median(shed), 1) if shed else None,
+        "retry_after_s": sorted({int(ra) for status, _, ra in results if status == 503 and ra}),
+        "burst_wall_s": round(wall, 2),
+        "peak_rss_growth_mb": round((peak_rss - rss0) / 2 ** 20, 1),
+        "shed_by_reason": analyze.get("shed"),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--burst", type=int, default=24)
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=2)
+    ap.add_argument("--max-queue", type=int, default=4)
+    ap.add_argument("--max-wait-s", type=float, default=5.0)
+    ap.add_argument("--llm-latency-ms", type=float, default=300.0)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", JANITOR_ENABLED="false", FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms))
+    try:
+        _write_config(args)
+        rows = []
+        for mode in ("unlimited", "admission"):
+            pdfs = [make_pdf(args.pages, variant=len(rows) * args.burst + i) for i in range(args.burst)]
+            rows.append(run_mode(mode, args, pdfs))
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({"burst": args.burst, "llm_latency_ms": args.llm_latency_ms,
+                      "analyze_limits": {"max_concurrent": args.concurrency, "max_queue": args.max_queue,
+                                         "max_wait_s": args.max_wait_s},
+                      "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
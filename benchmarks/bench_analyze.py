@@ -0,0 +1,103 @@
+"""
+/analyze cost: full-LLM metadata extraction vs. the hybrid pipeline.
+
+Offline (MODEL_PROVIDER=fake) in a scratch working directory. For each page
+count a PDF with document properties set is generated, then analyzed
+--repeats times per mode:
+  llm      analysis.mode "llm": the whole text goes to the LLM for every field
+  hybrid   metadata from the PDF, Language detected locally, only Summary and
+           SentimentTone from the LLM over a page sample
+The stub LLM sleeps --llm-latency-ms per call plus --ms-per-1k-tokens per
+~1000 prompt tokens, so latency tracks prompt size the way a hosted model's
+does. Reports estimated prompt tokens, median latency per analysis, and
+whether the hybrid fields match the PDF's properties.
+
+Usage:
+    python benchmarks/bench_analyze.py --pages 5 40 200 --llm-latency-ms 300 --ms-per-1k-tokens 40
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import make_pdf  # noqa: E402
+
+PROPERTIES = {"title": "Quarterly Operations Review", "author": "Finance Team",
+              "creationDate": "D:20240115093000+01'00'", "modDate": "D:20240320170000+01'00'"}
+
+
+def _write_pdf(path: Path, pages: int):
+    import fitz
+    with fitz.open(stream=make_pdf(pages), filetype="pdf") as doc:
+        doc.set_metadata(PROPERTIES)
+        doc.save(path)
+
+
+def run_mode(mode: str, path: Path, repeats: int) -> dict:
+    from src.doc_analyzer.data_analysis import DocumentAnalyzer, PROMPT_TOKENS
+    from src.doc_ingestion.data_ingestion import DocHandler
+
+    analyzer = DocumentAnalyzer()
+    analyzer.settings = {**analyzer.settings, "mode": mode}
+    handler = DocHandler(data_dir="data/document_analysis")
+    latencies, tokens_before = [], PROMPT_TOKENS.value(component="analyze")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = analyzer.analyze_pages(handler.read_pages(str(path)), handler.read_metadata(str(path)))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return {
+        "prompt_tokens": int((PROMPT_TOKENS.value(component="analyze") - tokens_before) / repeats),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "title": result["Title"], "author": result["Author"], "page_count": result["PageCount"],
+        "language": result["Language"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", type=int, nargs="+", default=[5, 40, 200])
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--llm-latency-ms", type=float, default=300.0)
+    ap.add_argument("--ms-per-1k-tokens", type=float, default=40.0)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+                      FAKE_LLM_MS_PER_1K_TOKENS=str(args.ms_per_1k_tokens))
+    rows = []
+    try:
+        for pages in args.pages:
+            path = Path(tmp) / f"doc_{pages}.pdf"
+            _write_pdf(path, pages)
+            llm, hybrid = run_mode("llm", path, args.repeats), run_mode("hybrid", path, args.repeats)
+            rows.append({
+                "pages": pages,
+                "llm": {k: llm[k] for k in ("prompt_tokens", "p50_ms")},
+                "hybrid": hybrid,
+                "token_reduction_pct": round(100 * (1 - hybrid["prompt_tokens"] / llm["prompt_tokens"]), 1),
+                "latency_reduction_pct": round(100 * (1 - hybrid["p50_ms"] / llm["p50_ms"]), 1),
+                "metadata_matches_pdf": hybrid["title"] == PROPERTIES["title"] and hybrid["author"] == PROPERTIES["author"]
+                                        and hybrid["page_count"] == pages,
+            })
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({"llm_latency_ms": args.llm_latency_ms, "ms_per_1k_tokens": args.ms_per_1k_tokens,
+                      "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Questions per second: N sequential /chat/query calls vs. one /chat/query/batch.
+
+Runs offline (MODEL_PROVIDER=fake: hash embeddings, stub LLM with
+--llm-latency-ms per call) in a scratch working directory. One generated PDF
+is indexed, then the same questions are asked both ways. The sequential path
+pays, per question, an index load, a rewrite LLM call, one embedding and one
+search; the batch path loads once, embeds and searches all questions in one
+call each, and runs answer generation with BATCH_QUERY_CONCURRENCY in flight.
+
+Usage:
+    python benchmarks/bench_batch_query.py --questions 200 --llm-latency-ms 50 --concurrency 8
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import TOPICS, make_pdf  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--questions", type=int, default=200)
+    ap.add_argument("--pages", type=int, default=50)
+    ap.add_argument("--llm-latency-ms", type=float, default=50.0)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--storage-mode", choices=["session_dirs", "shared"], default="session_dirs")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", JANITOR_ENABLED="false", FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+                      BATCH_QUERY_CONCURRENCY=str(args.concurrency), FAISS_STORAGE_MODE=args.storage_mode)
+
+    from fastapi.testclient import TestClient
+    import api.main as api
+
+    questions = [f"How did {TOPICS[i % len(TOPICS)]} move in region {i % 40}?" for i in range(args.questions)]
+    try:
+        with TestClient(api.app) as client:
+            r = client.post("/chat/index", files=[("files", ("corpus.pdf", io.BytesIO(make_pdf(args.pages)),
+                                                             "application/pdf"))])
+            r.raise_for_status()
+            session_id = r.json()["session_id"]
+
+            t0 = time.perf_counter()
+            for q in questions:
+                client.post("/chat/query", data={"query": q, "session_id": session_id}).raise_for_status()
+            sequential = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            r = client.post("/chat/query/batch", json={"session_id": session_id, "questions": questions})
+            batch = time.perf_counter() - t0
+            r.raise_for_status()
+            body = r.json()
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({
+        "questions": len(questions), "llm_latency_ms": args.llm_latency_ms, "concurrency": args.concurrency,
+        "storage_mode": args.storage_mode,
+        "sequential": {"seconds": round(sequential, 3), "qps": round(len(questions) / sequential, 2)},
+        "batch": {"seconds": round(batch, 3), "qps": round(len(questions) / batch, 2),
+                  "server_qps": body["questions_per_second"], "errors": body["errors"]},
+        "speedup": round(sequential / batch, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Repeat uploads of the same PDF through analyze, compare and chat, with and
+without the content-addressed BlobStore.
+
+For each mode the same document is uploaded `--repeats` times to each endpoint's
+save + extract path (DocHandler, DocumentComparator, chat load_documents).
+Reports physical disk usage (unique inodes) and save+extract time.
+
+Usage:
+    python benchmarks/bench_blob_store.py --pages 200 --repeats 10
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import fitz  # noqa: E402
+from utils.blob_store import BlobStore  # noqa: E402
+from utils.document_ops import load_documents  # noqa: E402
+from utils.file_io import save_uploads  # noqa: E402
+from src.doc_ingestion.data_ingestion import DocHandler, DocumentComparator  # noqa: E402
+
+
+class _Upload(io.BytesIO):
+    """Streamlit-like upload: file-like with a .name."""
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+def make_pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        body = "\n".join(f"Section {i}.{j}: revenue grew {j * 3}% against plan in region {j}." for j in range(40))
+        page.insert_text((50, 60), body, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def disk_usage(root: Path) -> int:
+    seen, total = set(), 0
+    for dirpath, _, files in os.walk(root):
+        for f in files:
+            st = os.lstat(os.path.join(dirpath, f))
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_size
+    return total
+
+
+def run(pdf: bytes, repeats: int, use_store: bool) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        store = BlobStore(base / "_blobs") if use_store else None
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            dh = DocHandler(data_dir=str(base / "document_analysis"), blob_store=store)
+            dh.read_pdf(dh.save_pdf(_Upload(pdf, "report.pdf")))
+
+            dc = DocumentComparator(base_dir=str(base / "document_compare"), blob_store=store)
+            dc.save_uploaded_files(_Upload(pdf, "reference.pdf"), _Upload(pdf, "actual.pdf"))
+            dc.combine_documents()
+
+            chat_dir = base / "chat" / f"s{_}"
+            if store is not None:
+                paths = [store.put(_Upload(pdf, "report.pdf"), chat_dir / "report.pdf").path]
+            else:
+                paths = [u.path for u in save_uploads([_Upload(pdf, "report.pdf")], chat_dir)]
+            load_documents(paths, store)
+        elapsed = time.perf_counter() - t0
+        out = {"seconds": round(elapsed, 3), "disk_bytes": disk_usage(base)}
+        if store is not None:
+            out["store"] = store.footprint()
+        return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--repeats", type=int, default=10)
+    args = ap.parse_args()
+
+    pdf = make_pdf(args.pages)
+    baseline = run(pdf, args.repeats, use_store=False)
+    blob = run(pdf, args.repeats, use_store=True)
+    print(json.dumps({
+        "pdf_bytes": len(pdf), "pages": args.pages, "uploads": args.repeats * 4,
+        "copies": baseline, "blob_store": blob,
+        "disk_saved_pct": round(100 * (1 - blob["disk_bytes"] / baseline["disk_bytes"]), 1),
+        "time_saved_pct": round(100 * (1 - blob["seconds"] / baseline["seconds"]), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Repeated header/footer boilerplate: plain page text vs. boilerplate stripped before chunking.
+
+Offline. A corpus of --docs "corporate" PDFs (letterhead, confidentiality
+footer and "Page i of n" on every page, one distinctive fact per body
+paragraph) is extracted both ways:
+  plain      PyMuPDF get_text(), what was embedded before
+  stripped   utils.boilerplate.strip_boilerplate over the page blocks
+then split like ChatIngestor._split (1000/200), embedded with the
+fake-mode hashing embeddings into FAISS and queried once per fact.
+Reports chunks, embedded characters, the analysis/compare prompt size
+(~chars/4 tokens), extraction time and retrieval hit rate@k / MRR (the
+chunk of the fact's page ranked within k).
+
+Usage:
+    python benchmarks/bench_boilerplate.py --docs 8 --pages 12 --k 4
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import TOPICS  # noqa: E402
+
+REGIONS = ["north", "south", "east", "west", "central", "coastal", "alpine", "metro"]
+LETTERHEAD = "Northwind Holdings plc  |  Finance & Strategy Division\nQuarterly Operating Review FY2024  |  Ref. NWH-QOR-{doc:03d}"
+FOOTER = ("CONFIDENTIAL - internal use only. Distribution outside Northwind Holdings is prohibited.\n"
+          "Page {page} of {pages}  |  Printed 2024-{month:02d}-14")
+
+
+def make_corporate_pdf(doc_no: int, pages: int, rng: random.Random):
+    """PDF bytes plus the (question, page) facts it contains."""
+    import fitz
+    pdf, facts = fitz.open(), []
+    for p in range(pages):
+        page = pdf.new_page()
+        page.insert_text((50, 40), LETTERHEAD.format(doc=doc_no), fontsize=9)
+        lines = []
+        for j in range(3):
+            topic, region = rng.choice(TOPICS), rng.choice(REGIONS)
+            value, code = rng.randint(100, 999), f"{doc_no}-{p}-{j}"
+            lines += [f"Item {code}: the {topic} figure for the {region} region reached {value} units,",
+                      f"driven by programme {code} and reviewed by the {region} {topic} committee."]
+            facts.append((f"What did the {topic} figure for the {region} region reach under programme {code}?", p))
+            lines += [f"Filler sentence {k} repeats general commentary on operations and outlook." for k in range(6)]
+        page.insert_text((50, 110), "\n".join(lines), fontsize=9)
+        page.insert_text((50, 800), FOOTER.format(page=p + 1, pages=pages, month=p % 12 + 1), fontsize=7)
+    data = pdf.tobytes()
+    pdf.close()
+    return data, facts
+
+
+def run_mode(mode: str, corpus, args) -> dict:
+    import fitz
+    from langchain_core.documents import Document
+    from langchain_community.vectorstores import FAISS
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from utils.boilerplate import page_blocks, strip_boilerplate
+    from utils.local_embeddings import LocalHashingEmbeddings
+
+    docs, t_extract = [], 0.0
+    for doc_no, (data, _) in enumerate(corpus):
+        t0 = time.perf_counter()
+        with fitz.open(stream=data, filetype="pdf") as pdf:
+            if mode == "plain":
+                pages = [pdf.load_page(i).get_text() for i in range(pdf.page_count)]
+            else:
+                pages = strip_boilerplate([page_blocks(pdf.load_page(i)) for i in range(pdf.page_count)])
+        t_extract += time.perf_counter() - t0
+        docs += [Document(page_content=text, metadata={"source": f"doc{doc_no}", "page": i})
+                 for i, text in enumerate(pages)]
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_documents(docs)
+    embeddings = LocalHashingEmbeddings(n_features=256, ngram_range=(1, 1), token_pattern=r"\w+")  # as MODEL_PROVIDER=fake
+    store = FAISS.from_documents(chunks, embeddings)
+
+    hits, rr, questions = 0, 0.0, 0
+    for doc_no, (_, facts) in enumerate(corpus):
+        for question, page in facts:
+            questions += 1
+            found = store.similarity_search(question, k=args.k)
+            for rank, chunk in enumerate(found, 1):
+                if chunk.metadata["source"] == f"doc{doc_no}" and chunk.metadata["page"] == page:
+                    hits += 1
+                    rr += 1 / rank
+                    break
+    prompt_chars = sum(len(d.page_content) for d in docs)
+    return {
+        "mode": mode,
+        "chunks": len(chunks),
+        "embedded_chars": sum(len(c.page_content) for c in chunks),
+        "prompt_tokens_est": prompt_chars // 4,
+        "extract_ms_per_doc": round(t_extract / len(corpus) * 1000, 2),
+        f"hit_rate_at_{args.k}": round(hits / questions, 3),
+        "mrr": round(rr / questions, 3),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=8)
+    ap.add_argument("--pages", type=int, default=12)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [make_corporate_pdf(d, args.pages, rng) for d in range(args.docs)]
+    rows = [run_mode(mode, corpus, args) for mode in ("plain", "stripped")]
+    plain, stripped = rows
+    print(json.dumps({"docs": args.docs, "pages_per_doc": args.pages, "results": rows,
+                      "chunk_reduction_pct": round(100 * (1 - stripped["chunks"] / plain["chunks"]), 1),
+                      "embedded_chars_reduction_pct":
+                          round(100 * (1 - stripped["embedded_chars"] / plain["embedded_chars"]), 1)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
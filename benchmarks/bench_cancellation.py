@@ -0,0 +1,126 @@
+"""
+Work done for requests nobody is waiting for: run-to-completion vs. deadline/disconnect cancellation.
+
+Offline (MODEL_PROVIDER=fake) in a scratch working directory: a session is
+indexed, then --requests chat queries (rewrite + answer, two LLM calls of
+--llm-latency-ms each) run through api.main._run_cancellable with a client
+stand-in that disconnects after --disconnect-after-ms:
+  run_to_completion  the pipeline called directly, as before: it finishes
+                     although the client is gone
+  disconnect         the client disconnects; in-flight LLM calls are cancelled
+  deadline           no disconnect, X-Request-Timeout of --deadline-ms instead
+Reports the handler's response time, how long the worker kept computing
+(the compute that is saved), and the LLM calls/tokens cancelled.
+
+Usage:
+    python benchmarks/bench_cancellation.py --requests 10 --llm-latency-ms 800 --disconnect-after-ms 300
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import make_pdf  # noqa: E402
+
+
+class _Client:
+    """What _run_cancellable needs from a starlette Request: headers and is_disconnected()."""
+    def __init__(self, disconnect_after_s: float | None = None, timeout_s: float | None = None):
+        self.headers = {"X-Request-Timeout": str(timeout_s)} if timeout_s else {}
+        self._gone_at = time.monotonic() + disconnect_after_s if disconnect_after_s is not None else None
+
+    async def is_disconnected(self) -> bool:
+        return self._gone_at is not None and time.monotonic() >= self._gone_at
+
+
+def run_mode(mode: str, args) -> dict:
+    import api.main as api
+    from fastapi import HTTPException
+    from utils.deadline import CANCELLED_LLM_CALLS, CANCELLED_LLM_TOKENS
+
+    before = {w: (CANCELLED_LLM_CALLS.value(when=w), CANCELLED_LLM_TOKENS.value(when=w)) for w in ("before", "in_flight")}
+    handler_ms, busy_ms, statuses = [], [], {}
+    for i in range(args.requests):
+        finished = {}
+
+        def work():
+            try:
+                rag = api._load_rag("bench", True, k=5)
+                return rag.invoke_with_sources(f"What does section {i} say about revenue?", chat_history=[])
+            finally:
+                finished["at"] = time.perf_counter()
+
+        t0 = time.perf_counter()
+        if mode == "run_to_completion":
+            work()
+            status = 200
+        else:
+            client = (_Client(disconnect_after_s=args.disconnect_after_ms / 1000) if mode == "disconnect"
+                      else _Client(timeout_s=args.deadline_ms / 1000))
+            try:
+                asyncio.run(api._run_cancellable(client, "chat_query", work))  # type: ignore[arg-type]
+                status = 200
+            except HTTPException as e:
+                status = e.status_code
+        handler_ms.append((time.perf_counter() - t0) * 1000)
+        while "at" not in finished:  # the worker thread may outlive the handler
+            time.sleep(0.005)
+        busy_ms.append((finished["at"] - t0) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        "mode": mode,
+        "statuses": statuses,
+        "handler_p50_ms": round(statistics.median(handler_ms), 1),
+        "worker_busy_p50_ms": round(statistics.median(busy_ms), 1),
+        "worker_busy_total_s": round(sum(busy_ms) / 1000, 2),
+        **{f"llm_calls_cancelled_{w}": int(CANCELLED_LLM_CALLS.value(when=w) - before[w][0]) for w in before},
+        "llm_tokens_cancelled": int(sum(CANCELLED_LLM_TOKENS.value(when=w) - before[w][1] for w in before)),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=10)
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--llm-latency-ms", type=float, default=800.0)
+    ap.add_argument("--disconnect-after-ms", type=float, default=300.0)
+    ap.add_argument("--deadline-ms", type=float, default=1000.0)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", JANITOR_ENABLED="false", FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms))
+    try:
+        from fastapi.testclient import TestClient
+        import api.main as api
+        with TestClient(api.app) as client:
+            r = client.post("/chat/index", files=[("files", ("doc.pdf", io.BytesIO(make_pdf(args.pages)), "application/pdf"))],
+                            data={"session_id": "bench"})
+            r.raise_for_status()
+        rows = [run_mode(mode, args) for mode in ("run_to_completion", "disconnect", "deadline")]
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    saved = 1 - rows[1]["worker_busy_total_s"] / rows[0]["worker_busy_total_s"]
+    print(json.dumps({"requests": args.requests, "llm_latency_ms": args.llm_latency_ms,
+                      "disconnect_after_ms": args.disconnect_after_ms, "deadline_ms": args.deadline_ms,
+                      "results": rows, "worker_time_saved_on_disconnect_pct": round(100 * saved, 1)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
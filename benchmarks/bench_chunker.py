@@ -0,0 +1,158 @@
+"""
+Chunking: RecursiveCharacterTextSplitter on page text vs. the layout-aware chunker.
+
+Offline. --docs structured report PDFs (title, numbered sections and
+subsections in larger fonts, wrapped paragraphs with one distinctive fact
+each, a small table, running header/footer) are chunked both ways:
+  recursive  extract_pdf_pages + RecursiveCharacterTextSplitter(1000, 200),
+             what ChatIngestor._split did before
+  layout     extract_pdf_layout + LayoutChunker(1000), no overlap
+Reports chunks, embedded characters and how much of it is duplicated
+overlap, chunks that straddle a section boundary, split throughput
+(extraction included) and retrieval hit rate@k / MRR with the fake-mode
+hashing embeddings (hit: the chunk holding the fact ranked within k).
+
+Usage:
+    python benchmarks/bench_chunker.py --docs 6 --sections 8 --k 4
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import TOPICS  # noqa: E402
+
+REGIONS = ["north", "south", "east", "west", "central", "coastal", "alpine", "metro"]
+_SUBSECTION_RE = re.compile(r"programme (\d+-\d+-\d+)-\d+ ")
+FILLER = ("The committee reviewed the operating plan, compared it with the prior period and noted the usual "
+          "seasonal effects, currency movements and the timing of one-off items. ")
+
+
+def make_report_pdf(doc_no: int, sections: int, rng: random.Random, path: Path):
+    """Writes the PDF; returns (question, programme code) facts and the subsection titles."""
+    import fitz
+    pdf = fitz.open()
+    facts, titles = [], []
+    state = {"page": None, "y": 0.0}
+
+    def new_page():
+        page = pdf.new_page()
+        page.insert_text((50, 30), f"Contoso Group - Operating Review {doc_no}", fontsize=8)
+        page.insert_text((50, 820), f"Internal - page {pdf.page_count}", fontsize=8)
+        state.update(page=page, y=60.0)
+
+    def put(text: str, size: float):
+        height = sum(math.ceil(len(line) * size * 0.5 / 495 + 0.01) for line in text.split("\n")) * size * 1.3 + size
+        if state["page"] is None or state["y"] + height > 790:
+            new_page()
+        rect = fitz.Rect(50, state["y"], 545, state["y"] + height)
+        assert state["page"].insert_textbox(rect, text, fontsize=size) >= 0, "text box too small"
+        state["y"] += height + 4
+
+    put(f"Operating Review {doc_no}", 20)
+    for s in range(1, sections + 1):
+        put(f"{s} {rng.choice(TOPICS).title()} and {rng.choice(TOPICS)} outlook", 15)
+        for sub in range(1, 3):
+            title = f"{s}.{sub} {rng.choice(REGIONS).title()} region"
+            titles.append(title)
+            put(title, 12)
+            for p in range(2):
+                topic, region, code = rng.choice(TOPICS), rng.choice(REGIONS), f"{doc_no}-{s}-{sub}-{p}"
+                fact = (f"Under programme {code} the {topic} indicator for the {region} region reached "
+                        f"{rng.randint(100, 999)} units. ")
+                facts.append((f"What did the {topic} indicator for the {region} region reach under programme {code}?",
+                              code))
+                put(fact + FILLER * rng.randint(1, 3), 10)
+            if sub == 2:
+                rows = "\n".join(f"{r:<10}{rng.randint(10, 99):>6}{rng.randint(10, 99):>6}"
+                                 for r in rng.sample(REGIONS, 3))
+                put(rows, 9)
+    pdf.save(str(path))
+    pdf.close()
+    return facts, titles
+
+
+def run_mode(mode: str, corpus, args) -> dict:
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from utils.document_ops import extract_pdf_pages
+    from utils.local_embeddings import LocalHashingEmbeddings
+    from utils.layout_chunker import LayoutChunker
+
+    chunks, straddling, split_s, pages, source_chars = [], 0, 0.0, 0, 0
+    for path, _, _ in corpus:
+        t0 = time.perf_counter()
+        if mode == "recursive":
+            texts = extract_pdf_pages(path)
+            docs = [Document(page_content=t, metadata={"source": str(path), "page": i}) for i, t in enumerate(texts)]
+            doc_chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_documents(docs)
+        else:
+            doc_chunks = LayoutChunker(chunk_size=1000).split_pdf(path)
+        split_s += time.perf_counter() - t0
+        texts = extract_pdf_pages(path)
+        pages += len(texts)
+        source_chars += sum(len(t) for t in texts)
+        # a chunk straddles sections when it holds facts of two subsections
+        straddling += sum(1 for c in doc_chunks if len(set(_SUBSECTION_RE.findall(c.page_content))) > 1)
+        chunks += doc_chunks
+
+    embeddings = LocalHashingEmbeddings(n_features=256, ngram_range=(1, 1), token_pattern=r"\w+")  # as MODEL_PROVIDER=fake
+    store = FAISS.from_documents(chunks, embeddings)
+    hits, rr, questions = 0, 0.0, 0
+    for path, facts, titles in corpus:
+        for question, code in facts:
+            questions += 1
+            for rank, chunk in enumerate(store.similarity_search(question, k=args.k), 1):
+                if chunk.metadata["source"] == str(path) and f"programme {code} " in chunk.page_content:
+                    hits += 1
+                    rr += 1 / rank
+                    break
+    embedded = sum(len(c.page_content) for c in chunks)
+    return {
+        "mode": mode,
+        "chunks": len(chunks),
+        "embedded_chars": embedded,
+        "duplicated_pct": round(100 * max(0, embedded - source_chars) / source_chars, 1),
+        "chunks_straddling_sections": straddling,
+        "split_pages_per_s": round(pages / split_s, 1),
+        f"hit_rate_at_{args.k}": round(hits / questions, 3),
+        "mrr": round(rr / questions, 3),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=6)
+    ap.add_argument("--sections", type=int, default=8)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    tmp = Path(tempfile.mkdtemp())
+    corpus = []
+    for d in range(args.docs):
+        path = tmp / f"report{d}.pdf"
+        facts, titles = make_report_pdf(d, args.sections, rng, path)
+        corpus.append((path, facts, titles))
+    rows = [run_mode(mode, corpus, args) for mode in ("recursive", "layout")]
+    recursive, layout = rows
+    print(json.dumps({"docs": args.docs, "sections_per_doc": args.sections, "results": rows,
+                      "chunk_reduction_pct": round(100 * (1 - layout["chunks"] / recursive["chunks"]), 1),
+                      "embedded_chars_reduction_pct":
+                          round(100 * (1 - layout["embedded_chars"] / recursive["embedded_chars"]), 1)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Local CPU embeddings vs. the remote embedding model: throughput and retrieval quality.
+
+Builds a synthetic corpus of short "fact" passages (team, city, quarter,
+metric, change) with many near-duplicates, and one question per passage that
+paraphrases it. Each provider embeds the corpus and the questions; retrieval
+is exact cosine search, so only the embeddings differ.
+
+Providers:
+  local-hash   LocalHashingEmbeddings, hashed n-grams only
+  local-lsa    LocalHashingEmbeddings + IDF/SVD projection fitted on the corpus
+  openai       OpenAIEmbeddings (config embedding_model.model_name); only with
+               --remote and OPENAI_API_KEY set
+
+Reports docs/s (batched embed_documents), single-query latency, recall@1/@5,
+MRR, and whether 4 threads sharing one instance produce identical vectors.
+
+Usage:
+    python benchmarks/bench_embeddings.py --passages 5000 --queries 500 [--remote]
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.local_embeddings import LocalHashingEmbeddings, fit_projection  # noqa: E402
+
+TEAMS = ["Atlas", "Borealis", "Cobalt", "Dynamo", "Ember", "Falcon", "Granite", "Harbor", "Ion", "Juniper"]
+CITIES = ["Lisbon", "Oslo", "Austin", "Pune", "Nairobi", "Osaka", "Lyon", "Denver"]
+QUARTERS = ["Q1 2023", "Q2 2023", "Q3 2023", "Q4 2023", "Q1 2024", "Q2 2024"]
+METRICS = [("onboarding time", "cut", "reduce"), ("support backlog", "shrank", "lower"),
+           ("cloud spend", "trimmed", "cut"), ("release frequency", "raised", "increase"),
+           ("churn", "lowered", "decrease"), ("conversion", "lifted", "improve")]
+CAUSES = ["migrating billing to the ledger service", "adding a self-serve portal", "retiring the legacy queue",
+          "rewriting the search indexer", "moving to weekly planning", "automating contract review"]
+
+
+def make_dataset(passages: int, queries: int, seed: int = 7):
+    rng = random.Random(seed)
+    docs, questions = [], []
+    for i in range(passages):
+        team, city, quarter = rng.choice(TEAMS), rng.choice(CITIES), rng.choice(QUARTERS)
+        metric, verb, ask = rng.choice(METRICS)
+        cause = rng.choice(CAUSES)
+        pct = rng.randint(3, 60)
+        docs.append(f"In {quarter} the {team} team in {city} {verb} {metric} by {pct} percent after {cause}. "
+                    f"Record {i}.")
+        questions.append((f"How did the {team} group in {city} {ask} {metric} during {quarter}, "
+                          f"and was it due to {cause.split()[0]} {cause.split()[-1]}?", i))
+    rng.shuffle(questions)
+    return docs, questions[:queries]
+
+
+def evaluate(name: str, emb, docs, questions, k: int = 5) -> dict:
+    t0 = time.perf_counter()
+    doc_vecs = np.asarray(emb.embed_documents(docs), dtype=np.float32)
+    embed_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    q_vecs = np.asarray([emb.embed_query(q) for q, _ in questions], dtype=np.float32)
+    query_ms = (time.perf_counter() - t0) / len(questions) * 1000
+
+    doc_vecs /= np.maximum(np.linalg.norm(doc_vecs, axis=1, keepdims=True), 1e-12)
+    q_vecs /= np.maximum(np.linalg.norm(q_vecs, axis=1, keepdims=True), 1e-12)
+    scores = q_vecs @ doc_vecs.T
+    truth = np.asarray([i for _, i in questions])
+    ranks = (scores > scores[np.arange(len(truth)), truth][:, None]).sum(axis=1)  # 0 = best
+
+    sample = docs[:512]
+    reference = np.asarray(emb.embed_documents(sample))
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        parallel = list(pool.map(lambda chunk: emb.embed_documents(chunk), [sample[i::4] for i in range(4)]))
+    rebuilt = np.empty_like(reference)
+    for i, part in enumerate(parallel):
+        rebuilt[i::4] = part
+    return {
+        "provider": name,
+        "dim": int(doc_vecs.shape[1]),
+        "docs_per_s": round(len(docs) / embed_seconds, 1),
+        "query_ms": round(query_ms, 3),
+        "recall@1": round(float(np.mean(ranks < 1)), 4),
+        f"recall@{k}": round(float(np.mean(ranks < k)), 4),
+        "mrr": round(float(np.mean(1.0 / (ranks + 1))), 4),
+        "thread_safe": bool(np.allclose(reference, rebuilt)),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--passages", type=int, default=5000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--n-features", type=int, default=4096)
+    ap.add_argument("--dim", type=int, default=256, help="LSA projection size")
+    ap.add_argument("--remote", action="store_true", help="also benchmark OpenAIEmbeddings")
+    args = ap.parse_args()
+
+    docs, questions = make_dataset(args.passages, args.queries)
+    results = [evaluate("local-hash", LocalHashingEmbeddings(n_features=args.n_features), docs, questions)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        path = fit_projection(docs, Path(tmp) / "projection.npz", dim=args.dim, n_features=args.n_features)
+        fit_seconds = time.perf_counter() - t0
+        lsa = evaluate("local-lsa", LocalHashingEmbeddings(n_features=args.n_features, projection_path=path),
+                       docs, questions)
+        lsa["fit_seconds"] = round(fit_seconds, 2)
+        results.append(lsa)
+
+    if args.remote:
+        if not os.getenv("OPENAI_API_KEY"):
+            results.append({"provider": "openai", "skipped": "OPENAI_API_KEY not set"})
+        else:
+            from langchain_openai import OpenAIEmbeddings
+            from utils.config_loader import load_config
+            model = load_config(ROOT / "config" / "config.yaml")["embedding_model"]["model_name"]
+            results.append(evaluate("openai", OpenAIEmbeddings(model=model), docs, questions))
+
+    print(json.dumps({"passages": args.passages, "queries": len(questions), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Federated /chat/query latency vs. number of sessions.
+
+Offline (MODEL_PROVIDER=fake, stub LLM with --llm-latency-ms) in a scratch
+working directory: indexes --sessions separate PDFs (one session each), then
+times /chat/query over 1, 2, 4, ... sessions (repeated `session_ids` form
+fields). Also times the retrieval step alone (FederatedRetriever.invoke) against a
+sequential baseline that invokes one single-session retriever per session
+(query embedded and searched once per session), i.e. looping over sessions.
+
+Usage:
+    python benchmarks/bench_federated.py --sessions 8 --pages 40 --queries 30 --storage-mode shared
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import TOPICS, make_pdf  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=8)
+    ap.add_argument("--pages", type=int, default=40)
+    ap.add_argument("--queries", type=int, default=30)
+    ap.add_argument("--llm-latency-ms", type=float, default=0.0)
+    ap.add_argument("--storage-mode", choices=["session_dirs", "shared"], default="shared")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", JANITOR_ENABLED="false", FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+                      FAISS_STORAGE_MODE=args.storage_mode)
+
+    from fastapi.testclient import TestClient
+    import api.main as api
+    
+    questions = [f"How did {TOPICS[i % len(TOPICS)]} move in region {i % 40}?" for i in range(args.queries)]
+    rows = []
+    try:
+        with TestClient(api.app) as client:
+            sessions = []
+            for s in range(args.sessions):
+                r = client.post("/chat/index", files=[("files", (f"q{s}.pdf", io.BytesIO(make_pdf(args.pages, s)),
+                                                                 "application/pdf"))])
+                r.raise_for_status()
+                sessions.append(r.json()["session_id"])
+
+            n = 1
+            while n <= args.sessions:
+                subset = sessions[:n]
+                latencies = []
+                for q in questions:
+                    t0 = time.perf_counter()
+                    r = client.post("/chat/query", data={"query": q, "session_ids": subset})
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    r.raise_for_status()
+                attributed = {s["session_id"] for s in r.json()["sources"]}
+
+                rag = api._load_rag(None, True, subset, k=5)
+                retriever = rag.retriever
+                t0 = time.perf_counter()
+                for q in questions:
+                    retriever.invoke(q)
+                federated_ms = (time.perf_counter() - t0) / len(questions) * 1000
+
+                row = {"sessions": n, "query_p50_ms": round(statistics.median(latencies), 2),
+                       "retrieval_ms": round(federated_ms, 3), "sessions_in_sources": len(attributed)}
+                if n > 1:
+                    singles = [api._load_rag(sid, True, k=5).retriever for sid in subset]
+                    t0 = time.perf_counter()
+                    for q in questions:
+                        for single in singles:
+                            single.invoke(q)
+                    row["sequential_retrieval_ms"] = round((time.perf_counter() - t0) / len(questions) * 1000, 3)
+                rows.append(row)
+                n *= 2
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({"storage_mode": args.storage_mode, "pages_per_session": args.pages, "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Chat latency under heavy analysis load: no governor vs. FIFO budget vs. priority + fair queuing.
+
+Offline. The provider is a StubChatModel behind a simulated quota (tokens and
+requests per minute, enforced like a hosted API: over budget -> "429"; the
+clients retry twice with 0.5 s / 1 s back-off like the provider SDKs). For
+--seconds, batch workers keep sending large analysis-sized prompts (tenant
+"heavy" runs --heavy-workers of them, tenant "light" one), while a chat
+client sends a small prompt every --chat-interval-s.
+Modes:
+  ungoverned  calls go straight to the provider; over-quota calls fail
+  fifo        GovernedChatModel, every call in one class (arrival order + tenant fairness)
+  priority    as fifo, but chat runs in the "interactive" class
+Reports chat p50/p95 latency and failures (429 after retries), mean queue
+wait per class, and per batch tenant the completed calls and mean latency.
+
+Usage:
+    python benchmarks/bench_llm_governor.py --seconds 20 --tpm 60000 --rpm 600
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from langchain_core.messages import BaseMessage  # noqa: E402
+from pydantic import PrivateAttr  # noqa: E402
+from utils.fake_providers import StubChatModel  # noqa: E402
+from utils.llm_governor import (QUEUE_WAIT_SECONDS, GovernedChatModel, LLMGovernor, TokenBucket,  # noqa: E402
+                                llm_context)
+
+
+class QuotaStub(StubChatModel):
+    """Stub provider that rejects calls over its per-minute token/request quota, like a hosted API's 429."""
+    _tokens: Any = PrivateAttr(default=None)
+    _requests: Any = PrivateAttr(default=None)
+
+    def set_quota(self, tpm: float, rpm: float):
+        self._tokens, self._requests = TokenBucket(tpm), TokenBucket(rpm)
+        return self
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any):
+        cost = sum(len(str(m.content)) for m in messages) / 4
+        now = time.monotonic()
+        if self._tokens.wait_time(cost, now) > 0 or self._requests.wait_time(1, now) > 0:
+            raise RuntimeError("429 Too Many Requests")
+        self._tokens.take(cost)
+        self._requests.take(1)
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+async def _call(model, prompt: str, retries: int = 2):
+    for attempt in range(retries + 1):
+        try:
+            return await model.ainvoke(prompt)
+        except RuntimeError:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+async def run_mode(mode: str, args) -> dict:
+    provider = QuotaStub(model_name="stub-quota", latency_ms=args.llm_latency_ms,
+                         ms_per_1k_tokens=args.ms_per_1k_tokens).set_quota(args.tpm, args.rpm)
+    if mode == "ungoverned":
+        model = provider
+    else:
+        # governor budget a little under the provider quota: the estimate includes completion tokens
+        governor = LLMGovernor(providers={mode: {"tpm": args.tpm * 0.95, "rpm": args.rpm * 0.95}},
+                               completion_tokens=0, starvation_s=args.starvation_s)
+        model = GovernedChatModel(inner=provider, budget=mode, governor=governor)
+
+    deadline = time.monotonic() + args.seconds
+    chat_latency, chat_errors, batch_latency, batch_errors = [], 0, defaultdict(list), 0
+    batch_prompt = "analysis " * (args.batch_tokens * 4 // 9)
+    chat_prompt = "question " * (args.chat_tokens * 4 // 9)
+
+    async def batch_worker(tenant: str):
+        nonlocal batch_errors
+        with llm_context(priority="batch", tenant=tenant):
+            while time.monotonic() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    await _call(model, batch_prompt)
+                    batch_latency[tenant].append((time.perf_counter() - t0) * 1000)
+                except Exception:
+                    batch_errors += 1
+
+    async def chat_client():
+        nonlocal chat_errors
+        priority = "interactive" if mode == "priority" else "batch"
+        pending = []
+
+        async def ask(i: int):
+            nonlocal chat_errors
+            with llm_context(priority=priority, tenant=f"chat-{i % 5}"):
+                t0 = time.perf_counter()
+                try:
+                    await _call(model, chat_prompt)
+                    chat_latency.append((time.perf_counter() - t0) * 1000)
+                except Exception:
+                    chat_errors += 1
+
+        i = 0
+        while time.monotonic() < deadline:
+            pending.append(asyncio.create_task(ask(i)))
+            i += 1
+            await asyncio.sleep(args.chat_interval_s)
+        await asyncio.gather(*pending)
+
+    workers = [batch_worker("heavy") for _ in range(args.heavy_workers)] + [batch_worker("light")]
+    await asyncio.gather(chat_client(), *workers)
+
+    waits = {}
+    for priority in ("interactive", "batch"):
+        snap = QUEUE_WAIT_SECONDS.snapshot(provider=mode, priority=priority)
+        if snap.get("count"):
+            waits[priority] = round(snap["sum"] / snap["count"] * 1000, 1)
+    return {
+        "mode": mode,
+        "chat_p50_ms": round(statistics.median(chat_latency), 1) if chat_latency else None,
+        "chat_p95_ms": round(sorted(chat_latency)[int(0.95 * (len(chat_latency) - 1))], 1) if chat_latency else None,
+        "chat_ok": len(chat_latency),
+        "chat_failed": chat_errors,
+        "batch_failed": batch_errors,
+        "batch": {tenant: {"done": len(v), "mean_ms": round(statistics.mean(v))} for tenant, v in batch_latency.items()},
+        "mean_queue_wait_ms": waits,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=20.0)
+    ap.add_argument("--tpm", type=float, default=60000)
+    ap.add_argument("--rpm", type=float, default=600)
+    ap.add_argument("--batch-tokens", type=int, default=4000)
+    ap.add_argument("--chat-tokens", type=int, default=300)
+    ap.add_argument("--heavy-workers", type=int, default=4)
+    ap.add_argument("--chat-interval-s", type=float, default=0.5)
+    ap.add_argument("--llm-latency-ms", type=float, default=200.0)
+    ap.add_argument("--ms-per-1k-tokens", type=float, default=50.0)
+    ap.add_argument("--starvation-s", type=float, default=30.0)
+    args = ap.parse_args()
+
+    rows = [asyncio.run(run_mode(mode, args)) for mode in ("ungoverned", "fifo", "priority")]
+    print(json.dumps({"seconds": args.seconds, "tpm": args.tpm, "rpm": args.rpm, "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
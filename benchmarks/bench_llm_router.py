@@ -0,0 +1,126 @@
+"""
+Tail latency and error rate: one LLM provider vs. failover vs. hedged requests.
+
+Runs fully offline with two StubChatModel providers whose latency, straggler
+tail and error rate are set from the command line (the same knobs as the
+`fake.providers` config entries). For each mode, --requests calls are made,
+--concurrency at a time, through `ainvoke`, plus --sync-requests through
+plain `invoke` (the path the chains use), and the following is reported:
+  single    provider A only
+  failover  A, then B on error or after --timeout-s (no hedging)
+  hedged    as failover, plus a backup to B once A passes its observed p95
+p50/p95/p99 latency, failed requests, hedges, failovers and cancelled losers.
+
+Usage:
+    python benchmarks/bench_llm_router.py --requests 400 --concurrency 16 \\
+        --a-latency-ms 80 --b-latency-ms 120 --tail-prob 0.05 --tail-ms 1500 --error-rate 0.02
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.fake_providers import StubChatModel  # noqa: E402
+from utils.llm_router import LLM_CALLS, LLM_FAILOVERS, LLM_HEDGES, HedgedChatModel  # noqa: E402
+
+
+def _pct(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _stub(name: str, latency_ms: float, args) -> StubChatModel:
+    return StubChatModel(model_name=f"stub-{name}", latency_ms=latency_ms, jitter_ms=args.jitter_ms,
+                         tail_ms=args.tail_ms, tail_prob=args.tail_prob, error_rate=args.error_rate)
+
+
+def _counts(names):
+    return {
+        "hedges": sum(LLM_HEDGES.value(provider=n) for n in names),
+        "failovers": sum(LLM_FAILOVERS.value(provider=n) for n in names),
+        "cancelled": sum(LLM_CALLS.value(provider=n, outcome="cancelled") for n in names),
+    }
+
+
+async def _drive(model, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(i: int):
+        nonlocal failures
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                await model.ainvoke(f"question {i}")
+            except Exception:
+                failures += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, failures
+
+
+def run_mode(mode: str, args) -> dict:
+    a, b = _stub("a", args.a_latency_ms, args), _stub("b", args.b_latency_ms, args)
+    if mode == "single":
+        model, names = a, []
+    else:
+        names = [f"{mode}-a", f"{mode}-b"]
+        model = HedgedChatModel(providers=[a, b], names=names, hedge=mode == "hedged",
+                                hedge_after_s=args.hedge_after_ms / 1000, min_samples=20, timeout_s=args.timeout_s)
+    before = _counts(names)
+    latencies, failures = asyncio.run(_drive(model, args.requests, args.concurrency))
+
+    sync_latencies, sync_failures = [], 0
+    for i in range(args.sync_requests):
+        t0 = time.perf_counter()
+        try:
+            model.invoke(f"sync question {i}")
+        except Exception:
+            sync_failures += 1
+        sync_latencies.append((time.perf_counter() - t0) * 1000)
+
+    after = _counts(names)
+    row = {
+        "mode": mode,
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(_pct(latencies, 0.95), 1),
+        "p99_ms": round(_pct(latencies, 0.99), 1),
+        "failed": failures,
+        "sync_p50_ms": round(statistics.median(sync_latencies), 1) if sync_latencies else None,
+        "sync_failed": sync_failures,
+        **{k: int(after[k] - before[k]) for k in after},
+    }
+    if isinstance(model, HedgedChatModel):
+        row["health"] = model.health()
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--sync-requests", type=int, default=40)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--a-latency-ms", type=float, default=80.0)
+    ap.add_argument("--b-latency-ms", type=float, default=120.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--tail-prob", type=float, default=0.05)
+    ap.add_argument("--tail-ms", type=float, default=1500.0)
+    ap.add_argument("--error-rate", type=float, default=0.02)
+    ap.add_argument("--hedge-after-ms", type=float, default=300.0)
+    ap.add_argument("--timeout-s", type=float, default=1.0)
+    args = ap.parse_args()
+
+    rows = [run_mode(mode, args) for mode in ("single", "failover", "hedged")]
+    print(json.dumps({"requests": args.requests, "concurrency": args.concurrency, "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
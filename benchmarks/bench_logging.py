@@ -0,0 +1,104 @@
+"""
+Logging overhead per simulated request: the previous synchronous setup vs. the
+queue-based CustomLogger.
+
+A "request" does what /chat/query does today: a few `CustomLogger().get_logger()`
+calls from constructors (ModelLoader, ConversationalRAG, ...) and a dozen
+structured log events. `legacy` reproduces the old get_logger (new FileHandler,
+basicConfig and structlog.configure on every call, JSON rendering + file write
+on the calling thread). Each mode runs in its own subprocess with console
+output discarded, inside a temp directory.
+
+Usage:
+    python benchmarks/bench_logging.py --requests 2000
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+LOGGERS_PER_REQUEST = 4
+EVENTS_PER_REQUEST = 12
+
+
+def _legacy_get_logger(log_file: str, name: str):
+    import structlog
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, format="%(message)s", handlers=[console_handler, file_handler])
+    structlog.configure(
+        processors=[
+            structlog.processors.TimeStamper(fmt="iso", utc=True, key="timestamp"),
+            structlog.processors.add_log_level,
+            structlog.processors.EventRenamer(to="event"),
+            structlog.processors.JSONRenderer(),
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        cache_logger_on_first_use=True,
+    )
+    return structlog.get_logger(name)
+
+
+def run_mode(mode: str, requests: int) -> dict:
+    sys.path.insert(0, str(ROOT))
+    if mode == "legacy":
+        os.makedirs("logs", exist_ok=True)
+        log_file = os.path.join("logs", "legacy.log")
+        get_logger = lambda name: _legacy_get_logger(log_file, name)  # noqa: E731
+    else:
+        from logger.custom_logger import CustomLogger
+        get_logger = lambda name: CustomLogger().get_logger(name)  # noqa: E731
+
+    get_logger("warmup").info("warmup")
+    t0 = time.perf_counter()
+    for r in range(requests):
+        loggers = [get_logger(f"module_{i}.py") for i in range(LOGGERS_PER_REQUEST)]
+        for e in range(EVENTS_PER_REQUEST):
+            loggers[e % LOGGERS_PER_REQUEST].info("Request step finished", request=r, step=e,
+                                                  session_id="session_x", index="faiss_index/session_x")
+    elapsed = time.perf_counter() - t0
+    return {
+        "mode": mode,
+        "requests": requests,
+        "us_per_request": round(elapsed / requests * 1e6, 1),
+        "us_per_event": round(elapsed / (requests * EVENTS_PER_REQUEST) * 1e6, 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--mode", choices=["legacy", "queued"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.requests)))
+        return
+
+    results = []
+    for mode in ("legacy", "queued"):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--mode", mode,
+                                  "--requests", str(args.requests)],
+                                 cwd=tmp, check=True, capture_output=True, text=True)
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    legacy, queued = results
+    print(json.dumps({"results": results,
+                      "overhead_reduction_pct": round(100 * (1 - queued["us_per_request"] / legacy["us_per_request"]), 1)},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Cost of the span/timer instrumentation from utils.metrics.
+
+Times an empty `with span(...)` block and an empty `@timed` function against
+the bare equivalents, with METRICS_ENABLED on and off (each in its own
+subprocess, since the flag is read at import time). Also reports the cost of
+one /metrics render after the run.
+
+Usage:
+    python benchmarks/bench_metrics.py --iterations 1000000
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_mode(iterations: int) -> dict:
+    sys.path.insert(0, str(ROOT))
+    from utils.metrics import METRICS_ENABLED, render_latest, span, timed
+
+    def bare():
+        return None
+
+    decorated = timed("bench.timed")(bare)
+
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        bare()
+    baseline = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        with span("bench.span"):
+            pass
+    with_span = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        decorated()
+    with_timed = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    rendered = render_latest()
+    render = time.perf_counter() - t0
+    return {
+        "metrics_enabled": METRICS_ENABLED,
+        "ns_bare_call": round(baseline / iterations * 1e9, 1),
+        "ns_span": round(with_span / iterations * 1e9, 1),
+        "ns_timed_call": round(with_timed / iterations * 1e9, 1),
+        "render_ms": round(render * 1e3, 3),
+        "render_bytes": len(rendered),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=1_000_000)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.iterations)))
+        return
+
+    results = []
+    for enabled in ("true", "false"):
+        out = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--child",
+                              "--iterations", str(args.iterations)],
+                             env={**os.environ, "METRICS_ENABLED": enabled},
+                             check=True, capture_output=True, text=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    print(json.dumps({"iterations": args.iterations, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
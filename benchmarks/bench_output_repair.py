@@ -0,0 +1,110 @@
+"""
+Malformed LLM JSON: OutputFixingParser only vs. local repair first.
+
+Offline (MODEL_PROVIDER=fake) in a scratch working directory. The stub LLM
+garbles --malformed-rate of its JSON replies the way real models do (prose
+around the JSON, trailing commas, Python literals, <think> blocks) and
+sleeps --llm-latency-ms per call. --requests hybrid analyses and
+comparisons run per mode:
+  llm_fixer     structured_output.local_repair off: every unparsable reply
+                costs a second LLM call through OutputFixingParser
+  local_repair  the default: local repair + schema coercion first
+Reports mean/p95 latency, how many replies each stage produced, LLM fixer
+calls and failures, plus the cost of repair_json itself.
+
+Usage:
+    python benchmarks/bench_output_repair.py --requests 40 --malformed-rate 0.3 --llm-latency-ms 200
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def _pct(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_mode(mode: str, args) -> dict:
+    from src.doc_analyzer.data_analysis import DocumentAnalyzer
+    from src.doc_compare.data_comparator import DocumentComparatorLLM
+    from utils.structured_output import OUTPUT_FIXES, OUTPUT_PARSES
+
+    analyzer, comparator = DocumentAnalyzer(), DocumentComparatorLLM()
+    for worker in (analyzer, comparator):
+        worker.output_settings = {**worker.output_settings, "local_repair": mode == "local_repair"}
+    pages = [f"Page {i + 1} text. The quarterly results improved and costs fell." for i in range(6)]
+    combined = "\n".join(f"--- Page {i + 1} ---\n{p}" for i, p in enumerate(pages))
+
+    stages = ("parser", "local_repair", "llm_fixer")
+    before = {(c, s): OUTPUT_PARSES.value(component=c, stage=s) for c in ("analyze", "compare") for s in stages}
+    fixes_before = OUTPUT_FIXES.value(component="analyze") + OUTPUT_FIXES.value(component="compare")
+    latencies, failures = [], 0
+    for _ in range(args.requests):
+        for call in (lambda: analyzer.analyze_pages(pages, {}), lambda: comparator.compare_documents(combined)):
+            t0 = time.perf_counter()
+            try:
+                call()
+            except Exception:
+                failures += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+    return {
+        "mode": mode,
+        "mean_ms": round(statistics.mean(latencies), 1),
+        "p95_ms": round(_pct(latencies, 0.95), 1),
+        "replies_by_stage": {s: int(sum(OUTPUT_PARSES.value(component=c, stage=s) - before[(c, s)]
+                                        for c in ("analyze", "compare"))) for s in stages},
+        "llm_fixer_calls": int(OUTPUT_FIXES.value(component="analyze") + OUTPUT_FIXES.value(component="compare")
+                               - fixes_before),
+        "failed": failures,
+    }
+
+
+def repair_cost(samples: int) -> dict:
+    import random
+    from utils.fake_providers import _MALFORMATIONS
+    from utils.structured_output import repair_json
+
+    value = {"Summary": [f"Sentence number {i} about the report." for i in range(5)], "SentimentTone": "Neutral"}
+    texts = [random.choice(_MALFORMATIONS)(value) for _ in range(samples)]
+    t0 = time.perf_counter()
+    repaired = sum(1 for text in texts if repair_json(text) == value)
+    return {"samples": samples, "repaired": repaired,
+            "us_per_repair": round((time.perf_counter() - t0) / samples * 1e6, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=40)
+    ap.add_argument("--malformed-rate", type=float, default=0.3)
+    ap.add_argument("--llm-latency-ms", type=float, default=200.0)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+                      FAKE_LLM_MALFORMED_RATE=str(args.malformed_rate))
+    try:
+        rows = [run_mode(mode, args) for mode in ("llm_fixer", "local_repair")]
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({"requests": args.requests, "malformed_rate": args.malformed_rate,
+                      "llm_latency_ms": args.llm_latency_ms, "results": rows,
+                      "repair_json": repair_cost(2000)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Per-session FAISS directories vs. the shared sharded index (FAISS_STORAGE_MODE=shared).
+
+Builds N small sessions in both layouts, then runs each query phase in a fresh
+subprocess so RSS numbers are not polluted by the build:
+
+  dir-cold      load_local() per query, as /chat/query does with session dirs
+  dir-resident  every session index kept loaded (what caching per-dir would cost)
+  shared        SharedIndexManager with ID-selector filtered searches
+
+Usage:
+    python benchmarks/bench_shared_index.py --sessions 5000 --queries 500
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from langchain.schema import Document  # noqa: E402
+from langchain_core.embeddings import DeterministicFakeEmbedding  # noqa: E402
+
+
+class _FakeLoader:
+    """Offline stand-in for ModelLoader: only load_embeddings() is used by the index managers."""
+    def __init__(self, dim: int):
+        self.emb = DeterministicFakeEmbedding(size=dim)
+
+    def load_embeddings(self):
+        return self.emb
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _session_docs(i: int, chunks: int):
+    return [Document(page_content=f"session {i} chunk {j}: quarterly figures, revenue line {i * 31 + j}",
+                     metadata={"source": f"doc_{i}.pdf", "row_id": j}) for j in range(chunks)]
+
+
+def _count_files(root: Path):
+    files = dirs = 0
+    for _, dnames, fnames in os.walk(root):
+        dirs += len(dnames)
+        files += len(fnames)
+    return files, dirs
+
+
+def build(workdir: Path, sessions: int, chunks: int, dim: int, shards: int) -> dict:
+    from src.doc_ingestion.data_ingestion import FaissManager, SharedIndexManager
+
+    loader = _FakeLoader(dim)
+    dir_base, shared_base = workdir / "dirs", workdir / "shared"
+
+    t0 = time.perf_counter()
+    for i in range(sessions):
+        docs = _session_docs(i, chunks)
+        fm = FaissManager(dir_base / f"s{i}", loader)  # type: ignore[arg-type]
+        fm.load_or_create(texts=[d.page_content for d in docs], metadatas=[d.metadata for d in docs])
+    dir_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    mgr = SharedIndexManager(shared_base, loader, num_shards=shards)  # type: ignore[arg-type]
+    for i in range(sessions):
+        mgr.upsert_documents(f"s{i}", {f"s{i}.pdf": _session_docs(i, chunks)}, persist=False)
+    mgr.flush()
+    shared_build = time.perf_counter() - t0
+
+    dir_files, dir_dirs = _count_files(dir_base)
+    shared_files, shared_dirs = _count_files(shared_base)
+    return {
+        "dir_build_s": round(dir_build, 3), "shared_build_s": round(shared_build, 3),
+        "dir_files": dir_files, "dir_dirs": dir_dirs,
+        "shared_files": shared_files, "shared_dirs": shared_dirs,
+    }
+
+
+def query_phase(phase: str, workdir: Path, sessions: int, queries: int, dim: int, shards: int) -> dict:
+    from langchain_community.vectorstores import FAISS
+    from src.doc_ingestion.data_ingestion import SharedIndexManager
+
+    loader = _FakeLoader(dim)
+    rng = random.Random(7)
+    picks = [rng.randrange(sessions) for _ in range(queries)]
+    rss_before = _rss_mb()
+    index_loads = 0
+    resident = {}
+    mgr = None
+
+    if phase == "dir-resident":
+        for i in range(sessions):
+            resident[i] = FAISS.load_local(str(workdir / "dirs" / f"s{i}"), loader.emb,
+                                           allow_dangerous_deserialization=True)
+            index_loads += 1
+    elif phase == "shared":
+        mgr = SharedIndexManager(workdir / "shared", loader, num_shards=shards)  # type: ignore[arg-type]
+
+    latencies = []
+    for n, i in enumerate([sessions - 1] + picks):  # first query is a warm-up (imports, BLAS init)
+        q = f"revenue line {i * 31}"
+        t0 = time.perf_counter()
+        if phase == "dir-cold":
+            vs = FAISS.load_local(str(workdir / "dirs" / f"s{i}"), loader.emb, allow_dangerous_deserialization=True)
+            index_loads += 1
+            vs.as_retriever(search_kwargs={"k": 5}).invoke(q)
+        elif phase == "dir-resident":
+            resident[i].as_retriever(search_kwargs={"k": 5}).invoke(q)
+        else:
+            mgr.as_retriever(f"s{i}", k=5).invoke(q)  # type: ignore[union-attr]
+        if n:
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    if phase == "shared":
+        from src.doc_ingestion import data_ingestion
+        index_loads = len(data_ingestion._SHARDS)
+    latencies.sort()
+    return {
+        "phase": phase,
+        "queries": queries,
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+        "index_loads": index_loads,
+        "open_fds": len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None,
+        "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=5000)
+    ap.add_argument("--chunks", type=int, default=4, help="chunks per session")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--shards", type=int, default=16)
+    ap.add_argument("--workdir", type=Path, default=None)
+    ap.add_argument("--phase", choices=["dir-cold", "dir-resident", "shared"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.phase:
+        print(json.dumps(query_phase(args.phase, args.workdir, args.sessions, args.queries, args.dim, args.shards)))
+        return
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="bench_shared_"))
+    os.chdir(ROOT)
+    try:
+        report = {"config": {k: v for k, v in vars(args).items() if k not in ("workdir", "phase")}}
+        report["build"] = build(workdir, args.sessions, args.chunks, args.dim, args.shards)
+        report["query"] = []
+        for phase in ("dir-cold", "dir-resident", "shared"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--phase", phase, "--workdir", str(workdir),
+                 "--sessions", str(args.sessions), "--queries", str(args.queries),
+                 "--dim", str(args.dim), "--shards", str(args.shards)],
+                check=True, capture_output=True, text=True,
+            )
+            report["query"].append(json.loads(out.stdout.strip().splitlines()[-1]))
+        print(json.dumps(report, indent=2))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
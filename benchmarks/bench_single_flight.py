@@ -0,0 +1,151 @@
+"""
+Identical concurrent requests: independent work vs. single-flight coalescing.
+
+Offline (MODEL_PROVIDER=fake) in a scratch working directory. --callers
+threads start at the same moment and each does what its request would:
+  analyze   extract the same PDF's pages (no blob store) + hybrid analysis
+            (stub LLM, --llm-latency-ms per call)
+  query     load the same session's FAISS index (--pages PDF pages)
+once with SINGLE_FLIGHT_ENABLED off and once on. Reports wall time, LLM
+calls and index loads actually executed. Then checks cancellation: callers
+share one slow LLM call and all but one leave early (the work must finish
+for the one left), then every caller leaves (the work must be abandoned).
+
+Usage:
+    python benchmarks/bench_single_flight.py --callers 8 --pages 200 --llm-latency-ms 500
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import make_pdf  # noqa: E402
+
+
+def _together(callers: int, fn) -> tuple[float, list]:
+    """Run fn(i) on `callers` threads released at once; wall seconds and results (or exceptions)."""
+    barrier = threading.Barrier(callers)
+    results: list = [None] * callers
+
+    def run(i: int):
+        barrier.wait()
+        try:
+            results[i] = fn(i)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(callers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, results
+
+
+def _leaders(flight: str) -> int:
+    from utils.single_flight import SINGLE_FLIGHT_CALLS
+    return int(SINGLE_FLIGHT_CALLS.value(flight=flight, role="leader"))
+
+
+def run_mode(enabled: bool, pdf: Path, session_dir: Path, args) -> dict:
+    import utils.single_flight as single_flight
+    from src.doc_analyzer.data_analysis import PROMPT_TOKENS, DocumentAnalyzer
+    from src.doc_ingestion.data_ingestion import DocHandler, load_faiss_index
+    from utils.model_loader import ModelLoader
+
+    single_flight.SINGLE_FLIGHT_ENABLED = enabled
+    analyzer, handler = DocumentAnalyzer(), DocHandler(data_dir="data/document_analysis")
+    embeddings = ModelLoader().load_embeddings()
+
+    tokens, leaders = PROMPT_TOKENS.value(component="analyze"), _leaders("analyze.llm")
+    analyze_s, results = _together(args.callers, lambda i: analyzer.analyze_pages(
+        handler.read_pages(str(pdf)), handler.read_metadata(str(pdf))))
+    prompt_tokens = PROMPT_TOKENS.value(component="analyze") - tokens
+    per_call = prompt_tokens / args.callers if not enabled else prompt_tokens / max(1, _leaders("analyze.llm") - leaders)
+
+    loads = _leaders("faiss.load")
+    query_s, _ = _together(args.callers, lambda i: load_faiss_index(session_dir, embeddings))
+    return {
+        "single_flight": enabled,
+        "analyze_wall_s": round(analyze_s, 3),
+        "analyze_llm_calls": round(prompt_tokens / per_call) if per_call else 0,
+        "analyze_failed": sum(isinstance(r, Exception) for r in results),
+        "index_load_wall_s": round(query_s, 3),
+        "index_loads": args.callers if not enabled else _leaders("faiss.load") - loads,
+    }
+
+
+def cancellation(args) -> dict:
+    import utils.single_flight as single_flight
+    from utils.deadline import Deadline, RequestCancelled, deadline_scope
+    from utils.model_loader import ModelLoader
+    from utils.single_flight import SINGLE_FLIGHT_ABANDONED, SingleFlight
+
+    single_flight.SINGLE_FLIGHT_ENABLED = True
+    llm = ModelLoader().load_llm()
+    flight = SingleFlight("bench.cancel")
+
+    def call(i: int, leave_after: float | None):
+        with deadline_scope(Deadline(leave_after)):
+            try:
+                return flight.do("same prompt", lambda: llm.invoke("shared question").content)
+            except RequestCancelled as e:
+                return f"left ({e.reason})"
+
+    latency = args.llm_latency_ms / 1000
+    _, partial = _together(3, lambda i: call(i, None if i == 2 else latency / 4))
+    abandoned_before = SINGLE_FLIGHT_ABANDONED.value(flight="bench.cancel")
+    _, everyone = _together(3, lambda i: call(i, latency / 4))
+    return {
+        "two_of_three_leave": sorted(str(r)[:20] for r in partial),
+        "all_leave": sorted(str(r)[:20] for r in everyone),
+        "abandoned": int(SINGLE_FLIGHT_ABANDONED.value(flight="bench.cancel") - abandoned_before),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--callers", type=int, default=8)
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--llm-latency-ms", type=float, default=500.0)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", JANITOR_ENABLED="false", BLOB_STORE_ENABLED="false",
+                      FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms))
+    try:
+        pdf = Path(tmp) / "shared.pdf"
+        pdf.write_bytes(make_pdf(args.pages))
+        from fastapi.testclient import TestClient
+        import api.main as api
+        with TestClient(api.app) as client:
+            r = client.post("/chat/index", files=[("files", ("shared.pdf", io.BytesIO(pdf.read_bytes()),
+                                                             "application/pdf"))], data={"session_id": "team"})
+            r.raise_for_status()
+        session_dir = Path(api.FAISS_BASE) / "team"
+        rows = [run_mode(False, pdf, session_dir, args), run_mode(True, pdf, session_dir, args)]
+        checks = cancellation(args)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({"callers": args.callers, "pages": args.pages, "llm_latency_ms": args.llm_latency_ms,
+                      "results": rows, "cancellation": checks}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+API startup cost, with a regression guard.
+
+Measures, each in fresh processes inside a scratch working directory:
+  - import time of `api.main` (median of --runs interpreter launches)
+  - time from spawning the server to the first 200 from /health: `uvicorn
+    api.main:app` when uvicorn is installed, otherwise a fresh interpreter
+    that runs the app lifespan and serves /health through TestClient
+  - which deferred heavy modules (provider SDKs, pandas, PyMuPDF, FAISS) were
+    imported, and which files or directories were created in the working
+    directory, just by importing the app -- any of either is a failure
+
+Exits non-zero if a deferred module is imported or a file is created on
+import, if a time exceeds --max-import-seconds / --max-health-seconds, or if
+it regresses by more than --tolerance against a --baseline result written
+earlier with --out.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --out startup.json
+    python benchmarks/bench_startup.py --baseline startup.json --tolerance 0.25
+"""
+from __future__ import annotations
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFERRED_MODULES = ("langchain_openai", "langchain_groq", "openai", "groq", "pandas", "fitz", "faiss",
+                    "langchain_community.vectorstores")
+
+_IMPORT_PROBE = f"""
+import json, os, sys, time
+sys.path.insert(0, {str(ROOT)!r})
+t0 = time.perf_counter()
+import api.main
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules],
+                  "created": sorted(os.listdir("."))}}))
+"""
+
+
+_HEALTH_PROBE = f"""
+import sys
+sys.path.insert(0, {str(ROOT)!r})
+import api.main
+from fastapi.testclient import TestClient
+with TestClient(api.main.app) as client:
+    assert client.get("/health").status_code == 200
+    print("ready", flush=True)
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(cwd: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=cwd, check=True,
+                         capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure_first_health(cwd: str, timeout: float = 60.0) -> float:
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    if importlib.util.find_spec("uvicorn") is None:
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", _HEALTH_PROBE], cwd=cwd, env=env, check=True,
+                             capture_output=True, text=True, timeout=timeout)
+        if "ready" not in out.stdout:
+            raise RuntimeError("/health probe did not answer")
+        return time.perf_counter() - t0
+
+    port = _free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port)],
+                            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.01)
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited before /health answered")
+        raise TimeoutError("/health did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--baseline", help="earlier --out file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--max-import-seconds", type=float)
+    ap.add_argument("--max-health-seconds", type=float)
+    args = ap.parse_args()
+
+    imports, health, loaded, created = [], [], set(), set()
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            probe = measure_import(tmp)
+            imports.append(probe["seconds"])
+            loaded.update(probe["loaded"])
+            created.update(probe["created"])
+        with tempfile.TemporaryDirectory() as tmp:
+            health.append(measure_first_health(tmp))
+
+    result = {
+        "runs": args.runs,
+        "server": "uvicorn" if importlib.util.find_spec("uvicorn") else "testclient",
+        "import_seconds": round(statistics.median(imports), 3),
+        "first_health_seconds": round(statistics.median(health), 3),
+        "deferred_modules_loaded": sorted(loaded),
+        "created_on_import": sorted(created),
+    }
+    failures = []
+    if loaded:
+        failures.append(f"deferred modules imported at startup: {sorted(loaded)}")
+    if created:
+        failures.append(f"created in the working directory on import: {sorted(created)}")
+    for key, limit in (("import_seconds", args.max_import_seconds), ("first_health_seconds", args.max_health_seconds)):
+        if limit is not None and result[key] > limit:
+            failures.append(f"{key} {result[key]} > {limit}")
+    if args.baseline:
+        base = json.loads(Path(args.baseline).read_text())
+        for key in ("import_seconds", "first_health_seconds"):
+            if base.get(key) and result[key] > base[key] * (1 + args.tolerance):
+                failures.append(f"{key} regressed: {base[key]} -> {result[key]}")
+    result["failures"] = failures
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2))
+    print(json.dumps(result, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
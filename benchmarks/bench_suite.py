@@ -0,0 +1,187 @@
+"""
+Offline end-to-end benchmark suite (no API keys, no network).
+
+Runs the FastAPI app in-process with MODEL_PROVIDER=fake (hash embeddings +
+stub chat model with configurable latency) over generated PDF corpora of
+increasing size. Each corpus size runs in its own subprocess and temp
+working directory, so peak RSS is per size and runs do not share indexes or
+caches.
+
+Per corpus size it reports:
+  - ingestion: /chat/index seconds, pages/s, chunks/s
+  - /chat/query latency p50/p99 over --queries questions
+  - /analyze and /compare end-to-end seconds (median of --repeats)
+  - peak RSS (ru_maxrss) of the run
+
+Results are written as JSON (--out). With --baseline, the run is checked
+against an earlier result file and exits non-zero when a metric regresses by
+more than --tolerance.
+
+Usage:
+    python benchmarks/bench_suite.py --pages 10,50,200 --queries 50 --llm-latency-ms 20 --out bench.json
+    python benchmarks/bench_suite.py --baseline bench.json --tolerance 0.2
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# metric -> True if higher is better
+TRACKED = {
+    "ingest_seconds": False, "pages_per_s": True, "chunks_per_s": True,
+    "query_p50_ms": False, "query_p99_ms": False,
+    "analyze_seconds": False, "compare_seconds": False, "peak_rss_mb": False,
+}
+
+TOPICS = ["revenue", "churn", "latency", "inventory", "hiring", "pricing", "security", "compliance"]
+
+
+def make_pdf(pages: int, variant: int = 0) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        topic = TOPICS[i % len(TOPICS)]
+        body = "\n".join(
+            f"Section {i}.{j}: {topic} moved {(i * 7 + j * 3 + variant) % 50}% against plan in region {j}."
+            for j in range(40))
+        page.insert_text((50, 60), body, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _pct(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_size(pages: int, queries: int, repeats: int) -> dict:
+    """Runs inside the child process, with cwd set to a scratch directory."""
+    import resource
+    sys.path.insert(0, str(ROOT))
+    from fastapi.testclient import TestClient
+    import api.main as api
+    from src.doc_ingestion.data_ingestion import FaissManager
+
+    pdf = make_pdf(pages)
+    pdf_changed = make_pdf(pages, variant=1)
+    out = {"pages": pages}
+    with TestClient(api.app) as client:
+        t0 = time.perf_counter()
+        r = client.post("/chat/index", files=[("files", ("corpus.pdf", io.BytesIO(pdf), "application/pdf"))])
+        elapsed = time.perf_counter() - t0
+        r.raise_for_status()
+        session_id = r.json()["session_id"]
+        chunks = sum(d["chunks"] for d in FaissManager(Path(api.FAISS_BASE) / session_id).documents().values())
+        out.update(ingest_seconds=round(elapsed, 3), chunks=chunks,
+                   pages_per_s=round(pages / elapsed, 1), chunks_per_s=round(chunks / elapsed, 1))
+
+        latencies = []
+        for q in range(queries):
+            topic = TOPICS[q % len(TOPICS)]
+            t0 = time.perf_counter()
+            r = client.post("/chat/query", data={"query": f"How did {topic} move in region {q % 40}?",
+                                                 "session_id": session_id})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            r.raise_for_status()
+        out.update(query_p50_ms=round(_pct(latencies, 0.50), 2), query_p99_ms=round(_pct(latencies, 0.99), 2))
+
+        analyze, compare = [], []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            client.post("/analyze", files={"file": ("report.pdf", io.BytesIO(pdf), "application/pdf")}).raise_for_status()
+            analyze.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            client.post("/compare", files={"reference": ("v1.pdf", io.BytesIO(pdf), "application/pdf"),
+                                           "actual": ("v2.pdf", io.BytesIO(pdf_changed), "application/pdf")}
+                        ).raise_for_status()
+            compare.append(time.perf_counter() - t0)
+        out.update(analyze_seconds=round(statistics.median(analyze), 3),
+                   compare_seconds=round(statistics.median(compare), 3))
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux, bytes on macOS
+    out["peak_rss_mb"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return out
+
+
+def check_regressions(current: dict, baseline: dict, tolerance: float) -> list:
+    previous = {r["pages"]: r for r in baseline.get("results", [])}
+    problems = []
+    for result in current["results"]:
+        old = previous.get(result["pages"])
+        if not old:
+            continue
+        for metric, higher_is_better in TRACKED.items():
+            new_v, old_v = result.get(metric), old.get(metric)
+            if not new_v or not old_v:
+                continue
+            change = (new_v - old_v) / old_v
+            if (-change if higher_is_better else change) > tolerance:
+                problems.append({"pages": result["pages"], "metric": metric, "baseline": old_v,
+                                 "current": new_v, "change_pct": round(100 * change, 1)})
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", default="10,50,200", help="comma-separated corpus sizes (pages)")
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--repeats", type=int, default=3, help="runs of /analyze and /compare per size")
+    ap.add_argument("--llm-latency-ms", type=float, default=20.0)
+    ap.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--baseline", help="earlier --out file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--child-out", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child is not None:
+        Path(args.child_out).write_text(json.dumps(run_size(args.child, args.queries, args.repeats)))
+        return
+
+    env = {**os.environ, "MODEL_PROVIDER": "fake", "JANITOR_ENABLED": "false",
+           "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms), "FAKE_LLM_JITTER_MS": str(args.llm_jitter_ms)}
+    results = []
+    for pages in (int(p) for p in args.pages.split(",") if p.strip()):
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copytree(ROOT / "config", Path(tmp) / "config")  # ModelLoader reads config/ from the cwd
+            child_out = Path(tmp) / "result.json"
+            subprocess.run([sys.executable, str(Path(__file__).resolve()), "--child", str(pages),
+                            "--child-out", str(child_out), "--queries", str(args.queries),
+                            "--repeats", str(args.repeats)],
+                           cwd=tmp, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            results.append(json.loads(child_out.read_text()))
+            print(json.dumps(results[-1]), flush=True)
+
+    report = {
+        "meta": {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "llm_latency_ms": args.llm_latency_ms, "llm_jitter_ms": args.llm_jitter_ms,
+                 "queries": args.queries, "repeats": args.repeats},
+        "results": results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"results written to {args.out}")
+
+    if args.baseline:
+        problems = check_regressions(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        print(json.dumps({"baseline": args.baseline, "tolerance": args.tolerance, "regressions": problems}, indent=2))
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
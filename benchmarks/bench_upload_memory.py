@@ -0,0 +1,75 @@
+"""
+Peak Python heap while saving an upload, streamed vs. whole-file buffering.
+
+Builds a starlette UploadFile (spooled to disk, as FastAPI does) of each size,
+then saves it with utils.file_io.stream_upload_to_disk and with the previous
+`f.write(adapter.getbuffer())` path, recording tracemalloc peaks. The streamed
+peak should stay flat at roughly one chunk regardless of file size.
+
+Usage:
+    python benchmarks/bench_upload_memory.py --sizes-mb 8 64 256
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from starlette.datastructures import UploadFile  # noqa: E402
+from utils.document_ops import FastAPIFileAdapter  # noqa: E402
+from utils.file_io import stream_upload_to_disk, UPLOAD_CHUNK_SIZE  # noqa: E402
+
+
+def _make_upload(size: int) -> UploadFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    block = os.urandom(UPLOAD_CHUNK_SIZE)
+    for _ in range(size // len(block)):
+        spooled.write(block)
+    spooled.write(block[: size % len(block)])
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename="upload.pdf")  # type: ignore[arg-type]
+
+
+def _measure(fn) -> dict:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"peak_mb": round(peak / 1024 ** 2, 2), "seconds": round(elapsed, 3)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes-mb", type=int, nargs="+", default=[8, 64, 256])
+    args = ap.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "saved.pdf"
+        for mb in args.sizes_mb:
+            size = mb * 1024 * 1024
+            adapter = FastAPIFileAdapter(_make_upload(size))
+
+            streamed = _measure(lambda: stream_upload_to_disk(adapter, out, max_bytes=0))
+
+            def buffered():
+                with open(out, "wb") as f:
+                    f.write(adapter.getbuffer())
+            whole = _measure(buffered)
+            results.append({"size_mb": mb, "streamed": streamed, "buffered": whole})
+
+    print(json.dumps({"chunk_size": UPLOAD_CHUNK_SIZE, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Cold start: first queries after a (re)start, with and without the warm-up.
+
+Offline (MODEL_PROVIDER=fake) in a scratch working directory: --sessions
+chat sessions of --pages pages are indexed and queried once each, which
+leaves the session usage file the next process preloads from. Then, per
+mode, --runs fresh interpreters each start the app (lifespan included),
+note when /health (liveness) and /health/ready (readiness) first answer
+200, and send the first query of every session:
+  cold  WARM_START_ENABLED=false: clients are built and every index is
+        FAISS.load_local'ed by the first query that needs it
+  warm  the lifespan warm-up builds the clients and preloads the hot
+        sessions' indexes (within warm_start.memory_budget_mb)
+Reports p50/p99 first-query latency over all runs and time to live/ready.
+
+Usage:
+    python benchmarks/bench_warm_start.py --sessions 8 --pages 60 --runs 5
+"""
+from __future__ import annotations
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_suite import _pct, make_pdf  # noqa: E402
+
+_CHILD = f"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {str(ROOT)!r})
+import api.main as api
+from fastapi.testclient import TestClient
+sessions = json.loads(sys.argv[1])
+out = {{"first_query_ms": []}}
+with TestClient(api.app) as client:
+    assert client.get("/health").status_code == 200
+    out["live_s"] = time.perf_counter() - t0
+    while client.get("/health/ready").status_code != 200:
+        time.sleep(0.005)
+    out["ready_s"] = time.perf_counter() - t0
+    for sid in sessions:
+        t1 = time.perf_counter()
+        r = client.post("/chat/query", data={{"query": "What moved against plan?", "session_id": sid}})
+        assert r.status_code == 200, r.text
+        out["first_query_ms"].append((time.perf_counter() - t1) * 1000)
+print("RESULT " + json.dumps(out), flush=True)
+"""
+
+
+def run_mode(mode: str, sessions, args) -> dict:
+    env = {**os.environ, "WARM_START_ENABLED": "true" if mode == "warm" else "false"}
+    first, live, ready = [], [], []
+    for _ in range(args.runs):
+        proc = subprocess.run([sys.executable, "-c", _CHILD, json.dumps(sessions)], env=env,
+                              capture_output=True, text=True, check=True)
+        line = next(l for l in proc.stdout.splitlines() if l.startswith("RESULT "))
+        result = json.loads(line[len("RESULT "):])
+        first += result["first_query_ms"]
+        live.append(result["live_s"])
+        ready.append(result["ready_s"])
+    return {
+        "mode": mode,
+        "first_query_p50_ms": round(statistics.median(first), 1),
+        "first_query_p99_ms": round(_pct(first, 0.99), 1),
+        "first_query_max_ms": round(max(first), 1),
+        "time_to_live_s": round(statistics.median(live), 3),
+        "time_to_ready_s": round(statistics.median(ready), 3),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=8)
+    ap.add_argument("--pages", type=int, default=60)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    shutil.copytree(ROOT / "config", Path(tmp) / "config")
+    os.chdir(tmp)
+    os.environ.update(MODEL_PROVIDER="fake", JANITOR_ENABLED="false", FAKE_LLM_LATENCY_MS="0")
+    sessions = [f"hot{i}" for i in range(args.sessions)]
+    try:
+        from fastapi.testclient import TestClient
+        import api.main as api
+        with TestClient(api.app) as client:
+            for i, sid in enumerate(sessions):
+                r = client.post("/chat/index", data={"session_id": sid},
+                                files=[("files", ("doc.pdf", io.BytesIO(make_pdf(args.pages, variant=i)),
+                                                  "application/pdf"))])
+                r.raise_for_status()
+                client.post("/chat/query", data={"query": "warm", "session_id": sid}).raise_for_status()
+        index_mb = sum(f.stat().st_size for f in Path("faiss_index").rglob("index.*")) / 2 ** 20
+        rows = [run_mode(mode, sessions, args) for mode in ("cold", "warm")]
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(json.dumps({"sessions": args.sessions, "pages": args.pages, "runs": args.runs,
+                      "index_mb_total": round(index_mb, 2), "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,180 @@
 import os
+import atexit
 import logging
-from datetime import datetime
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
 import structlog
 
+# Process-wide logging state: handlers, the background writer and structlog are configured once.
+_CONFIG_LOCK = threading.Lock()
+_LISTENER: Optional[QueueListener] = None
+_LOG_FILE_PATH: Optional[str] = None
+_LOGGERS: Dict[str, object] = {}
+
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+
+def _parse_sampling(spec: str) -> Dict[str, float]:
+    """LOG_SAMPLING="Chunk embedded=0.01,File saved for ingestion=0.1" -> {event: keep rate}."""
+    rates: Dict[str, float] = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        event, _, rate = part.rpartition("=")
+        if event:
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+class EventSampler:
+    """
+    structlog processor that keeps only a fraction of high-volume info/debug
+    events (per event name). Warnings and errors are never sampled out.
+    """
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        self.rates: Dict[str, float] = dict(rates or {})
+
+    def __call__(self, logger, method_name, event_dict):
+        rate = self.rates.get(event_dict.get("event"))  # type: ignore[arg-type]
+        if rate is not None and method_name in ("debug", "info") and random.random() >= rate:
+            raise structlog.DropEvent
+        return event_dict
+
+
+SAMPLER = EventSampler(_parse_sampling(os.getenv("LOG_SAMPLING", "")))
+
+
+def _timestamp_from_record(logger, method_name, event_dict):
+    """ISO-8601 UTC timestamp taken from the LogRecord's creation time (runs on the listener thread)."""
+    record = event_dict.get("_record")
+    created = record.created if record is not None else datetime.now(timezone.utc).timestamp()
+    event_dict["timestamp"] = datetime.fromtimestamp(created, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    return event_dict
+
+
+class _LazyRotatingFileHandler(RotatingFileHandler):
+    """Creates the log directory with the file, i.e. on the first record written."""
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class _LazyLogger:
+    """
+    Stand-in returned by get_logger(): logging is configured (listener thread,
+    handlers, structlog) on the first method call, not at import time. Resolved
+    attributes are cached on the instance, so later calls cost a plain lookup.
+    """
+    def __init__(self, owner: "CustomLogger", name: str):
+        self._owner = owner
+        self._name = name
+        self._logger = None
+
+    def _resolve(self):
+        if self._logger is None:
+            self._owner._configure()
+            self._logger = structlog.get_logger(self._name)
+        return self._logger
+
+    def __getattr__(self, item):
+        value = getattr(self._resolve(), item)
+        if callable(value) and not item.startswith("_"):
+            setattr(self, item, value)
+        return value
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Enqueue the structlog event dict as-is; JSON rendering happens on the listener thread."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 class CustomLogger:
     def __init__(self, log_dir="logs"):
-        # Ensure logs directory exists
         self.logs_dir = os.path.join(os.getcwd(), log_dir)
-        os.makedirs(self.logs_dir, exist_ok=True)
+        self.log_file_path = _LOG_FILE_PATH
 
-        # Timestamped log file (for persistence)
-        log_file = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
-        self.log_file_path = os.path.join(self.logs_dir, log_file)
+    def _configure(self):
+        """
+        Wire console + size-rotated file output behind a QueueHandler/QueueListener
+        pair, once per process. Request threads only build the event dict and
+        enqueue it; rendering and I/O happen on the listener's thread.
+        """
+        global _LISTENER, _LOG_FILE_PATH
+        with _CONFIG_LOCK:
+            if _LISTENER is not None:
+                return
 
-    def get_logger(self, name=__file__):
-        logger_name = os.path.basename(name)
+            # Timestamped log file (for persistence)
+            log_file = f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"
+            _LOG_FILE_PATH = os.path.join(self.logs_dir, log_file)
+            self.log_file_path = _LOG_FILE_PATH
+
+            formatter = structlog.stdlib.ProcessorFormatter(
+                processors=[
+                    _timestamp_from_record,
+                    structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+                    structlog.processors.EventRenamer(to="event"),
+                    structlog.processors.JSONRenderer(),
+                ],
+                foreign_pre_chain=[  # records from non-structlog loggers (httpx, uvicorn, ...)
+                    structlog.processors.add_log_level,
+                ],
+            )
+
+            file_handler = _LazyRotatingFileHandler(_LOG_FILE_PATH, maxBytes=LOG_MAX_BYTES,
+                                               backupCount=LOG_BACKUP_COUNT, delay=True)
+            file_handler.setLevel(logging.INFO)
+            file_handler.setFormatter(formatter)  # Raw JSON lines
 
-        # Configure logging for console + file (both JSON)
-        file_handler = logging.FileHandler(self.log_file_path)
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(logging.Formatter("%(message)s"))  # Raw JSON lines
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.INFO)
+            console_handler.setFormatter(formatter)
 
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_handler.setFormatter(logging.Formatter("%(message)s"))
+            log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+            root = logging.getLogger()
+            root.handlers = [_DeferredQueueHandler(log_queue)]
+            root.setLevel(logging.INFO)
 
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(message)s",  # Structlog will handle JSON rendering
-            handlers=[console_handler, file_handler]
-        )
+            _LISTENER = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+            _LISTENER.start()
+            atexit.register(_LISTENER.stop)  # drain the queue on interpreter exit
 
-        # Configure structlog for JSON structured logging
-        structlog.configure(
-            processors=[
-                structlog.processors.TimeStamper(fmt="iso", utc=True, key="timestamp"),
-                structlog.processors.add_log_level,
-                structlog.processors.EventRenamer(to="event"),
-                structlog.processors.JSONRenderer()
-            ],
-            logger_factory=structlog.stdlib.LoggerFactory(),
-            cache_logger_on_first_use=True,
-        )
+            # Configure structlog for JSON structured logging
+            structlog.configure(
+                processors=[
+                    structlog.contextvars.merge_contextvars,  # trace_id bound per request / job
+                    structlog.stdlib.filter_by_level,
+                    structlog.processors.add_log_level,
+                    SAMPLER,
+                    structlog.stdlib.PositionalArgumentsFormatter(),
+                    structlog.processors.format_exc_info,  # sys.exc_info() is only valid on this thread
+                    structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+                ],
+                logger_factory=structlog.stdlib.LoggerFactory(),
+                wrapper_class=structlog.stdlib.BoundLogger,
+                cache_logger_on_first_use=True,
+            )
+
+    def get_logger(self, name=__file__):
+        logger_name = os.path.basename(name)
+        logger = _LOGGERS.get(logger_name)
+        if logger is None:
+            # constructors call this per request; hand back the same logger per name
+            logger = _LOGGERS.setdefault(logger_name, _LazyLogger(self, logger_name))
+        return logger
 
-        return structlog.get_logger(logger_name)
+    @staticmethod
+    def set_sampling(event: str, rate: float):
+        """Keep only `rate` (0..1) of info/debug events named `event`; 1.0 disables sampling."""
+        SAMPLER.rates[event] = rate
 
 
 # # --- Usage Example ---
 # if __name__ == "__main__":
 #     logger = CustomLogger().get_logger(__file__)
 #     logger.info("User uploaded a file", user_id=123, filename="report.pdf")
-#     logger.error("Failed to process PDF", error="File not found", user_id=123)
\ No newline at end of file
+#     logger.error("Failed to process PDF", error="File not found", user_id=123)
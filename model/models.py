@@ -13,6 +13,11 @@ class Metadata(BaseModel):
     PageCount: Union[int, str]
     SentimentTone: str
 
+class DocumentSummary(BaseModel):
+    """The part of Metadata that needs the LLM; the rest is read from the PDF."""
+    Summary: List[str]
+    SentimentTone: str
+
 class ChangeFormat(BaseModel):
     Page: str
     changes: str
@@ -20,8 +25,17 @@ class ChangeFormat(BaseModel):
 class SummaryResponse(RootModel[list[ChangeFormat]]):
     pass
 
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    session_id: Optional[str] = None
+    session_ids: Optional[List[str]] = None  # several sessions -> federated retrieval
+    use_session_dirs: bool = True
+    k: Optional[int] = None  # None -> retriever.top_k from config
+    tenant: Optional[str] = None  # fair-share key for the LLM governor; defaults to the session
+
 class PromptType(str, Enum):
     DOCUMENT_ANALYSIS = "document_analysis"
+    DOCUMENT_SUMMARY = "document_summary"
     DOCUMENT_COMPARISON = "document_comparison"
     CONTEXTUALIZE_QUESTION = "contextualize_question"
     CONTEXT_QA = "context_qa"
@@ -11,6 +11,17 @@ Analyze this document:
 {document_text}
 """)
 
+# Prompt for the LLM half of hybrid analysis (metadata fields are extracted locally)
+document_summary_prompt = ChatPromptTemplate.from_template("""
+Summarize the document below in a few bullet points and name its overall sentiment/tone.
+Return ONLY valid JSON matching the exact schema below.
+
+{format_instructions}
+
+Document ({page_note}):
+{document_text}
+""")
+
 # Prompt for document comparison
 document_comparison_prompt = ChatPromptTemplate.from_template("""
 You will be provided with content from two PDFs. Your tasks are as follows:
@@ -54,6 +65,7 @@ context_qa_prompt = ChatPromptTemplate.from_messages([
 # Central dictionary to register prompts
 PROMPT_REGISTRY = {
     "document_analysis": document_analysis_prompt,
+    "document_summary": document_summary_prompt,
     "document_comparison": document_comparison_prompt,
     "contextualize_question": contextualize_question_prompt,
     "context_qa": context_qa_prompt,
@@ -1,4 +1,5 @@
 import os, sys
+from typing import Any, Dict, List, Optional, Tuple
 from utils.model_loader import ModelLoader
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
@@ -6,6 +7,38 @@ from model.models import *
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.output_parsers import OutputFixingParser
 from prompt_library.prompts import PROMPT_REGISTRY
+from utils.document_ops import NOT_AVAILABLE
+from utils.language import detect_language
+from utils.metrics import REGISTRY, span
+from utils.single_flight import SingleFlight, content_key
+from utils.structured_output import json_mode, parse_structured, structured_output_settings
+from utils.vector_search import estimate_tokens
+
+PROMPT_TOKENS = REGISTRY.counter("docportal_llm_prompt_tokens_total",
+                                 "Estimated prompt tokens sent to the LLM", ("component",))
+# the same document analyzed by several users at once -> identical prompts -> one LLM call
+ANALYSIS_CALLS = SingleFlight("analyze.llm")
+
+
+def sample_pages(pages: List[str], max_pages: int, max_chars: int) -> Tuple[List[int], List[str]]:
+    """
+    Representative pages of a long document: the first two, the last, and
+    evenly spaced ones in between, `max_pages` in total, each cut to an equal
+    share of `max_chars`. Short documents are returned whole.
+    Returns (0-based page numbers, page texts).
+    """
+    if len(pages) <= max_pages and sum(len(p) for p in pages) <= max_chars:
+        return list(range(len(pages))), list(pages)
+    if len(pages) <= max_pages:
+        picked = list(range(len(pages)))
+    else:
+        head = [0, 1][:max(1, max_pages - 1)]
+        middle = max_pages - len(head) - 1
+        step = (len(pages) - 1 - len(head)) / (middle + 1)
+        picked = sorted(set(head + [len(head) + int(step * (i + 1)) for i in range(middle)] + [len(pages) - 1]))
+    share = max(1, max_chars // len(picked))
+    return picked, [pages[i][:share] for i in picked]
+
 
 class DocumentAnalyzer:
     """
@@ -18,12 +51,19 @@ class DocumentAnalyzer:
         try:
             self.loader = ModelLoader()
             self.llm = self.loader.load_llm()
+            self.settings = self.loader.config.get("analysis", {})
+            self.output_settings = structured_output_settings(self.loader.config)
+            # native JSON mode for the extraction calls; the fixing parsers keep the plain client
+            self.json_llm = json_mode(self.llm, self.output_settings["native_json"])
 
             # Prepare parsers
             self.parser = JsonOutputParser(pydantic_object=Metadata)
             self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser, llm=self.llm)
+            self.summary_parser = JsonOutputParser(pydantic_object=DocumentSummary)
+            self.summary_fixing_parser = OutputFixingParser.from_llm(parser=self.summary_parser, llm=self.llm)
 
-            self.prompt = PROMPT_REGISTRY["document_analysis"]
+            self.prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_ANALYSIS.value]
+            self.summary_prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_SUMMARY.value]
 
             self.log.info('DocumentAnalyzer initialized successfully')
 
@@ -31,25 +71,83 @@ class DocumentAnalyzer:
             self.log.error(f"Error initializing DocumentAnalyzer: {str(e)}")
             raise DocumentPortalException("Failed to initialize DocumentAnalyzer", e) from e #type: ignore
 
+    def _invoke_json(self, prompt_value, parser, fixing_parser) -> Dict[str, Any]:
+        prompt_text = prompt_value.to_string()
+
+        def call() -> Dict[str, Any]:
+            PROMPT_TOKENS.inc(estimate_tokens(prompt_text), component="analyze")
+            with span("analyze.llm"):
+                message = self.json_llm.invoke(prompt_value)
+            return parse_structured(message, parser, fixing_parser, "analyze",
+                                    local_repair=self.output_settings["local_repair"])
+
+        # followers get the leader's dict: copy before handing it out
+        return dict(ANALYSIS_CALLS.do(content_key(self.llm.model_name, prompt_text), call))
 
     def analyze_document(self, document_text: str):
         """
         Analyze a document's text and extract metadata & summary.
         """
         try:
-            chain = self.prompt | self.llm | self.fixing_parser
+            with span("analyze.prompt_build"):
+                prompt_value = self.prompt.invoke({
+                    "format_instructions": self.parser.get_format_instructions(),
+                    "document_text": document_text
+                })
 
-            self.log.info("Meta-data analysis chain initialized")
+            self.log.info("Meta-data analysis prompt built")
 
-            response = chain.invoke({
-                "format_instructions": self.parser.get_format_instructions(),
-                "document_text": document_text
-            })
+            response = self._invoke_json(prompt_value, self.parser, self.fixing_parser)
 
             self.log.info("Metadata extraction successful", keys=list(response.keys()))
 
             return response
-        
+
+        except Exception as e:
+            self.log.error(f"Metadata analysis failed", error=str(e))
+            raise DocumentPortalException("Metadata extraction failed", sys) #type: ignore
+
+    def analyze_pages(self, pages: List[str], pdf_metadata: Optional[Dict[str, Any]] = None):
+        """
+        Hybrid analysis of a PDF's page texts: Title, Author, dates, Publisher
+        and PageCount come from `pdf_metadata` (utils.document_ops.extract_pdf_metadata),
+        Language from a local detector, and only Summary and SentimentTone from
+        the LLM, over a page sample for long documents. With `analysis.mode: llm`
+        the whole document goes through analyze_document instead.
+        """
+        if self.settings.get("mode", "hybrid") != "hybrid":
+            text = "\n".join(f"\n--- Page {i + 1} ---\n{page}" for i, page in enumerate(pages))
+            return self.analyze_document(text)
+        try:
+            with span("analyze.local_metadata"):
+                result: Dict[str, Any] = dict(pdf_metadata or {})
+                result.setdefault("PageCount", len(pages))
+                if result.get("Title", NOT_AVAILABLE) == NOT_AVAILABLE:
+                    first_line = next((line.strip() for page in pages for line in page.splitlines() if line.strip()), "")
+                    result["Title"] = first_line[:200] or NOT_AVAILABLE
+                for field in ("Author", "DateCreated", "LateModifiedDate", "Publisher"):
+                    result.setdefault(field, NOT_AVAILABLE)
+                result["Language"] = detect_language("\n".join(pages))
+
+            with span("analyze.prompt_build"):
+                picked, texts = sample_pages(pages, int(self.settings.get("max_pages", 8)),
+                                             int(self.settings.get("max_chars", 24000)))
+                page_note = (f"all {len(pages)} pages" if len(picked) == len(pages)
+                             else f"pages {', '.join(str(i + 1) for i in picked)} of {len(pages)}")
+                prompt_value = self.summary_prompt.invoke({
+                    "format_instructions": self.summary_parser.get_format_instructions(),
+                    "page_note": page_note,
+                    "document_text": "\n".join(f"\n--- Page {i + 1} ---\n{t}" for i, t in zip(picked, texts)),
+                })
+
+            summary = self._invoke_json(prompt_value, self.summary_parser, self.summary_fixing_parser)
+            result["Summary"] = summary.get("Summary", [])
+            result["SentimentTone"] = summary.get("SentimentTone", NOT_AVAILABLE)
+
+            self.log.info("Hybrid metadata extraction successful", pages=len(pages), sampled_pages=len(picked),
+                          language=result["Language"], prompt_chars=len(prompt_value.to_string()))
+            return {field: result.get(field) for field in Metadata.model_fields}
+
         except Exception as e:
             self.log.error(f"Metadata analysis failed", error=str(e))
-            raise DocumentPortalException("Metadata extraction failed", sys) #type: ignore
\ No newline at end of file
+            raise DocumentPortalException("Metadata extraction failed", sys) #type: ignore
@@ -1,16 +1,30 @@
 import sys
 import os
+import asyncio
 from operator import itemgetter
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_community.vectorstores import FAISS
+from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from utils.model_loader import ModelLoader
 from exception.custom_exception import DocumentPortalException
 from logger.custom_logger import CustomLogger
 from prompt_library.prompts import PROMPT_REGISTRY
 from model.models import PromptType
+from utils.metrics import METRICS_ENABLED, span
+from utils.vector_search import AdaptiveTopK, FederatedRetriever, StoreTarget, retrieve_batch
+from src.doc_ingestion.data_ingestion import load_faiss_index
+
+
+def _traced(stage: str, runnable):
+    """Time a chain step as a span; the step is returned unchanged when metrics are off."""
+    if not METRICS_ENABLED:
+        return runnable
+
+    def run(inputs, config):
+        with span(stage):
+            return runnable.invoke(inputs, config)
+    return RunnableLambda(run, name=stage)
 
 class ConversationalRAG:
     def __init__(self, session_id: str, retriever=None):
@@ -20,10 +34,11 @@ class ConversationalRAG:
             self.llm = self._load_llm()
             self.contextualize_prompt = PROMPT_REGISTRY.get(PromptType.CONTEXTUALIZE_QUESTION.value)
             self.qa_prompt = PROMPT_REGISTRY.get(PromptType.CONTEXT_QA.value)
-            if retriever is None:
-                raise ValueError("Retriever must be provided for ConversationalRAG")
             self.retriever = retriever
-            self._build_lcel_chain()
+            self.chain = None
+            # Without a retriever the chain is built by load_retriever_from_faiss / set_retriever
+            if self.retriever is not None:
+                self._build_lcel_chain()
             self.log.info("ConversationalRAG initialized successfully.", session_id=self.session_id)
 
 
@@ -31,22 +46,24 @@ class ConversationalRAG:
             self.log.error('Failed to initialize ConversationalRAG', error=str(e))
             raise DocumentPortalException("Failed to initialize ConversationalRAG", sys)  # type: ignore
 
-    def load_retriever_from_faiss(self, index_path: str):
+    def load_retriever_from_faiss(self, index_path: str, k: int = 5, policy: Optional[AdaptiveTopK] = None):
         '''
-        Load the retriever from a FAISS index.
+        Load the retriever from a FAISS index: top-`k` similarity search, or
+        up to `k` chunks trimmed by an adaptive top-k `policy`.
         '''
         try:
             embeddings = ModelLoader().load_embeddings()
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directory not found: {index_path}")
             
-            vectorstore = FAISS.load_local(
-                index_path,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
+            vectorstore = load_faiss_index(index_path, embeddings)
 
-            self.retriever = vectorstore.as_retriever(search_type='similarity',search_kwargs={"k": 5})
+            if policy is None:
+                self.retriever = vectorstore.as_retriever(search_type='similarity',search_kwargs={"k": k})
+            else:
+                self.retriever = FederatedRetriever(targets=[StoreTarget(self.session_id, vectorstore)],
+                                                    embeddings=embeddings, k=k, policy=policy)
+            self._build_lcel_chain()
             self.log.info("Retriever loaded from FAISS index successfully.", index_path=index_path, session_id=self.session_id)
             return self.retriever
             
@@ -54,20 +71,70 @@ class ConversationalRAG:
             self.log.error("Error loading retriever from FAISS", error=str(e))
             raise DocumentPortalException("Error loading retriever from FAISS", sys)  # type: ignore
 
+    def set_retriever(self, retriever):
+        '''
+        Use an already-built retriever (e.g. a session-scoped view of a shared index).
+        '''
+        self.retriever = retriever
+        self._build_lcel_chain()
+        return self.retriever
+
     def invoke(self, user_input: str, chat_history: Optional[List[BaseMessage]]) -> str:
+        return self.invoke_with_sources(user_input, chat_history)[0]
+
+    def invoke_with_sources(self, user_input: str, chat_history: Optional[List[BaseMessage]]):
+        '''
+        Answer plus the retrieved documents it was generated from.
+        '''
         try:
+            if self.chain is None:
+                raise ValueError("No retriever loaded; call load_retriever_from_faiss() first")
             chat_history = chat_history or []
             payload = {"input": user_input, "chat_history": chat_history}
-            answer = self.chain.invoke(payload)
+            result = self.chain.invoke(payload)
+            answer, docs = result["answer"], result["docs"]
             if not answer:
                 self.log.warning("No answer returned from ConversationalRAG", user_input=user_input, session_id=self.session_id)
-                return "No relevant information found."
+                return "No relevant information found.", docs
             self.log.info("ConversationalRAG invoked successfully.", user_input=user_input, session_id=self.session_id, answer_preview=answer[:100])
-            return answer
+            return answer, docs
         except Exception as e:
             self.log.error("Error invoking ConversationalRAG", error=str(e))
             raise DocumentPortalException("Error invoking ConversationalRAG", sys)  # type: ignore
 
+    async def ainvoke_batch(self, questions: List[str], k: int = 5, max_concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Answer many standalone questions (no chat history, so no rewrite step):
+        one batched embedding call and one multi-vector search for all of them,
+        then answers generated concurrently, at most `max_concurrency` LLM calls
+        in flight. Results keep the input order; a failed item carries "error".
+        """
+        if self.chain is None:
+            raise DocumentPortalException("No retriever loaded; call load_retriever_from_faiss() first", sys)  # type: ignore
+        try:
+            contexts = await asyncio.to_thread(retrieve_batch, self.retriever, questions, k)
+        except Exception as e:
+            self.log.error("Batch retrieval failed", error=str(e), session_id=self.session_id)
+            raise DocumentPortalException("Batch retrieval failed", e) from e
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def answer(index: int, question: str, docs) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    with span("chat.generate"):
+                        text = await self.answer_chain.ainvoke(
+                            {"context": self._format_docs(docs), "input": question, "chat_history": []})
+                    return {"index": index, "question": question, "answer": text or "No relevant information found."}
+                except Exception as e:
+                    self.log.error("Batch item failed", index=index, error=str(e), session_id=self.session_id)
+                    return {"index": index, "question": question, "error": str(e)}
+
+        results = await asyncio.gather(*(answer(i, q, docs) for i, (q, docs) in enumerate(zip(questions, contexts))))
+        self.log.info("ConversationalRAG batch answered", session_id=self.session_id, questions=len(questions),
+                      errors=sum(1 for r in results if "error" in r))
+        return list(results)
+
     def _load_llm(self):
         try:
             llm = ModelLoader().load_llm()
@@ -95,17 +162,24 @@ class ConversationalRAG:
                 | StrOutputParser()
             )
 
-            retrieve_docs = question_rewriter | self.retriever | self._format_docs
+            retrieve_docs = (
+                _traced("chat.rewrite", question_rewriter)
+                | _traced("chat.retrieve", self.retriever)
+            )
+
+            self.answer_chain = self.qa_prompt | self.llm | StrOutputParser() # type: ignore
 
+            # {"input", "chat_history"} -> + "docs" -> + "answer"; the docs are kept for source attribution
             self.chain = (
-                {
-                    "context": retrieve_docs,
-                    "input": itemgetter("input"),
-                    "chat_history": itemgetter("chat_history"),
-                }
-                | self.qa_prompt # type: ignore
-                | self.llm
-                | StrOutputParser()
+                RunnablePassthrough.assign(docs=retrieve_docs)
+                | RunnablePassthrough.assign(answer=(
+                    {
+                        "context": lambda x: self._format_docs(x["docs"]),
+                        "input": itemgetter("input"),
+                        "chat_history": itemgetter("chat_history"),
+                    }
+                    | _traced("chat.generate", self.answer_chain)
+                ))
             )
             self.log.info("LCEL chain built successfully.", session_id=self.session_id)
         except Exception as e:
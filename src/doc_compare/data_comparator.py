@@ -1,6 +1,7 @@
+from __future__ import annotations
 import sys
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-import pandas as pd
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.output_parsers import OutputFixingParser
 from utils.model_loader import ModelLoader
@@ -8,6 +9,15 @@ from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
 from prompt_library.prompts import PROMPT_REGISTRY
 from model.models import SummaryResponse,PromptType
+from utils.metrics import span
+from utils.single_flight import SingleFlight, content_key
+from utils.structured_output import json_mode, parse_structured, structured_output_settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# identical comparisons in flight at once (same two uploads) share one LLM call
+COMPARISON_CALLS = SingleFlight("compare.llm")
 
 class DocumentComparatorLLM:
     def __init__(self):
@@ -17,8 +27,10 @@ class DocumentComparatorLLM:
         self.llm = self.loader.load_llm()
         self.parser = JsonOutputParser(pydantic_object=SummaryResponse)
         self.fixing_parser = OutputFixingParser.from_llm(parser=self.parser, llm=self.llm)
+        self.output_settings = structured_output_settings(self.loader.config)
+        # the comparison is a top-level array, which JSON mode cannot express: json_mode leaves it off
+        self.json_llm = json_mode(self.llm, self.output_settings["native_json"], schema=SummaryResponse)
         self.prompt = PROMPT_REGISTRY[PromptType.DOCUMENT_COMPARISON.value]
-        self.chain = self.prompt | self.llm | self.parser
         self.log.info("DocumentComparatorLLM initialized", model=self.llm)
 
     def compare_documents(self, combined_docs: str) -> pd.DataFrame:
@@ -29,7 +41,17 @@ class DocumentComparatorLLM:
             }
 
             self.log.info("Invoking document comparison LLM chain")
-            response = self.chain.invoke(inputs)
+            # prompt | llm | parser, timed one by one
+            with span("compare.prompt_build"):
+                prompt_value = self.prompt.invoke(inputs)
+
+            def call():
+                with span("compare.llm"):
+                    message = self.json_llm.invoke(prompt_value)
+                return parse_structured(message, self.parser, self.fixing_parser, "compare",
+                                        local_repair=self.output_settings["local_repair"])
+
+            response = COMPARISON_CALLS.do(content_key(self.llm.model_name, prompt_value.to_string()), call)
             self.log.info("Chain invoked successfully", response_preview=str(response)[:200])
             return self._format_response(response)
         except Exception as e:
@@ -38,6 +60,7 @@ class DocumentComparatorLLM:
 
     def _format_response(self, response_parsed: list[dict]) -> pd.DataFrame: #type: ignore
         try:
+            import pandas as pd  # heavy; only needed once a comparison actually runs
             df = pd.DataFrame(response_parsed)
             return df
         except Exception as e:
@@ -0,0 +1,302 @@
+"""
+Offline retrieval evaluation: recall vs. latency across chunking and index settings.
+
+Loads a corpus the way ChatIngestor does (load_documents, split_documents),
+embeds it with the local hashing embeddings (no network, no weights) and,
+for every combination of chunker, chunk size, overlap and FAISS index type,
+measures build time, index size and, for each k, recall@k, MRR@k and
+search latency percentiles (each search repeated --repeats times). Query
+embedding does not depend on the configuration: it is timed once per
+question and reported on its own, so the rows and their Pareto front
+(recall vs. search p95) compare search alone. Questions come from a JSONL
+file ({"question": ..., "gold": passage or [passages]}) or are synthesized
+from sentences of the corpus. A retrieved chunk answers a question when it
+contains at least --min-overlap of a gold passage as one contiguous span,
+so chunkers are judged on the same gold text.
+
+Index types are FAISS factory strings ("Flat" is what ChatIngestor builds;
+e.g. "HNSW32", "IVF64,Flat"); IVF indexes are searched with --nprobe lists.
+
+Usage:
+    python -m src.doc_eval.retrieval_eval --corpus data/eval/*.pdf --synthetic 200 \\
+        --chunkers layout,recursive --chunk-sizes 500,1000 --overlaps 0,200 \\
+        --index "Flat;HNSW32;IVF64,Flat" --k 1,3,5,10 --out eval.json
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import random
+import re
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from logger import GLOBAL_LOGGER as log
+from exception.custom_exception import DocumentPortalException
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_SPACE_RE = re.compile(r"\s+")
+_STOPWORDS = {"the", "a", "an", "of", "and", "or", "to", "in", "on", "for", "by", "with", "at", "is", "are", "was",
+              "were", "be", "it", "its", "this", "that", "as", "from", "which", "their", "has", "have"}
+
+
+@dataclass
+class QAPair:
+    question: str
+    gold: List[str]
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    chunker: str
+    chunk_size: int
+    chunk_overlap: int
+    index_type: str
+
+
+def _normalize(text: str) -> str:
+    return _SPACE_RE.sub(" ", text).strip().lower()
+
+
+def _pct(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def local_embeddings(config_path: str | Path = "config/config.yaml") -> Embeddings:
+    """LocalHashingEmbeddings from embedding_model.local in the config (its defaults without one)."""
+    from utils.local_embeddings import LocalHashingEmbeddings
+    block: Dict[str, Any] = {}
+    if Path(config_path).exists():
+        from utils.config_loader import load_config
+        block = (load_config(str(config_path)).get("embedding_model") or {}).get("local") or {}
+    return LocalHashingEmbeddings.from_config(block)
+
+
+# ---------- questions ----------
+def load_qa(path: str | Path) -> List[QAPair]:
+    """JSONL lines {"question": str, "gold": str | [str]}."""
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                gold = row["gold"] if isinstance(row["gold"], list) else [row["gold"]]
+                pairs.append(QAPair(question=row["question"], gold=gold))
+    return pairs
+
+
+def synthesize_qa(docs: Iterable[Document], n: int, seed: int = 0, drop: float = 0.3) -> List[QAPair]:
+    """
+    Questions from corpus sentences (8-40 words, occurring once in the corpus):
+    the sentence is the gold passage, the question keeps its content words
+    minus a random `drop` fraction, so it paraphrases rather than copies.
+    """
+    rng = random.Random(seed)
+    counts: Dict[str, int] = {}
+    sentences: Dict[str, str] = {}
+    for d in docs:
+        for sentence in _SENTENCE_RE.split(_SPACE_RE.sub(" ", d.page_content)):
+            words = sentence.split()
+            if 8 <= len(words) <= 40:
+                key = _normalize(sentence)
+                counts[key] = counts.get(key, 0) + 1
+                sentences.setdefault(key, sentence.strip())
+    unique = [sentences[key] for key, count in counts.items() if count == 1]
+    pairs = []
+    for sentence in rng.sample(unique, min(n, len(unique))):
+        words = [w for w in re.findall(r"[\w-]+", sentence) if w.lower() not in _STOPWORDS]
+        kept = [w for w in words if rng.random() >= drop] or words
+        pairs.append(QAPair(question=" ".join(kept) + "?", gold=[sentence]))
+    return pairs
+
+
+def is_hit(chunk_text: str, gold: str, min_overlap: float = 0.6) -> bool:
+    """True when `chunk_text` holds at least `min_overlap` of `gold` as one contiguous span."""
+    chunk, gold = _normalize(chunk_text), _normalize(gold)
+    if gold in chunk:
+        return True
+    match = SequenceMatcher(None, chunk, gold, autojunk=False).find_longest_match(0, len(chunk), 0, len(gold))
+    return match.size >= min_overlap * len(gold)
+
+
+# ---------- indexes ----------
+def build_index(vectors: np.ndarray, index_type: str, nprobe: int = 8):
+    import faiss
+    index = faiss.index_factory(vectors.shape[1], index_type)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    if "IVF" in index_type:
+        faiss.ParameterSpace().set_index_parameter(index, "nprobe", nprobe)
+    return index
+
+
+def index_bytes(index) -> int:
+    import faiss
+    return int(faiss.serialize_index(index).nbytes)
+
+
+# ---------- evaluation ----------
+def embed_queries(qa: List[QAPair], embeddings: Embeddings) -> Tuple[np.ndarray, List[float]]:
+    """Embed every question once; returns (query matrix, per-question embedding ms)."""
+    t0 = time.perf_counter()
+    vectors, embed_ms = [], []
+    for pair in qa:
+        t1 = time.perf_counter()
+        vectors.append(embeddings.embed_query(pair.question))
+        embed_ms.append((time.perf_counter() - t1) * 1000)
+    log.info("Questions embedded", questions=len(qa), seconds=round(time.perf_counter() - t0, 3))
+    return np.asarray(vectors, dtype=np.float32), embed_ms
+
+
+def latency_summary(samples_ms: Sequence[float], prefix: str) -> Dict[str, float]:
+    return {f"{prefix}_p50_ms": round(statistics.median(samples_ms), 4),
+            f"{prefix}_p95_ms": round(_pct(samples_ms, 0.95), 4),
+            f"{prefix}_p99_ms": round(_pct(samples_ms, 0.99), 4)}
+
+
+def evaluate(docs: List[Document], qa: List[QAPair], queries: np.ndarray, configs: Iterable[RetrievalConfig],
+             ks: Sequence[int], embeddings: Embeddings, min_overlap: float = 0.6, nprobe: int = 8,
+             repeats: int = 5, layouts: Optional[Dict[str, list]] = None) -> List[Dict[str, Any]]:
+    """
+    One row per (config, k). `queries` come from embed_queries: query
+    embedding does not depend on the config, so rows report search latency
+    only, each question's search timed `repeats` times (median kept) after
+    an untimed warm-up search.
+    """
+    from src.doc_ingestion.data_ingestion import split_documents
+
+    ks = sorted(set(ks))
+    rows: List[Dict[str, Any]] = []
+    split_cache: Dict[tuple, tuple] = {}
+    for config in configs:
+        split_key = (config.chunker, config.chunk_size, config.chunk_overlap)
+        if split_key not in split_cache:
+            t0 = time.perf_counter()
+            chunks = split_documents(docs, chunk_size=config.chunk_size, chunk_overlap=config.chunk_overlap,
+                                     chunker=config.chunker, layouts=layouts)
+            split_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            vectors = np.asarray(embeddings.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+            split_cache = {split_key: (chunks, vectors, split_s, time.perf_counter() - t0)}  # one split held at a time
+        chunks, vectors, split_s, embed_s = split_cache[split_key]
+        try:
+            t0 = time.perf_counter()
+            index = build_index(vectors, config.index_type, nprobe)
+            index_s = time.perf_counter() - t0
+        except RuntimeError as e:  # e.g. IVF with fewer vectors than lists
+            log.warning("Index type skipped", index_type=config.index_type, chunks=len(chunks), error=str(e))
+            continue
+        size = index_bytes(index)
+        texts = [c.page_content for c in chunks]
+        for k in ks:
+            index.search(queries[:1], k)  # warm-up, not timed
+            search_ms, ranks = [], []
+            for i, pair in enumerate(qa):
+                query = queries[i:i + 1]
+                samples = []
+                for _ in range(max(1, repeats)):
+                    t1 = time.perf_counter()
+                    _, ids = index.search(query, k)
+                    samples.append((time.perf_counter() - t1) * 1000)
+                search_ms.append(statistics.median(samples))
+                rank = next((r for r, idx in enumerate(ids[0], 1)
+                             if idx >= 0 and any(is_hit(texts[idx], g, min_overlap) for g in pair.gold)), None)
+                ranks.append(rank)
+            rows.append({
+                **asdict(config), "k": k,
+                "recall": round(sum(r is not None for r in ranks) / len(ranks), 4),
+                "mrr": round(sum(1 / r for r in ranks if r) / len(ranks), 4),
+                **latency_summary(search_ms, "search"),
+                "chunks": len(chunks),
+                "context_chars": round(k * sum(len(t) for t in texts) / len(texts)),
+                "index_mb": round(size / 2 ** 20, 3),
+                "build_s": round(split_s + embed_s + index_s, 3),
+            })
+        log.info("Configuration evaluated", **asdict(config), chunks=len(chunks))
+    mark_pareto(rows)
+    return rows
+
+
+def mark_pareto(rows: List[Dict[str, Any]], maximize: str = "recall", minimize: Sequence[str] = ("search_p95_ms",)):
+    """Set row["pareto"]: no other row is at least as good on every objective and better on one."""
+    def dominates(a, b) -> bool:
+        no_worse = a[maximize] >= b[maximize] and all(a[m] <= b[m] for m in minimize)
+        better = a[maximize] > b[maximize] or any(a[m] < b[m] for m in minimize)
+        return no_worse and better
+    for row in rows:
+        row["pareto"] = not any(dominates(other, row) for other in rows if other is not row)
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    """Markdown table, Pareto-optimal rows first, each group by recall descending."""
+    columns = ["pareto", "chunker", "chunk_size", "chunk_overlap", "index_type", "k", "recall", "mrr",
+               "search_p50_ms", "search_p95_ms", "search_p99_ms", "chunks", "context_chars", "index_mb", "build_s"]
+    ordered = sorted(rows, key=lambda r: (not r["pareto"], -r["recall"], r["search_p95_ms"]))
+    lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+    for row in ordered:
+        lines.append("| " + " | ".join("*" if c == "pareto" and row[c] else "" if c == "pareto" else str(row[c])
+                                       for c in columns) + " |")
+    return "\n".join(lines)
+
+
+def _csv(value: str, cast=str) -> List[Any]:
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", nargs="+", required=True, help="PDF/DOCX/TXT files")
+    ap.add_argument("--qa", help="JSONL question/gold pairs; without it questions are synthesized")
+    ap.add_argument("--synthetic", type=int, default=200, help="questions to synthesize without --qa")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--chunkers", default="layout,recursive")
+    ap.add_argument("--chunk-sizes", default="500,1000")
+    ap.add_argument("--overlaps", default="0,200")
+    ap.add_argument("--index", default="Flat;HNSW32", help="FAISS factory strings separated by ';'")
+    ap.add_argument("--nprobe", type=int, default=8)
+    ap.add_argument("--k", default="1,3,5,10")
+    ap.add_argument("--min-overlap", type=float, default=0.6)
+    ap.add_argument("--repeats", type=int, default=5, help="timed searches per question and config (median kept)")
+    ap.add_argument("--out", help="write rows as JSON here")
+    args = ap.parse_args(argv)
+
+    from utils.document_ops import load_documents
+    try:
+        chunkers = _csv(args.chunkers)
+        layouts = {} if "layout" in chunkers else None  # read each PDF's layout once, for every layout config
+        docs = load_documents([Path(p) for p in args.corpus], layouts=layouts)
+        if not docs:
+            raise ValueError("No documents loaded from --corpus")
+        qa = load_qa(args.qa) if args.qa else synthesize_qa(docs, args.synthetic, args.seed)
+        if not qa:
+            raise ValueError("No questions: pass --qa or a corpus with enough sentences")
+        configs = [RetrievalConfig(chunker, size, overlap, index_type)
+                   for chunker, size, overlap, index_type in itertools.product(
+                       chunkers, _csv(args.chunk_sizes, int), _csv(args.overlaps, int),
+                       [t.strip() for t in args.index.split(";") if t.strip()])]
+        embeddings = local_embeddings()
+        queries, embed_ms = embed_queries(qa, embeddings)
+        rows = evaluate(docs, qa, queries, configs, _csv(args.k, int), embeddings, args.min_overlap, args.nprobe,
+                        args.repeats, layouts)
+    except Exception as e:
+        log.error("Retrieval evaluation failed", error=str(e))
+        raise DocumentPortalException("Retrieval evaluation failed", e) from e
+    query_embed = latency_summary(embed_ms, "query_embed")
+    print(f"{len(qa)} questions, {len(docs)} pages/documents")
+    print("query embedding (shared by every row): "
+          + ", ".join(f"{name.split('_')[-2]} {value} ms" for name, value in query_embed.items()) + "\n")
+    print(format_table(rows))
+    if args.out:
+        Path(args.out).write_text(json.dumps({"questions": len(qa), **query_embed, "rows": rows}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,236 @@
 from __future__ import annotations
 import os
 import sys
+import copy
 import json
 import uuid
 import hashlib
 import shutil
+import threading
+import time
+import zlib
 from pathlib import Path
-from typing import Iterable, List, Optional, Dict, Any
-import fitz  # PyMuPDF
-from langchain.schema import Document
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Dict, Any, Set, Tuple
+import numpy as np
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from utils.model_loader import ModelLoader
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
-from utils.file_io import generate_session_id, save_uploaded_files
-from utils.document_ops import load_documents, concat_for_analysis, concat_for_comparison
+from utils.file_io import generate_session_id, save_uploaded_files, stream_upload_to_disk, unique_filename, SavedUpload
+from utils.document_ops import (load_documents, read_pdf_layout, read_pdf_pages, extract_pdf_metadata,
+                                concat_for_analysis, concat_for_comparison)
+from utils.blob_store import BlobStore
+from utils.vector_search import (AdaptiveTopK, SessionScopedRetriever, FederatedRetriever, ShardTarget, StoreTarget,
+                                 federated_pool)
+from utils.metrics import REGISTRY, span, timed
+from utils.deadline import check_deadline
+from utils.single_flight import SingleFlight
+from utils.layout_chunker import LayoutBlock, LayoutChunker
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS  # imported where used: it is not needed to serve /health
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+STORAGE_MODES = {"session_dirs", "shared"}
+SHARED_DIR_NAME = "_shared"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+# "recursive": RecursiveCharacterTextSplitter on page text for everything
+# "layout": PDFs split along their headings/blocks (utils.layout_chunker), other files recursively
+CHUNKER = os.getenv("CHUNKER", "recursive")
+
+# progress(stage, done, total) -- used by the async index job queue
+ProgressCallback = Callable[[str, int, int], None]
+
+
+@timed("ingest.embed")
+def _add_in_batches(vs: Optional[FAISS], docs: List[Document], emb, ids: Optional[List[str]] = None,
+                    progress: Optional[ProgressCallback] = None) -> FAISS:
+    """Embed and add docs in EMBED_BATCH_SIZE batches (creating the store if needed), reporting progress."""
+    from langchain_community.vectorstores import FAISS
+    total = len(docs)
+    if progress:
+        progress("embedding", 0, total)
+    for start in range(0, total, EMBED_BATCH_SIZE):
+        check_deadline("ingest.embed", pending_embeddings=total - start)
+        batch = docs[start:start + EMBED_BATCH_SIZE]
+        batch_ids = ids[start:start + EMBED_BATCH_SIZE] if ids else None
+        if vs is None:
+            vs = FAISS.from_documents(batch, emb, ids=batch_ids)
+        else:
+            vs.add_documents(batch, ids=batch_ids)
+        if progress:
+            progress("embedding", start + len(batch), total)
+    return vs  # type: ignore[return-value]
+
+
+@timed("ingest.embed")
+def _embed_in_batches(docs: List[Document], emb, progress: Optional[ProgressCallback] = None) -> List[np.ndarray]:
+    """Embed docs in EMBED_BATCH_SIZE batches without touching any store (so no lock is needed)."""
+    total = len(docs)
+    vectors: List[np.ndarray] = []
+    if progress:
+        progress("embedding", 0, total)
+    for start in range(0, total, EMBED_BATCH_SIZE):
+        check_deadline("ingest.embed", pending_embeddings=total - start)
+        batch = docs[start:start + EMBED_BATCH_SIZE]
+        vectors.extend(np.asarray(emb.embed_documents([d.page_content for d in batch]), dtype=np.float32))
+        if progress:
+            progress("embedding", start + len(batch), total)
+    return vectors
+
+# concurrent read-only loads of one index version share a single FAISS.load_local
+INDEX_LOADS = SingleFlight("faiss.load")
+
+INDEX_CACHE_REQUESTS = REGISTRY.counter("docportal_index_cache_requests_total",
+                                        "Read-only FAISS index loads by cache result", ("result",))
+INDEX_CACHE_BYTES = REGISTRY.gauge("docportal_index_cache_bytes", "On-disk size of the FAISS indexes held in memory")
+# Loaded read-only indexes kept in memory, least recently used evicted past this budget (0 -> no cache)
+INDEX_CACHE_MB = float(os.getenv("INDEX_CACHE_MB", "512"))
+_INDEX_CACHE: "OrderedDict[str, Tuple[tuple, FAISS, int]]" = OrderedDict()
+_INDEX_CACHE_LOCK = threading.Lock()
+
+
+def _index_files(index_dir: Path) -> List[Path]:
+    files = [index_dir / "index.faiss", index_dir / "index.pkl"]
+    if not all(f.exists() for f in files):
+        raise FileNotFoundError(f"FAISS index not found: {index_dir}")
+    return files
+
+
+def index_size_bytes(index_dir: str | Path) -> int:
+    """On-disk size of a saved FAISS index, the estimate of what it takes in memory."""
+    return sum(f.stat().st_size for f in _index_files(Path(index_dir)))
+
+
+def _cache_index(path: str, version: tuple, vs: FAISS, size: int):
+    budget = int(INDEX_CACHE_MB * 1024 * 1024)
+    if size > budget:
+        return
+    with _INDEX_CACHE_LOCK:
+        _INDEX_CACHE[path] = (version, vs, size)  # replaces an older version of the same index
+        _INDEX_CACHE.move_to_end(path)
+        total = sum(entry[2] for entry in _INDEX_CACHE.values())
+        while total > budget:
+            _, (_, _, evicted) = _INDEX_CACHE.popitem(last=False)
+            total -= evicted
+        INDEX_CACHE_BYTES.set(total)
+
+
+def index_cache_stats() -> Dict[str, Any]:
+    with _INDEX_CACHE_LOCK:
+        return {"indexes": len(_INDEX_CACHE), "bytes": sum(e[2] for e in _INDEX_CACHE.values()),
+                "budget_bytes": int(INDEX_CACHE_MB * 1024 * 1024)}
+
+
+def load_faiss_index(index_dir: str | Path, embeddings) -> FAISS:
+    """
+    Load a saved FAISS index for searching. Loaded indexes are kept in an
+    LRU cache (INDEX_CACHE_MB) until the index is saved again, and concurrent
+    loads of the same version are coalesced, so callers may get the same
+    store object: use it read-only.
+    """
+    index_dir = Path(index_dir)
+    files = _index_files(index_dir)
+    path = str(index_dir.resolve())
+    version = tuple(f.stat().st_mtime_ns for f in files)
+    with _INDEX_CACHE_LOCK:
+        cached = _INDEX_CACHE.get(path)
+        if cached is not None and cached[0] == version:
+            _INDEX_CACHE.move_to_end(path)
+    if cached is not None and cached[0] == version:
+        INDEX_CACHE_REQUESTS.inc(result="hit")
+        return cached[1]
+    INDEX_CACHE_REQUESTS.inc(result="miss")
+
+    def load() -> FAISS:
+        from langchain_community.vectorstores import FAISS
+        with span("faiss.load"):
+            vs = FAISS.load_local(str(index_dir), embeddings=embeddings, allow_dangerous_deserialization=True)
+        _cache_index(path, version, vs, sum(f.stat().st_size for f in files))
+        return vs
+    return INDEX_LOADS.do((path,) + version, load)
+
+
+def split_documents(docs: List[Document], chunk_size: int = 1000, chunk_overlap: int = 200,
+                    chunker: Optional[str] = None, layouts: Optional[Dict[str, List[List[LayoutBlock]]]] = None,
+                    blob_store: Optional[BlobStore] = None) -> List[Document]:
+    """
+    Chunk loaded documents with `chunker` (CHUNKER by default). With "layout",
+    PDFs are split by section from their layout: the one load_documents kept
+    in `layouts`, else read (and cached) through the blob store. Other files,
+    and everything with "recursive", go through RecursiveCharacterTextSplitter.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if (chunker or CHUNKER) != "layout":
+        return splitter.split_documents(docs)
+    layout = LayoutChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    by_source: Dict[str, List[Document]] = {}
+    for d in docs:
+        by_source.setdefault(d.metadata.get("source", "unknown"), []).append(d)
+    chunks: List[Document] = []
+    for source, source_docs in by_source.items():
+        if layouts is not None and source in layouts:
+            pages = layouts[source]
+        elif Path(source).suffix.lower() == ".pdf" and Path(source).exists():
+            pages = read_pdf_layout(Path(source), blob_store)
+        else:
+            chunks.extend(splitter.split_documents(source_docs))
+            continue
+        chunks.extend(layout.split_layout(pages, {"source": source, "total_pages": len(pages)}))
+    return chunks
+
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _plan_document_updates(previous: Dict[str, Any], chunks_by_doc: Dict[str, List[Document]]):
+    """
+    Chunk-level diff of (re-)uploaded documents against the versions already indexed.
+    `previous` is {document_id: {"chunks": {chunk_hash: docstore_id}, "version": n}}.
+    Returns (updated entries, chunks to embed, their docstore ids, docstore ids to delete).
+    """
+    entries: Dict[str, Any] = {}
+    to_add: List[Document] = []
+    add_ids: List[str] = []
+    obsolete: List[str] = []
+    for document_id, chunks in chunks_by_doc.items():
+        old = (previous.get(document_id) or {}).get("chunks", {})
+        current: Dict[str, str] = {}
+        for c in chunks:
+            h = _chunk_hash(c.page_content)
+            if h in current:
+                continue
+            if h in old:
+                current[h] = old[h]  # unchanged chunk: keep its vector
+                continue
+            current[h] = uuid.uuid4().hex
+            c.metadata = {**(c.metadata or {}), "document_id": document_id, "chunk_hash": h}
+            to_add.append(c)
+            add_ids.append(current[h])
+        obsolete.extend(doc_id for h, doc_id in old.items() if h not in current)
+        version = (previous.get(document_id) or {}).get("version", 0)
+        changed = version == 0 or set(current) != set(old)
+        entries[document_id] = {"chunks": current, "version": version + 1 if changed else version,
+                                "updated_at": time.time() if changed else (previous.get(document_id) or {}).get("updated_at")}
+    return entries, to_add, add_ids, obsolete
+
+
+def _delete_vectors(vs: Optional[FAISS], ids: List[str]) -> int:
+    """Remove vectors + docstore entries by docstore id, ignoring ids that are already gone."""
+    if vs is None or not ids:
+        return 0
+    live = set(vs.index_to_docstore_id.values())
+    ids = [i for i in ids if i in live]
+    if ids:
+        vs.delete(ids)
+    return len(ids)
 
 # FAISS Manager (load-or-create)
 class FaissManager:
-    def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader] = None):
+    def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader] = None, embeddings=None):
         self.index_dir = Path(index_dir)
         self.index_dir.mkdir(parents=True, exist_ok=True)
         
@@ -36,53 +245,26 @@ class FaissManager:
         
 
         self.model_loader = model_loader or ModelLoader()
-        self.emb = self.model_loader.load_embeddings()
+        self.emb = embeddings or self.model_loader.load_embeddings()
         self.vs: Optional[FAISS] = None
         
     def _exists(self)-> bool:
         return (self.index_dir / "index.faiss").exists() and (self.index_dir / "index.pkl").exists()
     
-    @staticmethod
-    def _fingerprint(text: str, md: Dict[str, Any]) -> str:
-        src = md.get("source") or md.get("file_path")
-        rid = md.get("row_id")
-        if src is not None:
-            return f"{src}::{'' if rid is None else rid}"
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
-    
     def _save_meta(self):
         self.meta_path.write_text(json.dumps(self._meta, ensure_ascii=False, indent=2), encoding="utf-8")
         
         
-    def add_documents(self,docs: List[Document]):
-        
-        if self.vs is None:
-            raise RuntimeError("Call load_or_create() before add_documents_idempotent().")
-        
-        new_docs: List[Document] = []
-        
-        for d in docs:
-            
-            key = self._fingerprint(d.page_content, d.metadata or {})
-            if key in self._meta["rows"]:
-                continue
-            self._meta["rows"][key] = True
-            new_docs.append(d)
-            
-        if new_docs:
-            self.vs.add_documents(new_docs)
-            self.vs.save_local(str(self.index_dir))
-            self._save_meta()
-        return len(new_docs)
-    
     def load_or_create(self,texts:Optional[List[str]]=None, metadatas: Optional[List[dict]] = None):
+        from langchain_community.vectorstores import FAISS
         ## if we running first time then it will not go in this block
         if self._exists():
-            self.vs = FAISS.load_local(
-                str(self.index_dir),
-                embeddings=self.emb,
-                allow_dangerous_deserialization=True,
-            )
+            with span("faiss.load"):
+                self.vs = FAISS.load_local(
+                    str(self.index_dir),
+                    embeddings=self.emb,
+                    allow_dangerous_deserialization=True,
+                )
             return self.vs
         
         
@@ -91,32 +273,334 @@ class FaissManager:
         self.vs = FAISS.from_texts(texts=texts, embedding=self.emb, metadatas=metadatas or [])
         self.vs.save_local(str(self.index_dir))
         return self.vs
+
+    def upsert_documents(self, chunks_by_doc: Dict[str, List[Document]],
+                         progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        """
+        Index new documents / new versions of existing ones without a rebuild:
+        only chunks whose content hash is new get embedded, and chunks that
+        disappeared from a document are deleted from the index and docstore.
+        """
+        if self.vs is None and self._exists():
+            self.load_or_create()
+        documents = self._meta.setdefault("documents", {})
+        entries, to_add, add_ids, obsolete = _plan_document_updates(documents, chunks_by_doc)
+
+        if to_add:
+            self.vs = _add_in_batches(self.vs, to_add, self.emb, ids=add_ids, progress=progress)
+        removed = _delete_vectors(self.vs, obsolete)
+        documents.update(entries)
+        if to_add or obsolete:
+            if progress:
+                progress("saving", len(to_add), len(to_add))
+            with span("ingest.faiss_save"):
+                self.vs.save_local(str(self.index_dir))  # type: ignore[union-attr]
+        self._save_meta()
+        return {"documents": len(entries), "added": len(to_add), "removed": removed,
+                "unchanged": sum(len(e["chunks"]) for e in entries.values()) - len(to_add)}
+
+    def delete_document(self, document_id: str) -> Optional[int]:
+        """Drop every chunk of a document. Returns the number removed, or None if it was never indexed."""
+        documents = self._meta.get("documents", {})
+        if document_id not in documents:
+            return None
+        if self.vs is None and self._exists():
+            self.load_or_create()
+        removed = _delete_vectors(self.vs, list(documents.pop(document_id)["chunks"].values()))
+        if self.vs is not None:
+            self.vs.save_local(str(self.index_dir))
+        self._save_meta()
+        return removed
+
+    def documents(self) -> Dict[str, Any]:
+        return {doc_id: {"chunks": len(e["chunks"]), "version": e["version"], "updated_at": e["updated_at"]}
+                for doc_id, e in self._meta.get("documents", {}).items()}
         
         
+# Shared multi-tenant index (one FAISS index per shard, vectors tagged by session)
+_SHARDS: Dict[str, "IndexShard"] = {}
+_SHARDS_LOCK = threading.Lock()
+
+
+class IndexShard:
+    """
+    One FAISS index + docstore holding the chunks of many sessions.
+    `sessions.json` maps each session to the docstore ids it owns; searches are
+    restricted to those rows with a FAISS ID selector. `lock` guards the
+    in-memory index for searches; writers also hold `write_lock`, which
+    covers their embedding and saving so searches never wait on those.
+    """
+    def __init__(self, shard_dir: Path, embeddings):
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.shard_dir / "sessions.json"
+        self.embeddings = embeddings
+        self.lock = threading.RLock()  # searches and in-memory mutation
+        self.write_lock = threading.Lock()  # one writer at a time, held while embedding and saving
+        self.vs: Optional[FAISS] = None
+        self._manifest: Dict[str, Any] = {"sessions": {}}
+        self._reverse: Optional[Dict[str, int]] = None  # docstore id -> index position
+        self._positions: Dict[str, np.ndarray] = {}
+        self._loaded_mtime: Optional[float] = None
+        self.reload()
+
+    def _index_mtime(self) -> Optional[float]:
+        p = self.shard_dir / "index.faiss"
+        return p.stat().st_mtime if p.exists() else None
+
+    def is_stale(self) -> bool:
+        """True when another worker has saved the shard since we loaded it."""
+        return self._index_mtime() != self._loaded_mtime
+
+    def reload(self):
+        from langchain_community.vectorstores import FAISS
+        with self.write_lock, self.lock:
+            self.vs = None
+            if (self.shard_dir / "index.faiss").exists() and (self.shard_dir / "index.pkl").exists():
+                with span("faiss.load"):
+                    self.vs = FAISS.load_local(
+                        str(self.shard_dir),
+                        embeddings=self.embeddings,
+                        allow_dangerous_deserialization=True,
+                    )
+            self._manifest = {"sessions": {}}
+            if self.manifest_path.exists():
+                try:
+                    self._manifest = json.loads(self.manifest_path.read_text(encoding="utf-8")) or {"sessions": {}}
+                except Exception:
+                    self._manifest = {"sessions": {}}
+            self._reverse = None
+            self._positions = {}
+            self._loaded_mtime = self._index_mtime()
+
+    def has_session(self, session_id: str) -> bool:
+        return session_id in self._manifest["sessions"]
+
+    def positions(self, session_id: str) -> np.ndarray:
+        """Index positions owned by a session (cached until the shard changes)."""
+        cached = self._positions.get(session_id)
+        if cached is not None:
+            return cached
+        entry = self._manifest["sessions"].get(session_id)
+        if not entry or self.vs is None:
+            return np.empty(0, dtype=np.int64)
+        if self._reverse is None:
+            self._reverse = {v: k for k, v in self.vs.index_to_docstore_id.items()}
+        reverse = self._reverse
+        cached = np.fromiter((reverse[i] for i in entry["ids"] if i in reverse), dtype=np.int64)
+        self._positions[session_id] = cached
+        return cached
+
+    def upsert_documents(self, session_id: str, chunks_by_doc: Dict[str, List[Document]], persist: bool = True,
+                         progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        """
+        Same chunk-level diff as FaissManager.upsert_documents, scoped to one
+        session of the shard. Planning, embedding and saving run under the
+        write lock only; searches wait just for the in-memory add/delete.
+        """
+        with self.write_lock:
+            with self.lock:
+                entry = self._manifest["sessions"].setdefault(session_id, {"ids": [], "rows": {}})
+                documents = entry.setdefault("documents", {})
+            entries, to_add, add_ids, obsolete = _plan_document_updates(documents, chunks_by_doc)
+            vectors = _embed_in_batches(to_add, self.embeddings, progress=progress) if to_add else []
+            with self.lock:
+                if to_add:
+                    pairs = [(d.page_content, v) for d, v in zip(to_add, vectors)]
+                    metadatas = [d.metadata for d in to_add]
+                    start = 0 if self.vs is None else self.vs.index.ntotal
+                    if self.vs is None:
+                        from langchain_community.vectorstores import FAISS
+                        self.vs = FAISS.from_embeddings(pairs, self.embeddings, metadatas=metadatas, ids=add_ids)
+                    else:
+                        self.vs.add_embeddings(pairs, metadatas=metadatas, ids=add_ids)
+                    entry["ids"].extend(add_ids)
+                    if self._reverse is not None:
+                        self._reverse.update({doc_id: start + i for i, doc_id in enumerate(add_ids)})
+                removed = self._remove(entry, obsolete)
+                documents.update(entries)
+                self._positions.pop(session_id, None)
+                snapshot = self._snapshot() if persist and (to_add or obsolete) else None
+            if snapshot is not None:
+                if progress:
+                    progress("saving", len(to_add), len(to_add))
+                self._write(*snapshot)
+            return {"documents": len(entries), "added": len(to_add), "removed": removed,
+                    "unchanged": sum(len(e["chunks"]) for e in entries.values()) - len(to_add)}
+
+    def delete_document(self, session_id: str, document_id: str) -> Optional[int]:
+        with self.write_lock:
+            with self.lock:
+                entry = self._manifest["sessions"].get(session_id)
+                if not entry or document_id not in entry.get("documents", {}):
+                    return None
+                removed = self._remove(entry, list(entry["documents"].pop(document_id)["chunks"].values()))
+                snapshot = self._snapshot()
+            self._write(*snapshot)
+            return removed
+
+    def drop_session(self, session_id: str) -> Optional[int]:
+        """Remove every vector a session owns (janitor eviction); None when the shard does not hold it."""
+        with self.write_lock:
+            with self.lock:
+                entry = self._manifest["sessions"].get(session_id)
+                if entry is None:
+                    return None
+                removed = self._remove(entry, list(entry["ids"]))
+                del self._manifest["sessions"][session_id]
+                self._positions.pop(session_id, None)
+                snapshot = self._snapshot()
+            self._write(*snapshot)
+            return removed
+
+    def _remove(self, entry: Dict[str, Any], ids: List[str]) -> int:
+        removed = _delete_vectors(self.vs, ids)
+        if removed:
+            gone = set(ids)
+            entry["ids"] = [i for i in entry["ids"] if i not in gone]
+            # FAISS compacts positions on delete, so every cached position is now stale
+            self._reverse = None
+            self._positions = {}
+        return removed
+
+    def _snapshot(self) -> Tuple[Optional[FAISS], str]:
+        """Copy of the index, docstore and manifest (caller holds `lock`), written out after it is released."""
+        if self.vs is None:
+            return None, json.dumps(self._manifest, ensure_ascii=False)
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        snap = copy.copy(self.vs)
+        snap.index = faiss.clone_index(self.vs.index)
+        snap.docstore = InMemoryDocstore(dict(self.vs.docstore._dict))
+        snap.index_to_docstore_id = dict(self.vs.index_to_docstore_id)
+        return snap, json.dumps(self._manifest, ensure_ascii=False)
+
+    def _write(self, vs: Optional[FAISS], manifest: str):
+        """Persist a snapshot (caller holds `write_lock`, not `lock`)."""
+        if vs is None:
+            return
+        with span("ingest.faiss_save"):
+            vs.save_local(str(self.shard_dir))
+        self.manifest_path.write_text(manifest, encoding="utf-8")
+        self._loaded_mtime = self._index_mtime()
+
+    def save(self):
+        with self.write_lock:
+            with self.lock:
+                snapshot = self._snapshot()
+            self._write(*snapshot)
+
+
+class SharedIndexManager:
+    """
+    Alternative to per-session FAISS directories: sessions are hashed onto a
+    fixed number of shards under `<faiss_base>/_shared/`, and shards stay loaded
+    in-process, so a query costs one stat() instead of a load_local().
+    Writes are serialized per shard within a process; run a single indexing
+    worker per shard directory when several processes share the volume.
+    """
+    def __init__(self, faiss_base: str | Path = "faiss_index", model_loader: Optional[ModelLoader] = None,
+                 num_shards: Optional[int] = None):
+        self.root = Path(faiss_base) / SHARED_DIR_NAME
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.num_shards = num_shards or int(os.getenv("FAISS_SHARDS", "16"))
+        self.model_loader = model_loader or ModelLoader()
+        self.emb = self.model_loader.load_embeddings()
+
+    def shard_dir(self, session_id: str) -> Path:
+        return self.root / f"shard_{zlib.crc32(session_id.encode('utf-8')) % self.num_shards:03d}"
+
+    def shard(self, session_id: str) -> IndexShard:
+        key = str(self.shard_dir(session_id).resolve())
+        with _SHARDS_LOCK:
+            shard = _SHARDS.get(key)
+            if shard is None:
+                shard = _SHARDS[key] = IndexShard(Path(key), self.emb)
+                log.info("Shared index shard loaded", shard=key)
+            elif shard.is_stale() and not shard.write_lock.locked():  # never wait behind a local write
+                shard.reload()
+                log.info("Shared index shard reloaded", shard=key)
+            return shard
+
+    def has_session(self, session_id: str) -> bool:
+        return self.shard(session_id).has_session(session_id)
+
+    def upsert_documents(self, session_id: str, chunks_by_doc: Dict[str, List[Document]], persist: bool = True,
+                         progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        return self.shard(session_id).upsert_documents(session_id, chunks_by_doc, persist=persist, progress=progress)
+
+    def delete_document(self, session_id: str, document_id: str) -> Optional[int]:
+        return self.shard(session_id).delete_document(session_id, document_id)
+
+    def drop_session(self, session_id: str) -> Optional[int]:
+        return self.shard(session_id).drop_session(session_id)
+
+    def flush(self):
+        with _SHARDS_LOCK:
+            shards = [s for key, s in _SHARDS.items() if Path(key).parent == self.root.resolve()]
+        for shard in shards:
+            shard.save()
+
+    def as_retriever(self, session_id: str, k: int = 5,
+                     policy: Optional[AdaptiveTopK] = None) -> SessionScopedRetriever:
+        return SessionScopedRetriever(shard=self.shard(session_id), session_id=session_id, k=k, policy=policy)
+
+    def federated_retriever(self, session_ids: List[str], k: int = 5,
+                            policy: Optional[AdaptiveTopK] = None) -> FederatedRetriever:
+        """One retriever over several sessions (possibly on different shards)."""
+        return FederatedRetriever(targets=[ShardTarget(sid, self.shard(sid)) for sid in session_ids],
+                                  embeddings=self.emb, k=k, policy=policy)
+
+
+def load_federated_retriever(faiss_base: str | Path, session_ids: List[str], k: int = 5,
+                             model_loader: Optional[ModelLoader] = None,
+                             policy: Optional[AdaptiveTopK] = None) -> FederatedRetriever:
+    """
+    FederatedRetriever over per-session FAISS directories. The indexes are
+    loaded in parallel on the federated search pool.
+    """
+    model_loader = model_loader or ModelLoader()
+    emb = model_loader.load_embeddings()
+
+    def load(session_id: str) -> StoreTarget:
+        return StoreTarget(session_id, load_faiss_index(Path(faiss_base) / session_id, emb))
+
+    targets = list(federated_pool().map(load, session_ids))
+    return FederatedRetriever(targets=targets, embeddings=emb, k=k, policy=policy)
+
+
 class ChatIngestor:
     def __init__( self,
         temp_base: str = "data",
         faiss_base: str = "faiss_index",
         use_session_dirs: bool = True,
         session_id: Optional[str] = None,
+        storage_mode: str = "session_dirs",
+        blob_store: Optional[BlobStore] = None,
     ):
         try:
+            if storage_mode not in STORAGE_MODES:
+                raise ValueError(f"Unsupported storage mode: {storage_mode}")
             self.model_loader = ModelLoader()
+            self.blob_store = blob_store
             
             self.use_session = use_session_dirs
             self.session_id = session_id or generate_session_id()
+            # "shared" only changes where sessionized indexes live; the global index is unchanged
+            self.shared = storage_mode == "shared" and use_session_dirs
             
             self.temp_base = Path(temp_base); self.temp_base.mkdir(parents=True, exist_ok=True)
             self.faiss_base = Path(faiss_base); self.faiss_base.mkdir(parents=True, exist_ok=True)
             
             self.temp_dir = self._resolve_dir(self.temp_base)
-            self.faiss_dir = self._resolve_dir(self.faiss_base)
+            self.faiss_dir = self.faiss_base / SHARED_DIR_NAME if self.shared else self._resolve_dir(self.faiss_base)
 
             log.info("ChatIngestor initialized",
                       session_id=self.session_id,
                       temp_dir=str(self.temp_dir),
                       faiss_dir=str(self.faiss_dir),
-                      sessionized=self.use_session)
+                      sessionized=self.use_session,
+                      storage_mode=storage_mode)
         except Exception as e:
             log.error("Failed to initialize ChatIngestor", error=str(e))
             raise DocumentPortalException("Initialization error in ChatIngestor", e) from e
@@ -129,10 +613,16 @@ class ChatIngestor:
             return d
         return base # fallback: "faiss_index/"
         
-    def _split(self, docs: List[Document], chunk_size=1000, chunk_overlap=200) -> List[Document]:
-        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        chunks = splitter.split_documents(docs)
-        log.info("Documents split", chunks=len(chunks), chunk_size=chunk_size, overlap=chunk_overlap)
+    @timed("ingest.split")
+    def _split(self, docs: List[Document], chunk_size=1000, chunk_overlap=200,
+               layouts: Optional[Dict[str, List[List[LayoutBlock]]]] = None) -> List[Document]:
+        chunker = CHUNKER
+        chunks = split_documents(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap, chunker=chunker,
+                                 layouts=layouts, blob_store=self.blob_store)
+        # with "layout", files other than PDFs are still split recursively
+        layout_chunks = sum(1 for c in chunks if "section_path" in c.metadata) if chunker == "layout" else 0
+        log.info("Documents split", chunks=len(chunks), chunk_size=chunk_size, overlap=chunk_overlap, chunker=chunker,
+                 layout_chunks=layout_chunks, recursive_chunks=len(chunks) - layout_chunks)
         return chunks
 
     def build_retriever( self,
@@ -141,29 +631,68 @@ class ChatIngestor:
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
         k: int = 5,):
+        paths = self.save_uploads(uploaded_files)
+        return self.build_retriever_from_paths(paths, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k)
+
+    @timed("ingest.save_uploads")
+    def save_uploads(self, uploaded_files: Iterable) -> List[Path]:
+        """Save uploads into temp_dir, through the blob store when one is configured."""
+        if self.blob_store is None:
+            return save_uploaded_files(uploaded_files, self.temp_dir)
+        paths: List[Path] = []
+        taken: Set[str] = set()
+        for uf in uploaded_files:
+            ext = Path(getattr(uf, "name", "file")).suffix.lower()
+            if ext not in SUPPORTED_EXTENSIONS:
+                log.warning("Unsupported file skipped", filename=getattr(uf, "name", "file"))
+                continue
+            paths.append(self.blob_store.put(uf, self.temp_dir / unique_filename(uf.name, taken)).path)
+        return paths
+
+    def build_retriever_from_paths( self,
+        paths: List[Path],
+        *,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        k: int = 5,
+        progress: Optional[ProgressCallback] = None,):
+        """
+        Load, split, embed and index files already saved under temp_dir.
+        `progress(stage, done, total)` is called as the pipeline advances.
+        """
         try:
-            paths = save_uploaded_files(uploaded_files, self.temp_dir)
-            docs = load_documents(paths)
+            report = progress or (lambda stage, done=0, total=0: None)
+            report("loading", 0, len(paths))
+            # the layout chunker reads PDFs through their layout: kept here so they are extracted once
+            layouts: Optional[Dict[str, List[List[LayoutBlock]]]] = {} if CHUNKER == "layout" else None
+            with span("ingest.load_documents"):
+                docs = load_documents(paths, self.blob_store, layouts=layouts)
             if not docs:
                 raise ValueError("No valid documents loaded")
             
-            chunks = self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            check_deadline("ingest.split")
+            report("splitting", 0, len(docs))
+            chunks = self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap, layouts=layouts)
             
-            ## FAISS manager very very important class for the docchat
-            fm = FaissManager(self.faiss_dir, self.model_loader)
+            # document id = saved file name, so re-uploading a file replaces its previous version
+            chunks_by_doc: Dict[str, List[Document]] = {}
+            for c in chunks:
+                chunks_by_doc.setdefault(Path(c.metadata.get("source", "unknown")).name, []).append(c)
             
-            texts = [c.page_content for c in chunks]
-            metas = [c.metadata for c in chunks]
+            if self.shared:
+                mgr = SharedIndexManager(self.faiss_base, self.model_loader)
+                stats = mgr.upsert_documents(self.session_id, chunks_by_doc, progress=progress)
+                log.info("Shared FAISS shard updated", **stats, shard=str(mgr.shard_dir(self.session_id)))
+                return mgr.as_retriever(self.session_id, k=k)
             
-            try:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-            except Exception:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-                
-            added = fm.add_documents(chunks)
-            log.info("FAISS index updated", added=added, index=str(self.faiss_dir))
+            ## FAISS manager very very important class for the docchat
+            fm = FaissManager(self.faiss_dir, self.model_loader)
+            stats = fm.upsert_documents(chunks_by_doc, progress=progress)
+            log.info("FAISS index updated", **stats, index=str(self.faiss_dir))
             
-            return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
+            if fm.vs is None:
+                raise DocumentPortalException("No existing FAISS index and no data to create one", sys)
+            return fm.vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
             
         except Exception as e:
             log.error("Failed to build retriever", error=str(e))
@@ -176,83 +705,94 @@ class DocHandler:
     """
     PDF save + read (page-wise) for analysis.
     """
-    def __init__(self, data_dir: Optional[str] = None, session_id: Optional[str] = None):
+    def __init__(self, data_dir: Optional[str] = None, session_id: Optional[str] = None,
+                 blob_store: Optional[BlobStore] = None):
         self.data_dir = data_dir or os.getenv("DATA_STORAGE_PATH", os.path.join(os.getcwd(), "data", "document_analysis"))
         self.session_id = session_id or generate_session_id("session")
         self.session_path = os.path.join(self.data_dir, self.session_id)
         os.makedirs(self.session_path, exist_ok=True)
+        self.blob_store = blob_store
+        self.last_upload: Optional[SavedUpload] = None
         log.info("DocHandler initialized", session_id=self.session_id, session_path=self.session_path)
 
+    @timed("analyze.save_upload")
     def save_pdf(self, uploaded_file) -> str:
         try:
             filename = os.path.basename(uploaded_file.name)
             if not filename.lower().endswith(".pdf"):
                 raise ValueError("Invalid file type. Only PDFs are allowed.")
             save_path = os.path.join(self.session_path, filename)
-            with open(save_path, "wb") as f:
-                if hasattr(uploaded_file, "read"):
-                    f.write(uploaded_file.read())
-                else:
-                    f.write(uploaded_file.getbuffer())
-            log.info("PDF saved successfully", file=filename, save_path=save_path, session_id=self.session_id)
+            if self.blob_store is not None:
+                self.last_upload = self.blob_store.put(uploaded_file, Path(save_path))
+            else:
+                self.last_upload = stream_upload_to_disk(uploaded_file, Path(save_path))
+            log.info("PDF saved successfully", file=filename, save_path=save_path, session_id=self.session_id,
+                     sha256=self.last_upload.sha256, size=self.last_upload.size)
             return save_path
         except Exception as e:
             log.error("Failed to save PDF", error=str(e), session_id=self.session_id)
             raise DocumentPortalException(f"Failed to save PDF: {str(e)}", e) from e
 
-    def read_pdf(self, pdf_path: str) -> str:
+    @timed("analyze.read_pdf")
+    def read_pages(self, pdf_path: str) -> List[str]:
         try:
-            text_chunks = []
-            with fitz.open(pdf_path) as doc:
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text_chunks.append(f"\n--- Page {page_num + 1} ---\n{page.get_text()}")  # type: ignore
-            text = "\n".join(text_chunks)
-            log.info("PDF read successfully", pdf_path=pdf_path, session_id=self.session_id, pages=len(text_chunks))
-            return text
+            pages = read_pdf_pages(Path(pdf_path), self.blob_store)
+            log.info("PDF read successfully", pdf_path=pdf_path, session_id=self.session_id, pages=len(pages))
+            return pages
         except Exception as e:
             log.error("Failed to read PDF", error=str(e), pdf_path=pdf_path, session_id=self.session_id)
             raise DocumentPortalException(f"Could not process PDF: {pdf_path}", e) from e
+
+    def read_pdf(self, pdf_path: str) -> str:
+        pages = self.read_pages(pdf_path)
+        return "\n".join(f"\n--- Page {page_num + 1} ---\n{page}" for page_num, page in enumerate(pages))
+
+    @timed("analyze.read_metadata")
+    def read_metadata(self, pdf_path: str) -> Dict[str, Any]:
+        """Title, Author, dates, Publisher and PageCount straight from the PDF."""
+        try:
+            return extract_pdf_metadata(Path(pdf_path))
+        except Exception as e:
+            log.error("Failed to read PDF metadata", error=str(e), pdf_path=pdf_path, session_id=self.session_id)
+            raise DocumentPortalException(f"Could not read PDF metadata: {pdf_path}", e) from e
 class DocumentComparator:
     """
     Save, read & combine PDFs for comparison with session-based versioning.
     """
-    def __init__(self, base_dir: str = "data/document_compare", session_id: Optional[str] = None):
+    def __init__(self, base_dir: str = "data/document_compare", session_id: Optional[str] = None,
+                 blob_store: Optional[BlobStore] = None):
         self.base_dir = Path(base_dir)
         self.session_id = session_id or generate_session_id()
         self.session_path = self.base_dir / self.session_id
         self.session_path.mkdir(parents=True, exist_ok=True)
+        self.blob_store = blob_store
+        self.uploads: List[SavedUpload] = []
         log.info("DocumentComparator initialized", session_path=str(self.session_path))
 
+    @timed("compare.save_uploads")
     def save_uploaded_files(self, reference_file, actual_file):
         try:
             ref_path = self.session_path / reference_file.name
             act_path = self.session_path / actual_file.name
-            for fobj, out in ((reference_file, ref_path), (actual_file, act_path)):
+            for fobj in (reference_file, actual_file):
                 if not fobj.name.lower().endswith(".pdf"):
                     raise ValueError("Only PDF files are allowed.")
-                with open(out, "wb") as f:
-                    if hasattr(fobj, "read"):
-                        f.write(fobj.read())
-                    else:
-                        f.write(fobj.getbuffer())
+            save = self.blob_store.put if self.blob_store is not None else stream_upload_to_disk
+            self.uploads = [save(fobj, out)
+                            for fobj, out in ((reference_file, ref_path), (actual_file, act_path))]
             log.info("Files saved", reference=str(ref_path), actual=str(act_path), session=self.session_id)
             return ref_path, act_path
         except Exception as e:
             log.error("Error saving PDF files", error=str(e), session=self.session_id)
             raise DocumentPortalException("Error saving files", e) from e
 
+    @timed("compare.read_pdf")
     def read_pdf(self, pdf_path: Path) -> str:
         try:
-            with fitz.open(pdf_path) as doc:
-                if doc.is_encrypted:
-                    raise ValueError(f"PDF is encrypted: {pdf_path.name}")
-                parts = []
-                for page_num in range(doc.page_count):
-                    page = doc.load_page(page_num)
-                    text = page.get_text()  # type: ignore
-                    if text.strip():
-                        parts.append(f"\n --- Page {page_num + 1} --- \n{text}")
+            parts = []
+            for page_num, text in enumerate(read_pdf_pages(pdf_path, self.blob_store)):
+                if text.strip():
+                    parts.append(f"\n --- Page {page_num + 1} --- \n{text}")
             log.info("PDF read successfully", file=str(pdf_path), pages=len(parts))
             return "\n".join(parts)
         except Exception as e:
@@ -0,0 +1,235 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from logger import GLOBAL_LOGGER as log
+from src.doc_ingestion.data_ingestion import ChatIngestor
+from utils.blob_store import BlobStore
+from utils.metrics import bind_trace_id, current_trace_id
+
+_COLUMNS = ("job_id", "tenant", "session_id", "status", "stage", "done", "total", "params", "error",
+            "created_at", "started_at", "stage_started_at", "updated_at", "owner", "lease_until")
+# a running job whose owner stopped renewing its lease for this long is requeued
+JOB_LEASE_SECONDS = float(os.getenv("INDEX_JOB_LEASE_SECONDS", "60"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_jobs (
+    job_id TEXT PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    status TEXT NOT NULL,           -- queued | running | succeeded | failed
+    stage TEXT,
+    done INTEGER DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    params TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    stage_started_at REAL,
+    updated_at REAL,
+    owner TEXT,                     -- queue instance (host:pid:id) running the job
+    lease_until REAL                -- renewed by the owner while it runs the job
+)
+"""
+
+
+class IndexJobQueue:
+    """
+    Persistent, bounded worker pool for /chat/index.
+
+    Jobs (already-saved upload paths + ingestion params) are stored in SQLite,
+    which several processes (API workers) may share. A queue claims a job with
+    a conditional UPDATE, so each job runs once, and holds a lease on it that
+    it renews while the job runs; a job whose lease lapsed (its process died)
+    is requeued. At most `max_workers` jobs run at once per queue, and at most
+    `per_tenant` of them for the same tenant; the rest wait in FIFO order.
+    """
+    def __init__(self, db_path: str | Path = "data/_jobs/index_jobs.db", max_workers: int = 2, per_tenant: int = 1,
+                 blob_store: Optional[BlobStore] = None, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.db_path = Path(db_path)
+        self.blob_store = blob_store
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.per_tenant = per_tenant
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")  # other processes write the same DB
+        self._conn.execute(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(index_jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):  # DBs created before leases
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE index_jobs ADD COLUMN {column} {kind}")
+        self._running: Counter = Counter()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    # ---------- persistence ----------
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE index_jobs SET {cols} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def _row(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM index_jobs WHERE job_id = ?",
+                                     (job_id,)).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    # ---------- lifecycle ----------
+    def start(self):
+        """Start the worker pool and the lease heartbeat, requeue jobs whose owner died, dispatch queued jobs."""
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="index-job")
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._renew_leases, name="index-job-lease", daemon=True)
+        self._heartbeat.start()
+        self._requeue_expired()
+        self._pump()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._executor:
+            # running jobs stay 'running' in the DB; once their lease lapses another queue (or the next start()) retries them
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _requeue_expired(self) -> int:
+        """Requeue running jobs whose lease lapsed (rows from before leases have none and count as lapsed)."""
+        with self._lock:
+            n = self._conn.execute(
+                "UPDATE index_jobs SET status = 'queued', stage = 'queued', done = 0, total = 0, owner = NULL, "
+                "lease_until = NULL WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+                (time.time(),)).rowcount
+        if n:
+            log.info("Interrupted index jobs requeued", count=n)
+        return n
+
+    def _renew_leases(self):
+        """Extend the lease of every job this queue runs; also pick up jobs of queues that died."""
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE index_jobs SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                    (time.time() + self.lease_seconds, self.owner))
+            if self._requeue_expired():
+                self._pump()
+
+    def submit(self, session_id: str, params: Dict[str, Any], tenant: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        params = {**params, "trace_id": params.get("trace_id") or current_trace_id()}  # job logs join the request's trace
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO index_jobs (job_id, tenant, session_id, status, stage, params, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', 'queued', ?, ?, ?)",
+                (job_id, tenant or session_id, session_id, json.dumps(params), now, now))
+        log.info("Index job queued", job_id=job_id, session_id=session_id, tenant=tenant or session_id)
+        self._pump()
+        return job_id
+
+    def _pump(self):
+        """Dispatch queued jobs while global and per-tenant capacity allows."""
+        if self._executor is None:
+            return
+        with self._lock:
+            queued = self._conn.execute(
+                "SELECT job_id, tenant FROM index_jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+            to_start: List[str] = []
+            for job_id, tenant in queued:
+                if sum(self._running.values()) >= self.max_workers:
+                    break
+                if self._running[tenant] >= self.per_tenant:
+                    continue
+                now = time.time()
+                claimed = self._conn.execute(
+                    "UPDATE index_jobs SET status = 'running', owner = ?, lease_until = ?, started_at = ?, "
+                    "updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                    (self.owner, now + self.lease_seconds, now, now, job_id)).rowcount
+                if claimed != 1:  # another process claimed it first
+                    continue
+                self._running[tenant] += 1
+                to_start.append(job_id)
+        for job_id in to_start:
+            self._executor.submit(self._run, job_id)
+
+    # ---------- execution ----------
+    def _run(self, job_id: str):
+        job = self._row(job_id)
+        if job is None:
+            return
+        params = json.loads(job["params"])
+        bind_trace_id(params.get("trace_id") or job_id)
+
+        def progress(stage: str, done: int = 0, total: int = 0):
+            current = self._row(job_id) or {}
+            fields: Dict[str, Any] = {"stage": stage, "done": done, "total": total}
+            if current.get("stage") != stage:
+                fields["stage_started_at"] = time.time()
+            self._update(job_id, **fields)
+
+        try:
+            ci = ChatIngestor(
+                temp_base=params["temp_base"],
+                faiss_base=params["faiss_base"],
+                use_session_dirs=params["use_session_dirs"],
+                session_id=job["session_id"],
+                storage_mode=params.get("storage_mode", "session_dirs"),
+                blob_store=self.blob_store,
+            )
+            ci.build_retriever_from_paths(
+                [Path(p) for p in params["paths"]],
+                chunk_size=params["chunk_size"],
+                chunk_overlap=params["chunk_overlap"],
+                k=params["k"],
+                progress=progress,
+            )
+            self._update(job_id, status="succeeded", stage="done")
+            log.info("Index job finished", job_id=job_id, session_id=job["session_id"])
+        except Exception as e:
+            self._update(job_id, status="failed", error=getattr(e, "error_message", None) or str(e))
+            log.error("Index job failed", job_id=job_id, session_id=job["session_id"], error=str(e))
+        finally:
+            with self._lock:
+                self._running[job["tenant"]] -= 1
+            self._pump()
+
+    def active_sessions(self) -> Set[str]:
+        """Sessions with a job queued or running in any process sharing the DB (kept from the janitor)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT session_id FROM index_jobs WHERE status IN ('queued', 'running')").fetchall()
+        return {session_id for (session_id,) in rows}
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public view of a job: stage, chunks embedded/total and a naive ETA for the embedding stage."""
+        job = self._row(job_id)
+        if job is None:
+            return None
+        eta = None
+        if job["stage"] == "embedding" and job["done"] and job["stage_started_at"]:
+            rate = job["done"] / max(time.time() - job["stage_started_at"], 1e-6)
+            eta = round((job["total"] - job["done"]) / rate, 1)
+        return {
+            "job_id": job["job_id"],
+            "session_id": job["session_id"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "chunks_embedded": job["done"] if job["stage"] in ("embedding", "saving", "done") else 0,
+            "chunks_total": job["total"] if job["stage"] in ("embedding", "saving", "done") else None,
+            "eta_seconds": eta,
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+        }
@@ -0,0 +1,29 @@
+"""
+Shared fixtures. Everything runs offline: MODEL_PROVIDER=fake gives the stub
+chat model and hashing embeddings, and the API works in a scratch directory
+holding a copy of config/ (its data/ and faiss_index/ paths are relative).
+"""
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))  # document generators (bench_suite.make_pdf)
+
+
+@pytest.fixture(scope="session")
+def api_main(tmp_path_factory):
+    """api.main imported inside a scratch working directory, background tasks off."""
+    workdir = tmp_path_factory.mktemp("api")
+    shutil.copytree(ROOT / "config", workdir / "config")
+    previous = os.getcwd()
+    os.chdir(workdir)
+    os.environ.update(MODEL_PROVIDER="fake", JANITOR_ENABLED="false", WARM_START_ENABLED="false",
+                      FAKE_LLM_LATENCY_MS="0")
+    import api.main as api
+    yield api
+    os.chdir(previous)
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.admission import AdmissionController, Overloaded, hold_admission_slot
+
+
+def _controller(**route) -> AdmissionController:
+    spec = {"path": "/chat/query", "max_concurrent": 1, "max_queue": 0, "max_wait_s": 1.0, **route}
+    return AdmissionController(routes={"chat_query": spec}, rss_shed_routes=["chat_query"])
+
+
+def test_queue_full_is_shed():
+    async def scenario():
+        controller = _controller(max_queue=0)
+        async with controller.admit("chat_query"):
+            with pytest.raises(Overloaded) as info:
+                async with controller.admit("chat_query"):
+                    pass
+        return info.value
+    shed = asyncio.run(scenario())
+    assert shed.reason == "queue_full"
+    assert shed.retry_after >= 1
+
+
+def test_queue_timeout_is_shed_and_queue_emptied():
+    async def scenario():
+        controller = _controller(max_queue=1, max_wait_s=0.05)
+        async with controller.admit("chat_query"):
+            with pytest.raises(Overloaded) as info:
+                async with controller.admit("chat_query"):
+                    pass
+            limiter = controller.limiters["chat_query"]
+            assert not limiter.waiters and limiter.active == 1
+        return info.value
+    assert asyncio.run(scenario()).reason == "queue_timeout"
+
+
+def test_memory_is_shed_with_configured_retry_after():
+    async def scenario():
+        controller = AdmissionController(routes={"chat_query": {"path": "/chat/query"}}, rss_shed_bytes=1,
+                                         memory_retry_after_s=7)
+        with pytest.raises(Overloaded) as info:
+            async with controller.admit("chat_query"):
+                pass
+        assert controller.limiters["chat_query"].active == 0
+        return info.value
+    shed = asyncio.run(scenario())
+    assert (shed.reason, shed.retry_after) == ("memory", 7)
+
+
+def test_slot_held_until_handed_off_worker_finishes():
+    async def scenario():
+        controller = _controller()
+        limiter = controller.limiters["chat_query"]
+        worker_done = threading.Event()
+        async with controller.admit("chat_query"):
+            release = hold_admission_slot()
+            worker = threading.Thread(target=lambda: (worker_done.wait(5), release()))
+            worker.start()
+        assert limiter.active == 1  # the request is over, its worker is not
+        with pytest.raises(Overloaded):
+            async with controller.admit("chat_query"):
+                pass
+        worker_done.set()
+        await asyncio.to_thread(worker.join, 5)
+        await asyncio.sleep(0)  # the release is scheduled onto the loop
+        assert limiter.active == 0
+        release()  # a second call is a no-op
+        await asyncio.sleep(0)
+        assert limiter.active == 0
+    asyncio.run(scenario())
+
+
+def test_shed_request_gets_503_with_retry_after(api_main, monkeypatch):
+    from fastapi.testclient import TestClient
+    controller = AdmissionController(routes={"chat_query": {"path": "/chat/query"}}, rss_shed_bytes=1,
+                                     memory_retry_after_s=9)
+    monkeypatch.setattr(api_main, "_admission", lambda: controller)
+    r = TestClient(api_main.app).post("/chat/query", data={"query": "q", "session_id": "s"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "9"
+    assert r.json()["reason"] == "memory"
+
+
+def test_slot_outlives_cancelled_request(api_main, monkeypatch):
+    """After a 504 the worker thread still runs; the route's slot stays taken until it returns."""
+    from fastapi import Request
+    from fastapi.testclient import TestClient
+    controller = _controller(path="/_test/slow")
+    monkeypatch.setattr(api_main, "_admission", lambda: controller)
+    release_worker = threading.Event()
+
+    async def slow(request: Request):
+        return await api_main._run_cancellable(request, "chat_query", lambda: release_worker.wait(5))
+    api_main.app.add_api_route("/_test/slow", slow, methods=["POST"])
+    try:
+        with TestClient(api_main.app) as client:  # one event loop for both requests, as under a real server
+            r = client.post("/_test/slow", headers={api_main.DEADLINE_HEADER: "0.1"})
+            assert r.status_code == 504
+            assert controller.limiters["chat_query"].active == 1
+            assert client.post("/_test/slow").status_code == 503
+            release_worker.set()
+            for _ in range(100):
+                if controller.limiters["chat_query"].active == 0:
+                    break
+                threading.Event().wait(0.02)
+            assert controller.limiters["chat_query"].active == 0
+    finally:
+        release_worker.set()
+        api_main.app.router.routes[:] = [r for r in api_main.app.router.routes
+                                         if getattr(r, "path", None) != "/_test/slow"]
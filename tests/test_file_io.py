@@ -0,0 +1,64 @@
+import io
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException
+
+from exception.custom_exception import DocumentPortalException
+from utils.file_io import UploadTooLargeError, stream_upload_to_disk
+
+CHUNK = 256 * 1024
+
+
+class _GeneratedUpload:
+    """File-like upload producing `size` bytes on demand, so the source itself holds no buffer."""
+    def __init__(self, size: int, name: str = "big.pdf"):
+        self.name = name
+        self.remaining = size
+
+    def read(self, n: int = -1) -> bytes:
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        self.remaining -= n
+        return b"x" * n
+
+
+@pytest.mark.parametrize("size_mb", [4, 32])
+def test_stream_upload_memory_is_bounded_by_chunk(tmp_path, size_mb):
+    size = size_mb * 1024 * 1024
+    tracemalloc.start()
+    try:
+        saved = stream_upload_to_disk(_GeneratedUpload(size), tmp_path / "big.pdf", max_bytes=0, chunk_size=CHUNK)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert saved.size == size == (tmp_path / "big.pdf").stat().st_size
+    # the chunk being written plus the next one being read, independent of the file size
+    assert peak < 2 * CHUNK + 64 * 1024, f"peak {peak} bytes for a {size_mb} MiB upload"
+
+
+def test_stream_upload_over_limit_raises_and_leaves_nothing(tmp_path):
+    with pytest.raises(UploadTooLargeError):
+        stream_upload_to_disk(_GeneratedUpload(3 * CHUNK), tmp_path / "big.pdf", max_bytes=2 * CHUNK,
+                              chunk_size=CHUNK)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_too_large_maps_to_413_when_wrapped(api_main):
+    try:
+        try:
+            raise UploadTooLargeError("too big")
+        except UploadTooLargeError as e:
+            raise DocumentPortalException("Failed to save uploaded files", e) from e
+    except DocumentPortalException as wrapped:
+        with pytest.raises(HTTPException) as info:
+            api_main._raise_for_upload(wrapped)
+    assert info.value.status_code == 413
+
+
+def test_oversized_upload_returns_413(api_main, monkeypatch):
+    from fastapi.testclient import TestClient
+    monkeypatch.setitem(stream_upload_to_disk.__kwdefaults__, "max_bytes", 1024)
+    client = TestClient(api_main.app)
+    r = client.post("/analyze", files={"file": ("big.pdf", io.BytesIO(b"%PDF" + b"x" * 4096), "application/pdf")})
+    assert r.status_code == 413, r.text
+    assert "limit" in r.json()["detail"]
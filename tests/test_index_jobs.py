@@ -0,0 +1,58 @@
+import threading
+import time
+
+from src.doc_ingestion.index_jobs import IndexJobQueue
+
+
+class _RecordingExecutor:
+    """Stands in for the worker pool: records what a queue dispatched instead of running it."""
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, job_id):
+        self.jobs.append(job_id)
+
+
+def _queue(db, **kw) -> IndexJobQueue:
+    queue = IndexJobQueue(db_path=db, max_workers=100, per_tenant=100, **kw)
+    queue._executor = _RecordingExecutor()
+    return queue
+
+
+def test_two_processes_never_claim_the_same_job(tmp_path):
+    db = tmp_path / "jobs.db"
+    a, b = _queue(db), _queue(db)
+    executor, a._executor = a._executor, None  # queue without dispatching
+    job_ids = [a.submit(f"s{i}", {}) for i in range(50)]
+    a._executor = executor
+
+    barrier = threading.Barrier(2)
+    threads = [threading.Thread(target=lambda q=q: (barrier.wait(), q._pump())) for q in (a, b)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    dispatched = a._executor.jobs + b._executor.jobs
+    assert sorted(dispatched) == sorted(job_ids)
+    owners = {a.owner: set(a._executor.jobs), b.owner: set(b._executor.jobs)}
+    for job_id in job_ids:
+        row = a._row(job_id)
+        assert row["status"] == "running" and job_id in owners[row["owner"]]
+
+
+def test_start_requeues_only_expired_leases(tmp_path):
+    db = tmp_path / "jobs.db"
+    live, crashed = _queue(db), _queue(db, lease_seconds=0.05)
+    live_job = live.submit("s1", {})
+    crashed_job = crashed.submit("s2", {})
+    assert live._row(live_job)["owner"] == live.owner
+    time.sleep(0.1)  # the crashed queue never renewed its lease
+
+    restarted = _queue(db)
+    assert restarted._requeue_expired() == 1
+    assert live._row(live_job)["status"] == "running"  # a live worker's job is left alone
+    assert restarted._row(crashed_job)["status"] == "queued"
+    restarted._pump()
+    assert restarted._executor.jobs == [crashed_job]
+    assert restarted._row(crashed_job)["owner"] == restarted.owner
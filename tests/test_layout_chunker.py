@@ -0,0 +1,38 @@
+from utils.layout_chunker import LayoutBlock, LayoutChunker
+
+BODY, HEADING = 10.0, 14.0
+
+
+def _page(*items):
+    """One page of blocks from (text, font size) pairs, offsets as in the page text."""
+    blocks, offset = [], 0
+    for text, size in items:
+        blocks.append(LayoutBlock(0, offset, text + "\n", size, False))
+        offset += len(text) + 1
+    return blocks
+
+
+def test_overlap_is_carried_within_a_section_but_never_taken_for_headings():
+    body = [f"paragraph {i} " + "x" * 17 for i in range(4)]  # 30 characters each
+    oversized = " ".join(["word"] * 40)  # longer than chunk_size
+    page = _page(("Intro", HEADING), *[(b, BODY) for b in body], (oversized, BODY),
+                 ("Next section", HEADING), (oversized, BODY), ("closing words", BODY))
+    chunks = LayoutChunker(chunk_size=100, chunk_overlap=40).split_layout([page], {"source": "doc.pdf"})
+    by_start = {c.metadata["start_index"]: c for c in chunks}
+
+    first, second = chunks[0], chunks[1]
+    assert first.page_content.startswith("Intro\n" + body[0])
+    assert second.page_content == body[2] + "\n" + body[3]  # the trailing block repeated as overlap
+    assert second.metadata["start_index"] == page[3].start
+
+    # the oversized block after the size-triggered flush: no carried body text in front of it
+    piece = by_start[page[5].start]
+    assert piece.page_content.startswith("word word")
+    assert piece.metadata["section_path"] == "Intro"
+
+    # in the next section the heading, and only the heading, leads the first piece
+    lead = by_start[page[6].start]
+    assert lead.page_content.startswith("Next section\nword word")
+    assert lead.metadata["section_path"] == "Next section"
+    assert not any(c.page_content.startswith(body[3]) and c is not second for c in chunks)
+    assert chunks[-1].page_content == "closing words"
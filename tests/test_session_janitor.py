@@ -0,0 +1,32 @@
+import os
+import time
+
+from src.doc_ingestion.index_jobs import IndexJobQueue
+from utils.session_janitor import SessionJanitor
+
+
+def _session(root, name, age_s):
+    path = root / name
+    path.mkdir(parents=True)
+    (path / "upload.pdf").write_bytes(b"x" * 1024)
+    old = time.time() - age_s
+    os.utime(path, (old, old))
+    return path
+
+
+def test_sessions_with_pending_index_jobs_are_not_evicted(tmp_path):
+    uploads = tmp_path / "data"
+    jobs = IndexJobQueue(db_path=tmp_path / "jobs.db")  # not started: the job stays queued behind the backlog
+    waiting = _session(uploads, "waiting", age_s=7200)
+    idle = _session(uploads, "idle", age_s=7200)
+    job_id = jobs.submit("waiting", {"paths": [str(waiting / "upload.pdf")]})
+
+    janitor = SessionJanitor([uploads], state_path=tmp_path / "state.json", max_total_bytes=0,
+                             max_age_seconds=3600, min_idle_seconds=0, in_use=jobs.active_sessions)
+    assert janitor.run_once() == 1
+    assert waiting.exists() and not idle.exists()
+
+    jobs._update(job_id, status="succeeded")
+    assert jobs.active_sessions() == set()
+    assert janitor.run_once() == 1
+    assert not waiting.exists()
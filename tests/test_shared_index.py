@@ -0,0 +1,54 @@
+import threading
+
+from langchain_core.documents import Document
+
+from src.doc_ingestion.data_ingestion import IndexShard
+from utils.local_embeddings import LocalHashingEmbeddings
+from utils.vector_search import ShardTarget
+
+
+class _GatedEmbeddings(LocalHashingEmbeddings):
+    """Document embedding waits on `gate` once armed, like a slow remote embedding call."""
+    def __init__(self):
+        super().__init__(n_features=64, ngram_range=(1, 1), token_pattern=r"\w+")
+        self.gate = None
+        self.embedding = threading.Event()
+
+    def embed_documents(self, texts):
+        if self.gate is not None:
+            self.embedding.set()
+            assert self.gate.wait(5)
+        return super().embed_documents(texts)
+
+
+def _docs(words):
+    return [Document(page_content=f"{w} section about {w}", metadata={}) for w in words]
+
+
+def test_search_is_not_blocked_by_another_sessions_upsert(tmp_path):
+    emb = _GatedEmbeddings()
+    shard = IndexShard(tmp_path / "shard", emb)
+    shard.upsert_documents("a", {"a.pdf": _docs(["alpha", "beta"])})
+
+    emb.gate = threading.Event()
+    writer = threading.Thread(target=shard.upsert_documents, args=("b", {"b.pdf": _docs(["gamma", "delta"])}))
+    writer.start()
+    try:
+        assert emb.embedding.wait(5)
+        searched = []
+        reader = threading.Thread(target=lambda: searched.append(
+            ShardTarget("a", shard).search_many([emb.embed_query("alpha")], 1)))
+        reader.start()
+        reader.join(2)
+        assert searched, "search waited for the other session's embedding"
+        assert searched[0][0][0][0].page_content.startswith("alpha")
+    finally:
+        emb.gate.set()
+        writer.join(5)
+
+    emb.gate = None
+    assert len(shard.positions("b")) == 2
+    reloaded = IndexShard(tmp_path / "shard", emb)  # the saved snapshot holds both sessions
+    assert len(reloaded.positions("a")) == 2 and len(reloaded.positions("b")) == 2
+    hits = ShardTarget("b", reloaded).search_many([emb.embed_query("delta")], 1)
+    assert hits[0][0][0].page_content.startswith("delta")
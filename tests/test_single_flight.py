@@ -0,0 +1,85 @@
+import threading
+import time
+
+from utils.deadline import Deadline, RequestCancelled, current_deadline, deadline_scope
+from utils.single_flight import SingleFlight
+
+
+class _Work:
+    """Blocking work that records the deadline it runs under and stops when that deadline is cancelled."""
+    def __init__(self, result="shared"):
+        self.result = result
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.deadline = None
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        self.deadline = current_deadline()
+        self.started.set()
+        while not self.release.wait(0.01):
+            if self.deadline.cancelled:
+                raise RequestCancelled(self.deadline.reason, "work")
+        return self.result
+
+
+def _call(flight: SingleFlight, key, work, deadline: Deadline, results: dict, name: str) -> threading.Thread:
+    def run():
+        with deadline_scope(deadline):
+            try:
+                results[name] = flight.do(key, work)
+            except RequestCancelled as e:
+                results[name] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_for_waiters(flight: SingleFlight, key, n: int):
+    until = time.monotonic() + 5
+    while flight._flights[key].waiters < n:
+        assert time.monotonic() < until, "callers never joined the flight"
+        time.sleep(0.005)
+
+
+def test_leader_cancel_leaves_follower_result():
+    flight, work, results = SingleFlight("test_leader"), _Work(), {}
+    leader_deadline, follower_deadline = Deadline(), Deadline()
+    leader = _call(flight, "k", work, leader_deadline, results, "leader")
+    assert work.started.wait(5)
+    follower = _call(flight, "k", work, follower_deadline, results, "follower")
+    _wait_for_waiters(flight, "k", 2)
+
+    leader_deadline.cancel("disconnect")
+    assert work.deadline.reason is None  # the follower still waits: the shared work goes on
+
+    work.release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results["follower"] == "shared"
+    assert work.calls == 1
+    assert work.deadline.reason is None
+
+
+def test_all_callers_cancelled_abandons_work_and_next_call_starts_fresh():
+    flight, work, results = SingleFlight("test_abandon"), _Work(), {}
+    deadlines = [Deadline(), Deadline()]
+    threads = [_call(flight, "k", work, deadlines[0], results, "leader")]
+    assert work.started.wait(5)
+    threads.append(_call(flight, "k", work, deadlines[1], results, "follower"))
+    _wait_for_waiters(flight, "k", 2)
+
+    for deadline in deadlines:
+        deadline.cancel("disconnect")
+    assert work.deadline.reason == "disconnect"  # the flight's own deadline, cancelled with its last caller
+    for thread in threads:
+        thread.join(5)
+    assert isinstance(results["follower"], RequestCancelled)
+    assert isinstance(results["leader"], RequestCancelled)
+    assert "k" not in flight._flights
+
+    fresh = _Work(result="fresh")
+    fresh.release.set()
+    assert flight.do("k", fresh) == "fresh"
+    assert fresh.calls == 1 and fresh.deadline is not work.deadline
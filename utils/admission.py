@@ -0,0 +1,244 @@
+from __future__ import annotations
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, Optional
+from logger import GLOBAL_LOGGER as log
+from utils.metrics import REGISTRY
+
+ADMISSIONS = REGISTRY.counter("docportal_admission_total",
+                              "Requests by admission outcome (admitted right away, admitted after queueing, shed)",
+                              ("route", "outcome"))
+SHED = REGISTRY.counter("docportal_admission_shed_total", "Requests rejected with 503 by reason",
+                        ("route", "reason"))
+IN_FLIGHT = REGISTRY.gauge("docportal_admission_in_flight", "Admitted requests currently running", ("route",))
+QUEUED = REGISTRY.gauge("docportal_admission_queued", "Requests waiting for a slot", ("route",))
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram("docportal_admission_wait_seconds",
+                                            "Time admitted requests spent in the wait queue", ("route",))
+PROCESS_RSS = REGISTRY.gauge("docportal_process_rss_bytes", "Resident set size at the last admission decision")
+
+
+def current_rss_bytes() -> int:
+    """Current resident set size (VmRSS); the peak (ru_maxrss) where /proc is not available."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Overloaded(Exception):
+    """A request was shed; answer 503 with `retry_after` seconds."""
+    def __init__(self, route: str, reason: str, retry_after: int):
+        super().__init__(f"Service overloaded ({reason}) on {route}; retry in {retry_after}s")
+        self.route = route
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class EndpointLimiter:
+    """
+    At most `max_concurrent` requests of one route run at a time; up to
+    `max_queue` more wait in FIFO order, each for at most `max_wait_s`.
+    Service time is tracked (EWMA) to tell shed clients when to come back.
+    Event-loop only: acquire/release must run on the server's loop.
+    """
+    def __init__(self, route: str, max_concurrent: int, max_queue: int = 0, max_wait_s: float = 10.0):
+        self.route = route
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait_s = float(max_wait_s)
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.service_s = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: the queue ahead drained at the observed service rate."""
+        backlog = len(self.waiters) + 1
+        return max(1, min(120, math.ceil(self.service_s * backlog / self.max_concurrent)))
+
+    def _gauges(self):
+        IN_FLIGHT.set(self.active, route=self.route)
+        QUEUED.set(len(self.waiters), route=self.route)
+
+    async def acquire(self) -> float:
+        """Take a slot, queueing if needed; returns the seconds waited. Raises Overloaded."""
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+            self._gauges()
+            return 0.0
+        if len(self.waiters) >= self.max_queue:
+            raise Overloaded(self.route, "queue_full", self.retry_after())
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self._gauges()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0, count=False)  # the slot was handed over just as we gave up: pass it on
+            else:
+                waiter.cancel()
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+            self._gauges()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise Overloaded(self.route, "queue_timeout", self.retry_after()) from None
+        return time.monotonic() - start
+
+    def release(self, seconds: float, count: bool = True):
+        if count:
+            self.service_s = 0.8 * self.service_s + 0.2 * seconds
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot moves to the next waiter: `active` stays the same
+                self._gauges()
+                return
+        self.active -= 1
+        self._gauges()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"in_flight": self.active, "queued": len(self.waiters), "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue, "max_wait_s": self.max_wait_s,
+                "service_seconds_ewma": round(self.service_s, 3)}
+
+
+class AdmissionSlot:
+    """
+    A slot taken from a limiter. It is given back when the request is done
+    and every worker it handed off (hold()) has finished: a worker thread
+    left running after a 499/504 still counts against the route's limit.
+    """
+    def __init__(self, limiter: EndpointLimiter):
+        self.limiter = limiter
+        self.started = time.monotonic()
+        self._holds = 1  # the request itself
+        self._loop = asyncio.get_running_loop()
+
+    def hold(self) -> Callable[[], None]:
+        """Keep the slot until the returned callback runs; it may be called from any thread, once counts."""
+        self._holds += 1
+        once = threading.Lock()
+
+        def release():
+            if once.acquire(blocking=False):
+                try:
+                    self._loop.call_soon_threadsafe(self._drop)
+                except RuntimeError:  # loop closed at shutdown: nothing left to admit
+                    pass
+        return release
+
+    def _drop(self):
+        self._holds -= 1
+        if self._holds == 0:
+            self.limiter.release(time.monotonic() - self.started)
+
+
+_CURRENT_SLOT: contextvars.ContextVar[Optional[AdmissionSlot]] = contextvars.ContextVar("admission_slot", default=None)
+
+
+def hold_admission_slot() -> Callable[[], None]:
+    """
+    For work that may outlive its request (a worker thread keeps running after
+    a cancellation): keep the current request's slot until the returned
+    callback is called. A no-op outside admitted requests.
+    """
+    slot = _CURRENT_SLOT.get()
+    return slot.hold() if slot is not None else (lambda: None)
+
+
+class AdmissionController:
+    """
+    Per-route limiters plus memory-aware shedding: while the process RSS is
+    above `rss_shed_bytes`, new requests to the `rss_shed_routes` (the ones
+    that hold whole documents in memory) are rejected before their upload
+    is read. Paths without a configured route are always admitted.
+    """
+    def __init__(self, routes: Dict[str, Dict[str, Any]], rss_shed_bytes: Optional[int] = None,
+                 rss_shed_routes: Optional[Iterable[str]] = None, memory_retry_after_s: int = 5):
+        self.limiters: Dict[str, EndpointLimiter] = {}
+        self.paths: Dict[str, str] = {}
+        for route, spec in routes.items():
+            self.limiters[route] = EndpointLimiter(route, spec.get("max_concurrent", 4), spec.get("max_queue", 0),
+                                                   spec.get("max_wait_s", 10.0))
+            self.paths[spec.get("path", "/" + route)] = route
+        self.rss_shed_bytes = rss_shed_bytes
+        self.rss_shed_routes = set(rss_shed_routes if rss_shed_routes is not None else self.limiters)
+        self.memory_retry_after_s = memory_retry_after_s
+
+    @classmethod
+    def from_config(cls, block: Optional[Dict[str, Any]]) -> Optional["AdmissionController"]:
+        """None when the block is missing or disabled."""
+        if not block or not block.get("enabled", True):
+            return None
+        rss_mb = block.get("rss_shed_mb")
+        return cls(routes=block.get("routes") or {},
+                   rss_shed_bytes=int(float(rss_mb) * 1024 * 1024) if rss_mb else None,
+                   rss_shed_routes=block.get("rss_shed_routes"),
+                   memory_retry_after_s=int(block.get("memory_retry_after_s", 5)))
+
+    def route_for(self, method: str, path: str) -> Optional[str]:
+        return self.paths.get(path.rstrip("/") or "/") if method == "POST" else None
+
+    def _check_memory(self, route: str):
+        if self.rss_shed_bytes is None or route not in self.rss_shed_routes:
+            return
+        rss = current_rss_bytes()
+        PROCESS_RSS.set(rss)
+        if rss > self.rss_shed_bytes:
+            raise Overloaded(route, "memory", self.memory_retry_after_s)
+
+    @asynccontextmanager
+    async def admit(self, route: str) -> AsyncIterator[None]:
+        """
+        Hold a slot of `route` for the duration of the block (and of any work
+        held with hold_admission_slot() in it); raises Overloaded when shed.
+        """
+        limiter = self.limiters[route]
+        try:
+            self._check_memory(route)
+            waited = await limiter.acquire()
+            try:
+                self._check_memory(route)  # it may have grown while this request was queued
+            except Overloaded:
+                limiter.release(0.0, count=False)
+                raise
+        except Overloaded as e:
+            SHED.inc(route=route, reason=e.reason)
+            ADMISSIONS.inc(route=route, outcome="shed")
+            log.warning("Request shed", route=route, reason=e.reason, retry_after=e.retry_after)
+            raise
+        ADMISSIONS.inc(route=route, outcome="queued" if waited else "admitted")
+        if waited:
+            ADMISSION_WAIT_SECONDS.observe(waited, route=route)
+        slot = AdmissionSlot(limiter)
+        token = _CURRENT_SLOT.set(slot)
+        try:
+            yield
+        finally:
+            _CURRENT_SLOT.reset(token)
+            slot._drop()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "rss_mb": round(current_rss_bytes() / (1024 * 1024), 1),
+            "rss_shed_mb": round(self.rss_shed_bytes / (1024 * 1024), 1) if self.rss_shed_bytes else None,
+            "routes": {route: {**limiter.snapshot(),
+                               "shed": {reason: int(SHED.value(route=route, reason=reason))
+                                        for reason in ("queue_full", "queue_timeout", "memory")}}
+                       for route, limiter in self.limiters.items()},
+        }
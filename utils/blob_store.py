@@ -0,0 +1,183 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from logger import GLOBAL_LOGGER as log
+from utils.file_io import SavedUpload, stream_upload_to_disk
+
+MANIFEST_NAME = ".blobs.json"  # per session dir: {file name: sha256}
+LOCK_STRIPES = 64  # per-key locks are striped: memory stays fixed however many blobs pass through
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploads, keyed by sha256.
+
+    Each distinct file is stored once under `<root>/<sha[:2]>/<sha>` and linked
+    into session directories (hardlink, copy when linking is not possible); a
+    small manifest in every session directory records which blob each file is.
+    Extracted page text (and the page layout the layout chunker reads) is
+    cached next to the blob, so analyze, compare and chat extract a given PDF
+    once no matter how many sessions upload it.
+    """
+    def __init__(self, root: str | Path = "data/_blobs"):
+        self.root = Path(root)
+        self.incoming = self.root / "_incoming"
+        self.incoming.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.stats = {"uploads": 0, "dedup_hits": 0, "bytes_uploaded": 0, "bytes_deduplicated": 0,
+                      "extract_hits": 0, "extract_misses": 0, "extract_seconds_saved": 0.0}
+
+    # ---------- paths ----------
+    def blob_path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def _cache_path(self, sha256: str, kind: str = "pages") -> Path:
+        """Extraction cache next to the blob: `<sha>.pages.json` (page texts) or `<sha>.layout.json`."""
+        return self.root / sha256[:2] / f"{sha256}.{kind}.json"
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        """Lock guarding `key` (a sha, manifest path or page cache); never held while taking another."""
+        return self._key_locks[zlib.crc32(key.encode("utf-8")) % LOCK_STRIPES]
+
+    # ---------- write ----------
+    def put(self, uploaded_file, dest_path: Path) -> SavedUpload:
+        """Stream an upload into the store (dedup by hash) and link it at `dest_path`."""
+        tmp = self.incoming / uuid.uuid4().hex
+        saved = stream_upload_to_disk(uploaded_file, tmp)
+        blob = self.blob_path(saved.sha256)
+        with self._key_lock(saved.sha256):  # also keeps gc() from seeing the blob before it is linked
+            if blob.exists():
+                tmp.unlink(missing_ok=True)
+                dedup = True
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp, blob)
+                dedup = False
+            self._link(blob, dest_path)
+        self._record(dest_path, saved.sha256)
+        with self._lock:
+            self.stats["uploads"] += 1
+            self.stats["bytes_uploaded"] += saved.size
+            if dedup:
+                self.stats["dedup_hits"] += 1
+                self.stats["bytes_deduplicated"] += saved.size
+        log.info("Upload stored", sha256=saved.sha256, dest=str(dest_path), dedup=dedup, size=saved.size)
+        return saved._replace(path=dest_path)
+
+    @staticmethod
+    def _link(blob: Path, dest: Path):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(blob, dest)
+        except OSError:
+            shutil.copyfile(blob, dest)  # e.g. sessions on another filesystem
+
+    def _record(self, dest: Path, sha256: str):
+        manifest = dest.parent / MANIFEST_NAME
+        with self._key_lock(str(manifest)):
+            entries = json.loads(manifest.read_text(encoding="utf-8")) if manifest.exists() else {}
+            entries[dest.name] = sha256
+            tmp = manifest.with_suffix(".tmp")
+            tmp.write_text(json.dumps(entries), encoding="utf-8")
+            os.replace(tmp, manifest)
+
+    # ---------- read ----------
+    @staticmethod
+    def sha_for(path: Path) -> Optional[str]:
+        """Blob hash of a session file, from its directory manifest."""
+        manifest = Path(path).parent / MANIFEST_NAME
+        try:
+            return json.loads(manifest.read_text(encoding="utf-8")).get(Path(path).name)
+        except (OSError, ValueError):
+            return None
+
+    def read_pages(self, path: Path, extract: Callable[[Path], List[str]], variant: str = "") -> List[str]:
+        """
+        Page texts of `path`, served from the per-blob cache when the file came through the store.
+        A cache written by another `variant` of the extractor is replaced.
+        """
+        return self._read_cached(path, "pages", extract, variant)
+
+    def read_layout(self, path: Path, extract: Callable[[Path], List[list]], variant: str = "") -> List[list]:
+        """Per-page layout blocks of `path` (JSON-able tuples), cached like read_pages under `<sha>.layout.json`."""
+        return self._read_cached(path, "layout", extract, variant)
+
+    def _read_cached(self, path: Path, kind: str, extract: Callable[[Path], List], variant: str) -> List:
+        sha = self.sha_for(path)
+        if sha is None:
+            return extract(Path(path))
+        cache = self._cache_path(sha, kind)
+        with self._key_lock(f"{kind}:{sha}"):
+            cached = json.loads(cache.read_text(encoding="utf-8")) if cache.exists() else None
+            if cached is not None and cached.get("variant", "") == variant:
+                with self._lock:
+                    self.stats["extract_hits"] += 1
+                    self.stats["extract_seconds_saved"] += cached.get("seconds", 0.0)
+                return cached["pages"]
+            t0 = time.perf_counter()
+            pages = extract(Path(path))
+            elapsed = time.perf_counter() - t0
+            tmp = cache.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"pages": pages, "seconds": elapsed, "variant": variant}), encoding="utf-8")
+            os.replace(tmp, cache)
+        with self._lock:
+            self.stats["extract_misses"] += 1
+        return pages
+
+    # ---------- housekeeping ----------
+    def gc(self, limit: int = 100, min_age_seconds: float = 3600) -> int:
+        """
+        Delete up to `limit` blobs no session links to any more (link count 1), with their extraction caches,
+        and uploads left in `_incoming` by a crashed or aborted request.
+        """
+        removed = 0
+        cutoff = time.time() - min_age_seconds
+        stale = 0
+        for leftover in self.incoming.iterdir():
+            try:
+                if leftover.stat().st_mtime < cutoff:  # uploads in progress keep touching their file
+                    leftover.unlink(missing_ok=True)
+                    stale += 1
+            except OSError:
+                continue
+        if stale:
+            log.info("Stale incoming uploads removed", count=stale)
+        for shard in self.root.iterdir():
+            if not shard.is_dir() or shard == self.incoming:
+                continue
+            for blob in shard.iterdir():
+                if removed >= limit:
+                    return removed
+                if blob.suffix or not blob.is_file():
+                    continue
+                with self._key_lock(blob.name):
+                    st = blob.stat()
+                    if st.st_nlink > 1 or st.st_mtime > cutoff:
+                        continue
+                    blob.unlink(missing_ok=True)
+                    for kind in ("pages", "layout"):
+                        self._cache_path(blob.name, kind).unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            log.info("Orphan blobs removed", count=removed)
+        return removed
+
+    def footprint(self) -> Dict[str, object]:
+        blobs = physical = 0
+        for shard in self.root.iterdir():
+            if shard.is_dir() and shard != self.incoming:
+                for f in shard.iterdir():
+                    physical += f.stat().st_size
+                    blobs += 0 if f.suffix else 1
+        with self._lock:
+            stats = dict(self.stats)
+        return {"blobs": blobs, "physical_bytes": physical, **stats}
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Set, Tuple
+from utils.metrics import REGISTRY
+
+BOILERPLATE_LINES = REGISTRY.counter("docportal_boilerplate_lines_removed_total",
+                                     "Repeated header/footer lines stripped from PDF page text")
+BOILERPLATE_CHARS = REGISTRY.counter("docportal_boilerplate_chars_removed_total",
+                                     "Characters of repeated header/footer text stripped from PDF pages")
+
+# Off -> page text is PyMuPDF's plain get_text(), boilerplate included
+BOILERPLATE_STRIP_ENABLED = os.getenv("BOILERPLATE_STRIP_ENABLED", "true").lower() == "true"
+# a margin line is boilerplate when it repeats on at least this fraction of pages (0.5 catches odd/even headers)
+BOILERPLATE_MIN_FRACTION = float(os.getenv("BOILERPLATE_MIN_FRACTION", "0.5"))
+# only blocks within this top/bottom fraction of the page height are candidates
+BOILERPLATE_MARGIN = float(os.getenv("BOILERPLATE_MARGIN", "0.15"))
+# documents shorter than this are left alone: too few pages to tell a header from content
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+
+# (top, bottom) of a text block as fractions of the page height, and its text
+Block = Tuple[float, float, str]
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def page_blocks(page) -> List[Block]:
+    """Text blocks of a PyMuPDF page in reading order; image blocks are skipped."""
+    height = page.rect.height or 1.0
+    return [(b[1] / height, b[3] / height, b[4]) for b in page.get_text("blocks") if b[6] == 0]
+
+
+def _zone(block: Block, margin: float) -> str:
+    top, bottom, _ = block
+    if bottom <= margin:
+        return "top"
+    if top >= 1.0 - margin:
+        return "bottom"
+    return ""
+
+
+def line_key(block: Block, line: str, margin: float = BOILERPLATE_MARGIN) -> Optional[Tuple[str, str]]:
+    """
+    Key (zone, normalized line) of a line in a margin block, None for body
+    blocks and blank lines. Page numbers and dates differ per page: "Page 3
+    of 10" and "Page 4 of 10" share a key.
+    """
+    zone = _zone(block, margin)
+    if not zone or not line.strip():
+        return None
+    return zone, _DIGITS_RE.sub("#", _SPACE_RE.sub(" ", line.strip().lower()))
+
+
+def find_boilerplate(pages: List[List[Block]], min_fraction: float = BOILERPLATE_MIN_FRACTION,
+                     margin: float = BOILERPLATE_MARGIN, min_pages: int = BOILERPLATE_MIN_PAGES
+                     ) -> Set[Tuple[str, str]]:
+    """Keys (zone, normalized line) of header/footer lines that repeat on enough pages."""
+    if len(pages) < max(2, min_pages):
+        return set()
+    seen: Counter = Counter()
+    for blocks in pages:
+        keys = {line_key(block, line, margin) for block in blocks for line in block[2].splitlines()}
+        keys.discard(None)
+        seen.update(keys)
+    threshold = max(2, math.ceil(min_fraction * len(pages)))
+    return {key for key, count in seen.items() if count >= threshold}
+
+
+def strip_boilerplate(pages: List[List[Block]], min_fraction: float = BOILERPLATE_MIN_FRACTION,
+                      margin: float = BOILERPLATE_MARGIN, min_pages: int = BOILERPLATE_MIN_PAGES) -> List[str]:
+    """
+    Page texts with the repeated header/footer lines (letterheads, confidentiality
+    footers, page numbers) removed. Only lines of blocks inside the top/bottom
+    margin are candidates, so repeated body text (table headers, boilerplate
+    clauses) is kept. Pages without boilerplate come out as plain get_text().
+    """
+    boilerplate = find_boilerplate(pages, min_fraction, margin, min_pages)
+    texts, lines_removed, chars_removed = [], 0, 0
+    for blocks in pages:
+        parts = []
+        for block in blocks:
+            if not boilerplate or not _zone(block, margin):
+                parts.append(block[2])
+                continue
+            lines = block[2].splitlines()
+            kept = [line for line in lines if line_key(block, line, margin) not in boilerplate]
+            if len(kept) == len(lines):
+                parts.append(block[2])
+                continue
+            lines_removed += len(lines) - len(kept)
+            chars_removed += sum(len(line) for line in lines) - sum(len(line) for line in kept)
+            if any(line.strip() for line in kept):
+                parts.append("\n".join(kept) + "\n")
+        texts.append("".join(parts))
+    if lines_removed:
+        BOILERPLATE_LINES.inc(lines_removed)
+        BOILERPLATE_CHARS.inc(chars_removed)
+    return texts
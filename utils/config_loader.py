@@ -1,15 +1,31 @@
+import copy
+import os
+import threading
 import yaml
 
+# parsed files by path, reused while the file is unchanged on disk (every request builds a ModelLoader)
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
 def load_config(file_path):
     """
     Load configuration from a YAML file.
-    
+
     Args:
         file_path (str): Path to the YAML configuration file.
-        
+
     Returns:
-        dict: Configuration data as a dictionary.
+        dict: Configuration data as a dictionary (a private copy: callers may modify it).
     """
-    with open(file_path, 'r') as file:
-        config = yaml.safe_load(file)
-    return config
\ No newline at end of file
+    path = os.path.abspath(file_path)
+    st = os.stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(path)
+    if cached is None or cached[0] != version:
+        with open(path, 'r') as file:
+            config = yaml.safe_load(file)
+        cached = (version, config)
+        with _CACHE_LOCK:
+            _CACHE[path] = cached
+    return copy.deepcopy(cached[1])
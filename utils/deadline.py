@@ -0,0 +1,217 @@
+from __future__ import annotations
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from utils.llm_router import background_loop
+from utils.metrics import REGISTRY
+
+REQUEST_CANCELLATIONS = REGISTRY.counter("docportal_request_cancellations_total",
+                                         "Requests stopped because their deadline passed or the client disconnected",
+                                         ("route", "reason"))
+CANCELLED_LLM_CALLS = REGISTRY.counter("docportal_cancelled_llm_calls_total",
+                                       "LLM calls of cancelled requests: never sent (before) or aborted (in_flight)",
+                                       ("when",))
+CANCELLED_LLM_TOKENS = REGISTRY.counter("docportal_cancelled_llm_tokens_total",
+                                        "Estimated prompt tokens of the LLM calls cancelled requests did not finish",
+                                        ("when",))
+CANCELLED_EMBEDDINGS = REGISTRY.counter("docportal_cancelled_embedding_texts_total",
+                                        "Chunks left unembedded because their ingestion request was cancelled")
+
+# Client-supplied deadline, in seconds from the request's arrival
+DEADLINE_HEADER = "X-Request-Timeout"
+
+
+class RequestCancelled(Exception):
+    """The request's deadline passed or its client went away; `reason` is "deadline" or "disconnect"."""
+    def __init__(self, reason: str, stage: str = ""):
+        super().__init__(f"Request cancelled ({reason})" + (f" during {stage}" if stage else ""))
+        self.reason = reason
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Cancellation state of one request: an optional expiry time plus an
+    explicit cancel (client disconnect). Callbacks registered with
+    `on_cancel` run once, on whichever thread cancels; while any are
+    registered, a timer makes sure expiry runs them without anyone polling.
+    """
+    def __init__(self, seconds: Optional[float] = None):
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds if seconds else None
+        self.reason: Optional[str] = None
+        self._callbacks: List[Callable[[], Any]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, None without an expiry."""
+        return None if self.expires_at is None else max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.cancel("deadline")
+        return self.reason is not None
+
+    def cancel(self, reason: str):
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+            self._stop_timer()
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """Run `callback` on cancellation (now, if already cancelled); returns an unregister function."""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                if self.expires_at is not None and self._timer is None:
+                    self._timer = threading.Timer(max(0.0, self.expires_at - time.monotonic()),
+                                                  lambda: self.cancelled)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback: Callable[[], Any]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+            if not self._callbacks:
+                self._stop_timer()
+
+    def _stop_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def check(self, stage: str = ""):
+        if self.cancelled:
+            raise RequestCancelled(self.reason or "deadline", stage)
+
+
+_DEADLINE: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """`deadline` governs every LLM/embedding call made inside the block (threads and tasks inherit it)."""
+    token = _DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _DEADLINE.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _DEADLINE.get()
+
+
+def check_deadline(stage: str = "", pending_embeddings: int = 0):
+    """Raise RequestCancelled if the current request is cancelled; `pending_embeddings` are counted as saved."""
+    deadline = _DEADLINE.get()
+    if deadline is not None and deadline.cancelled:
+        if pending_embeddings:
+            CANCELLED_EMBEDDINGS.inc(pending_embeddings)
+        deadline.check(stage)
+
+
+def _estimate_tokens(messages: List[BaseMessage]) -> int:
+    return sum(len(str(m.content)) for m in messages) // 4 + 1
+
+
+class CancellableChatModel(BaseChatModel):
+    """
+    Chat model whose calls stop when the current request's Deadline does:
+    a call is not sent once the request is cancelled, and an in-flight call
+    is cancelled on expiry or disconnect. Inside a deadline, sync calls run
+    the client's async path on the background loop so the HTTP request can
+    really be aborted; outside one, calls go straight to `inner`.
+    """
+    inner: Any
+    model_name: str = "cancellable"
+
+    @property
+    def _llm_type(self) -> str:
+        return "cancellable"
+
+    @staticmethod
+    def _skip(deadline: Deadline, tokens: int):
+        if deadline.cancelled:
+            CANCELLED_LLM_CALLS.inc(when="before")
+            CANCELLED_LLM_TOKENS.inc(tokens, when="before")
+            deadline.check("llm")
+
+    @staticmethod
+    def _aborted(deadline: Deadline, tokens: int) -> RequestCancelled:
+        CANCELLED_LLM_CALLS.inc(when="in_flight")
+        CANCELLED_LLM_TOKENS.inc(tokens, when="in_flight")
+        return RequestCancelled(deadline.reason or "deadline", "llm")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        deadline = _DEADLINE.get()
+        if deadline is None:
+            return ChatResult(generations=[ChatGeneration(message=self.inner.invoke(messages, stop=stop, **kwargs))])
+        tokens = _estimate_tokens(messages)
+        self._skip(deadline, tokens)
+        context = contextvars.copy_context()  # LLM priority/tenant, trace id, the deadline itself
+
+        async def call():
+            for var, value in context.items():
+                var.set(value)
+            return await self.inner.ainvoke(messages, stop=stop, **kwargs)
+
+        future = asyncio.run_coroutine_threadsafe(call(), background_loop())
+        unregister = deadline.on_cancel(future.cancel)
+        try:
+            message = future.result(timeout=deadline.remaining())
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            deadline.cancel("deadline")
+            raise self._aborted(deadline, tokens)
+        except concurrent.futures.CancelledError:
+            raise self._aborted(deadline, tokens)
+        finally:
+            unregister()
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        deadline = _DEADLINE.get()
+        if deadline is None:
+            message = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        tokens = _estimate_tokens(messages)
+        self._skip(deadline, tokens)
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(self.inner.ainvoke(messages, stop=stop, **kwargs))
+        unregister = deadline.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+        try:
+            message = await asyncio.wait_for(task, deadline.remaining())
+        except asyncio.TimeoutError:
+            deadline.cancel("deadline")
+            raise self._aborted(deadline, tokens)
+        except asyncio.CancelledError:
+            if deadline.reason is None:
+                raise
+            error = self._aborted(deadline, tokens)
+            current = asyncio.current_task()
+            if current is not None and current.cancelling():
+                raise  # the caller's task is being cancelled as well: let that cancellation through
+            raise error
+        finally:
+            unregister()
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -1,22 +1,127 @@
 from __future__ import annotations
+import re
 from pathlib import Path
-from typing import Iterable, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from fastapi import UploadFile
-from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+from langchain_core.documents import Document
+from langchain_community.document_loaders import Docx2txtLoader, TextLoader
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
+from utils.single_flight import SingleFlight
+from utils.boilerplate import BOILERPLATE_STRIP_ENABLED, page_blocks, strip_boilerplate
+from utils.layout_chunker import LayoutBlock, extract_pdf_layout
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
 
-def load_documents(paths: Iterable[Path]) -> List[Document]:
-    """Load docs using appropriate loader based on extension."""
+def extract_pdf_pages(path: Path) -> List[str]:
+    """
+    Plain text of every page (PyMuPDF), with repeated headers/footers stripped
+    (utils.boilerplate). The single PDF extraction shared by analyze, compare and chat.
+    """
+    import fitz  # PyMuPDF; deferred so API workers boot without it
+    with fitz.open(path) as doc:
+        if doc.is_encrypted:
+            raise ValueError(f"PDF is encrypted: {Path(path).name}")
+        if not BOILERPLATE_STRIP_ENABLED:
+            return [doc.load_page(i).get_text() for i in range(doc.page_count)]  # type: ignore
+        return strip_boilerplate([page_blocks(doc.load_page(i)) for i in range(doc.page_count)])
+
+# page texts / layouts cached by the blob store under another variant are extracted again
+EXTRACTION_VARIANT = "blocks-boilerplate" if BOILERPLATE_STRIP_ENABLED else "plain"
+LAYOUT_VARIANT = "layout-v1-" + ("boilerplate" if BOILERPLATE_STRIP_ENABLED else "plain")
+
+NOT_AVAILABLE = "Not Available"
+_PDF_DATE_RE = re.compile(r"^D?:?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?([Zz]|[+-]\d{2}'?\d{2}'?)?")
+_XMP_PUBLISHER_RE = re.compile(r"<dc:publisher>.*?<rdf:li[^>]*>(.*?)</rdf:li>", re.DOTALL)
+
+
+def _pdf_date(value: str) -> str:
+    """PDF date string (D:YYYYMMDDHHmmSS+HH'mm') as ISO 8601; unparseable values are returned as-is."""
+    m = _PDF_DATE_RE.match((value or "").strip())
+    if not m:
+        return value.strip() if value and value.strip() else NOT_AVAILABLE
+    year, month, day, hour, minute, second, tz = m.groups()
+    out = "-".join(p for p in (year, month, day) if p)
+    if hour:
+        out += f"T{hour}:{minute or '00'}:{second or '00'}"
+        if tz:
+            out += "Z" if tz in "Zz" else f"{tz[:3]}:{tz.replace(chr(39), '')[3:5]}"
+    return out
+
+
+def extract_pdf_metadata(path: Path) -> Dict[str, Any]:
+    """
+    Document properties PyMuPDF already knows, in the analysis schema's field
+    names: Title, Author, DateCreated, LateModifiedDate, Publisher (XMP
+    dc:publisher) and PageCount. Missing values are "Not Available".
+    """
+    import fitz  # PyMuPDF; deferred so API workers boot without it
+    with fitz.open(path) as doc:
+        if doc.is_encrypted:
+            raise ValueError(f"PDF is encrypted: {Path(path).name}")
+        info = doc.metadata or {}
+        publisher = _XMP_PUBLISHER_RE.search(doc.get_xml_metadata() or "")
+        return {
+            "Title": (info.get("title") or "").strip() or NOT_AVAILABLE,
+            "Author": (info.get("author") or "").strip() or NOT_AVAILABLE,
+            "DateCreated": _pdf_date(info.get("creationDate", "")),
+            "LateModifiedDate": _pdf_date(info.get("modDate", "")),
+            "Publisher": publisher.group(1).strip() if publisher else NOT_AVAILABLE,
+            "PageCount": doc.page_count,
+        }
+
+# concurrent extractions of one PDF (same blob, or same file unchanged on disk) run once
+PDF_EXTRACTIONS = SingleFlight("pdf.extract")
+
+def _file_key(path: Path):
+    st = path.stat()
+    return ("file", str(path.resolve()), st.st_size, st.st_mtime_ns)
+
+def read_pdf_pages(path: Path, blob_store=None) -> List[str]:
+    """Page texts, served from the blob store's extraction cache when one is given."""
+    path = Path(path)
+    if blob_store is not None:
+        sha = blob_store.sha_for(path)
+        return PDF_EXTRACTIONS.do(("blob", sha) if sha else _file_key(path),
+                                  lambda: blob_store.read_pages(path, extract_pdf_pages, EXTRACTION_VARIANT))
+    return PDF_EXTRACTIONS.do(_file_key(path), lambda: extract_pdf_pages(path))
+
+def read_pdf_layout(path: Path, blob_store=None) -> List[List[LayoutBlock]]:
+    """Per-page layout blocks (utils.layout_chunker), served from the blob store's layout cache when one is given."""
+    path = Path(path)
+    if blob_store is not None:
+        sha = blob_store.sha_for(path)
+        pages = PDF_EXTRACTIONS.do(("layout", sha) if sha else ("layout",) + _file_key(path),
+                                   lambda: blob_store.read_layout(path, extract_pdf_layout, LAYOUT_VARIANT))
+    else:
+        pages = PDF_EXTRACTIONS.do(("layout",) + _file_key(path), lambda: extract_pdf_layout(path))
+    return [[LayoutBlock(*b) for b in blocks] for blocks in pages]  # cached layouts come back as lists
+
+def pages_from_layout(layout: List[List[LayoutBlock]]) -> List[str]:
+    """Page texts of a layout: its blocks joined, which is what the blocks' `start` offsets index."""
+    return ["".join(b.text for b in blocks) for blocks in layout]
+
+def load_documents(paths: Iterable[Path], blob_store=None,
+                   layouts: Optional[Dict[str, List[List[LayoutBlock]]]] = None) -> List[Document]:
+    """
+    Load docs using appropriate loader based on extension. With a `layouts`
+    dict, PDFs are read through their layout (for the layout chunker): the
+    page texts are derived from it and the layout is kept in `layouts` by
+    source path, so splitting does not extract the file a second time.
+    """
     docs: List[Document] = []
     try:
         for p in paths:
             ext = p.suffix.lower()
             if ext == ".pdf":
-                loader = PyPDFLoader(str(p))
+                if layouts is not None:
+                    layout = layouts[str(p)] = read_pdf_layout(p, blob_store)
+                    pages = pages_from_layout(layout)
+                else:
+                    pages = read_pdf_pages(p, blob_store)
+                docs.extend(Document(page_content=text, metadata={"source": str(p), "page": i, "total_pages": len(pages)})
+                            for i, text in enumerate(pages))
+                continue
             elif ext == ".docx":
                 loader = Docx2txtLoader(str(p))
             elif ext == ".txt":
@@ -45,11 +150,17 @@ def concat_for_comparison(ref_docs: List[Document], act_docs: List[Document]) ->
 
 # ---------- Helpers ----------
 class FastAPIFileAdapter:
-    """Adapt FastAPI UploadFile -> .name + .getbuffer() API"""
+    """Adapt FastAPI UploadFile -> .name + .iter_chunks() / .getbuffer() API"""
     def __init__(self, uf: UploadFile):
         self._uf = uf
         self.name = uf.filename
+    def iter_chunks(self, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Stream the (spooled) upload without materializing it; preferred by utils.file_io."""
+        self._uf.file.seek(0)
+        while chunk := self._uf.file.read(chunk_size):
+            yield chunk
     def getbuffer(self) -> bytes:
+        """Whole upload in memory -- only for callers that really need bytes."""
         self._uf.file.seek(0)
         return self._uf.file.read()
 
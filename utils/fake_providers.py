@@ -0,0 +1,103 @@
+from __future__ import annotations
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_PAGE_RE = re.compile(r"---\s*Page\s+(\d+)\s*---")
+_FIX_PROMPT_MARK = "the Completion did not satisfy the constraints"
+
+# Ways models break JSON in practice
+_MALFORMATIONS = (
+    lambda v: "Here is the JSON you asked for:\n" + json.dumps(v, indent=2) + "\nLet me know if you need more.",
+    lambda v: json.dumps(v, indent=2)[:-1].rstrip() + ",\n" + json.dumps(v, indent=2)[-1],  # trailing comma
+    lambda v: repr(v),  # Python literal: single quotes, True/None
+    lambda v: "<think>The user wants JSON.</think>\n" + json.dumps(v) + "\n\nThe output follows the schema.",
+)
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Chat model that answers without a network call, after `latency_ms`
+    (+ uniform `jitter_ms`, + `ms_per_1k_tokens` per ~1000 prompt tokens, a
+    stand-in for prompt processing time, + `tail_ms` with probability
+    `tail_prob`), failing with probability `error_rate`. Replies are shaped for the prompt in use: metadata
+    JSON for analysis, summary JSON for hybrid analysis, per-page JSON for
+    comparison, the question itself for the rewrite step, and the first
+    context sentence for QA. With probability `malformed_rate` a JSON reply
+    comes back garbled the way real models garble it (never the reply to an
+    OutputFixingParser prompt).
+    """
+    model_name: str = "stub"
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    ms_per_1k_tokens: float = 0.0
+    tail_ms: float = 0.0
+    tail_prob: float = 0.0
+    error_rate: float = 0.0
+    malformed_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _delay_seconds(self, prompt_chars: int = 0) -> float:
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        delay += self.ms_per_1k_tokens * prompt_chars / 4000.0
+        if self.tail_prob and random.random() < self.tail_prob:
+            delay += self.tail_ms
+        return delay / 1000.0
+
+    def _maybe_fail(self):
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError(f"{self.model_name}: simulated provider error")
+
+    def _json(self, value: Any, text: str) -> str:
+        if not self.malformed_rate or random.random() >= self.malformed_rate or _FIX_PROMPT_MARK in text:
+            return json.dumps(value)
+        return random.choice(_MALFORMATIONS)(value)
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        text = "\n".join(str(m.content) for m in messages)
+        last = str(messages[-1].content) if messages else ""
+        pages = sorted({int(p) for p in _PAGE_RE.findall(text)})
+        if "LateModifiedDate" in text:
+            return self._json({
+                "Summary": [line.strip() for line in text.splitlines() if line.strip()][-3:],
+                "Title": "Stub title", "Author": "Unknown", "DateCreated": "Unknown",
+                "LateModifiedDate": "Unknown", "Publisher": "Unknown", "Language": "English",
+                "PageCount": len(pages) or "Not Available", "SentimentTone": "Neutral",
+            }, text)
+        if "SentimentTone" in text:
+            return self._json({
+                "Summary": [line.strip() for line in text.splitlines() if line.strip()][-3:],
+                "SentimentTone": "Neutral",
+            }, text)
+        if "page wise comparison" in text or "ChangeFormat" in text:
+            return self._json([{"Page": str(p), "changes": "NO CHANGE"} for p in pages or [1]], text)
+        if "rewrite the query" in text:
+            return last
+        context = text.split("\n\n", 1)[1] if "\n\n" in text else text
+        sentence = context.strip().split(".")[0].strip()
+        return f"{sentence}." if sentence else "I don't know."
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        delay = self._delay_seconds(sum(len(str(m.content)) for m in messages))
+        if delay > 0:
+            time.sleep(delay)
+        self._maybe_fail()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        delay = self._delay_seconds(sum(len(str(m.content)) for m in messages))
+        if delay > 0:
+            await asyncio.sleep(delay)  # cancellable, like a real async client
+        self._maybe_fail()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
@@ -1,15 +1,30 @@
 from __future__ import annotations
+import os
 import re
 import uuid
+import hashlib
 from pathlib import Path
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import uuid
-from typing import Iterable, List
+from typing import Iterable, Iterator, List, NamedTuple, Set
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentPortalException
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+
+
+class UploadTooLargeError(ValueError):
+    """Raised while streaming when an upload exceeds MAX_UPLOAD_BYTES."""
+
+
+class SavedUpload(NamedTuple):
+    path: Path
+    name: str      # original client-side file name
+    sha256: str    # content hash, computed while streaming
+    size: int
 
 # ----------------------------- #
 # Helpers (file I/O + loading)  #
@@ -18,30 +33,90 @@ def generate_session_id(prefix: str = "session") -> str:
     ist = ZoneInfo("Asia/Kolkata")
     return f"{prefix}_{datetime.now(ist).strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
-def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path]:
-    """Save uploaded files (Streamlit-like) and return local paths."""
+def safe_filename(name: str) -> str:
+    """Filesystem-safe version of an uploaded file name (only alphanum, dash, underscore in the stem)."""
+    p = Path(name)
+    stem = re.sub(r'[^a-zA-Z0-9_\-]', '_', p.stem).lower() or "file"
+    return f"{stem}{p.suffix.lower()}"
+
+def unique_filename(name: str, taken: Set[str]) -> str:
+    """
+    safe_filename(name), suffixed _2, _3, ... while it collides with a name in `taken`
+    ("a b.pdf" and "a_b.pdf" in one request), then added to `taken`. The saved name is
+    the document id, so a collision would silently replace the other upload.
+    """
+    out = safe_filename(name)
+    stem, suffix = Path(out).stem, Path(out).suffix
+    n = 1
+    while out in taken:
+        n += 1
+        out = f"{stem}_{n}{suffix}"
+    if n > 1:
+        log.warning("Upload renamed to avoid a name collision", uploaded=name, saved_as=out)
+    taken.add(out)
+    return out
+
+def iter_upload_chunks(uploaded_file, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield an upload in fixed-size chunks (FastAPI adapter, Streamlit file or any file-like)."""
+    if hasattr(uploaded_file, "iter_chunks"):
+        yield from uploaded_file.iter_chunks(chunk_size)
+        return
+    if hasattr(uploaded_file, "read"):
+        if hasattr(uploaded_file, "seek"):
+            uploaded_file.seek(0)
+        while chunk := uploaded_file.read(chunk_size):
+            yield chunk
+        return
+    view = memoryview(uploaded_file.getbuffer())  # fallback: already in memory, avoid copying it again
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size].tobytes()
+
+def stream_upload_to_disk(uploaded_file, out_path: Path, *, max_bytes: int = MAX_UPLOAD_BYTES,
+                          chunk_size: int = UPLOAD_CHUNK_SIZE) -> SavedUpload:
+    """
+    Copy an upload to `out_path` chunk by chunk, hashing and enforcing the size
+    limit on the fly. Memory use is bounded by `chunk_size`, not the file size.
+    """
+    name = getattr(uploaded_file, "name", None) or out_path.name
+    digest = hashlib.sha256()
+    size = 0
+    tmp = out_path.with_name(out_path.name + ".part")
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in iter_upload_chunks(uploaded_file, chunk_size):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLargeError(f"Upload '{name}' exceeds the {max_bytes / (1024 * 1024):g} MB limit")
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(tmp, out_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return SavedUpload(path=out_path, name=name, sha256=digest.hexdigest(), size=size)
+
+def save_uploads(uploaded_files: Iterable, target_dir: Path) -> List[SavedUpload]:
+    """Stream uploaded files to `target_dir` and return their paths, hashes and sizes."""
     try:
         target_dir.mkdir(parents=True, exist_ok=True)
-        saved: List[Path] = []
+        saved: List[SavedUpload] = []
+        taken: Set[str] = set()
         for uf in uploaded_files:
             name = getattr(uf, "name", "file")
             ext = Path(name).suffix.lower()
             if ext not in SUPPORTED_EXTENSIONS:
                 log.warning("Unsupported file skipped", filename=name)
                 continue
-            # Clean file name (only alphanum, dash, underscore)
-            safe_name = re.sub(r'[^a-zA-Z0-9_\-]', '_', Path(name).stem).lower()
-            fname = f"{safe_name}_{uuid.uuid4().hex[:6]}{ext}"
-            fname = f"{uuid.uuid4().hex[:8]}{ext}"
-            out = target_dir / fname
-            with open(out, "wb") as f:
-                if hasattr(uf, "read"):
-                    f.write(uf.read())
-                else:
-                    f.write(uf.getbuffer())  # fallback
-            saved.append(out)
-            log.info("File saved for ingestion", uploaded=name, saved_as=str(out))
+            # stable name: re-uploading a file replaces it (and its indexed version) in the session
+            out = target_dir / unique_filename(name, taken)
+            result = stream_upload_to_disk(uf, out)
+            saved.append(result)
+            log.info("File saved for ingestion", uploaded=name, saved_as=str(out), sha256=result.sha256, size=result.size)
         return saved
     except Exception as e:
         log.error("Failed to save uploaded files", error=str(e), dir=str(target_dir))
-        raise DocumentPortalException("Failed to save uploaded files", e) from e
\ No newline at end of file
+        raise DocumentPortalException("Failed to save uploaded files", e) from e
+
+def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path]:
+    """Save uploaded files (Streamlit-like) and return local paths."""
+    return [u.path for u in save_uploads(uploaded_files, target_dir)]
@@ -0,0 +1,84 @@
+from __future__ import annotations
+import re
+from collections import Counter
+from typing import Dict, FrozenSet
+
+# Deterministic, dependency-free language guess for document metadata: the
+# writing system decides for non-Latin scripts, stopword hit rates for Latin ones.
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+_STOPWORDS: Dict[str, FrozenSet[str]] = {name: frozenset(words.split()) for name, words in {
+    "English": "the and of to in is that for it with as was on are be by this from at or an have not which "
+               "were has their its we will can been would should",
+    "Spanish": "el la los las que y en del se por un una para con no es al lo como más pero sus le ya o este "
+               "entre cuando muy sin sobre también",
+    "French": "le la les et des en un une du que est pour qui dans par sur pas au avec ce il sont ne se plus "
+              "ou mais nous vous leur cette aux été",
+    "German": "der die das und in den von zu mit sich des auf für ist im dem nicht ein eine als auch es an "
+              "werden aus er hat dass sie nach wird bei",
+    "Italian": "il di che è e la per un non in una sono mi ho lo ma ha le si gli con questo della del nel "
+               "anche come alla più dei",
+    "Portuguese": "de a o que e do da em um para é com não uma os no se na por mais as dos como mas ao ele "
+                  "das à seu sua ou quando",
+    "Dutch": "de het een en van in is dat op te zijn met voor niet aan er die ook als bij maar om dan zou "
+             "of wat naar worden wordt",
+}.items()}
+
+# (first, last) code points -> language; checked in order, so kana wins over shared Han
+_SCRIPTS = (
+    ((0x3040, 0x30FF), "Japanese"),
+    ((0xAC00, 0xD7AF), "Korean"),
+    ((0x4E00, 0x9FFF), "Chinese"),
+    ((0x0400, 0x04FF), "Russian"),
+    ((0x0600, 0x06FF), "Arabic"),
+    ((0x0590, 0x05FF), "Hebrew"),
+    ((0x0900, 0x097F), "Hindi"),
+    ((0x0370, 0x03FF), "Greek"),
+    ((0x0E00, 0x0E7F), "Thai"),
+)
+
+UNKNOWN = "Unknown"
+
+
+def _script_language(text: str) -> str | None:
+    counts: Counter = Counter()
+    letters = 0
+    for ch in text:
+        if not ch.isalpha():
+            continue
+        letters += 1
+        code = ord(ch)
+        if code < 0x0370:
+            continue
+        for (lo, hi), name in _SCRIPTS:
+            if lo <= code <= hi:
+                counts[name] += 1
+                break
+    if not letters or not counts:
+        return None
+    if counts["Japanese"] and counts["Japanese"] + counts["Chinese"] >= 0.3 * letters:
+        return "Japanese"
+    name, hits = counts.most_common(1)[0]
+    return name if hits >= 0.3 * letters else None
+
+
+def detect_language(text: str, max_chars: int = 20000, min_words: int = 20) -> str:
+    """
+    English name of the document's dominant language ("English", "German",
+    ...) or "Unknown" when the sample is too short or too ambiguous.
+    Only the first `max_chars` characters are inspected.
+    """
+    sample = text[:max_chars]
+    by_script = _script_language(sample)
+    if by_script:
+        return by_script
+    words = [w.lower() for w in _WORD_RE.findall(sample)]
+    if len(words) < min_words:
+        return UNKNOWN
+    scores = {name: sum(1 for w in words if w in stop) for name, stop in _STOPWORDS.items()}
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, top), (_, runner_up) = ranked[0], ranked[1]
+    if top < 0.05 * len(words) or top < 1.2 * runner_up:
+        return UNKNOWN
+    return best
@@ -0,0 +1,189 @@
+from __future__ import annotations
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.boilerplate import (BOILERPLATE_MARGIN, BOILERPLATE_STRIP_ENABLED, BOILERPLATE_CHARS, BOILERPLATE_LINES,
+                               find_boilerplate, line_key)
+
+_BOLD = 16  # PyMuPDF span flag
+
+
+class LayoutBlock(NamedTuple):
+    """A text block of a page: its text as it appears in the page text, at offset `start`."""
+    page: int
+    start: int
+    text: str
+    size: float   # dominant font size (most characters)
+    bold: bool    # every non-blank span bold
+
+
+def _line(spans: List[Dict[str, Any]]) -> Tuple[str, Counter, bool]:
+    sizes: Counter = Counter()
+    for s in spans:
+        sizes[round(s["size"] * 2) / 2] += len(s["text"].strip())
+    bold = all(s["flags"] & _BOLD for s in spans if s["text"].strip())
+    return "".join(s["text"] for s in spans), sizes, bold
+
+
+def extract_pdf_layout(path: Path) -> List[List[LayoutBlock]]:
+    """
+    Text blocks of every page with font information (PyMuPDF dict output),
+    repeated headers/footers removed as in extract_pdf_pages, so the joined
+    block texts of a page are that page's text and `start` offsets index it.
+    """
+    import fitz  # PyMuPDF; deferred so API workers boot without it
+    raw: List[List[Tuple[float, float, List[Tuple[str, Counter, bool]]]]] = []
+    with fitz.open(path) as doc:
+        if doc.is_encrypted:
+            raise ValueError(f"PDF is encrypted: {Path(path).name}")
+        for i in range(doc.page_count):
+            page = doc.load_page(i)
+            height = page.rect.height or 1.0
+            raw.append([(b["bbox"][1] / height, b["bbox"][3] / height, [_line(l["spans"]) for l in b["lines"]])
+                        for b in page.get_text("dict")["blocks"] if b["type"] == 0 and b["lines"]])
+
+    boilerplate = set()
+    if BOILERPLATE_STRIP_ENABLED:
+        boilerplate = find_boilerplate([[(top, bottom, "\n".join(l[0] for l in lines)) for top, bottom, lines in blocks]
+                                        for blocks in raw])
+    pages: List[List[LayoutBlock]] = []
+    removed = [0, 0]
+    for page_no, blocks in enumerate(raw):
+        out, offset = [], 0
+        for top, bottom, lines in blocks:
+            if boilerplate:
+                kept = [l for l in lines if line_key((top, bottom, ""), l[0], BOILERPLATE_MARGIN) not in boilerplate]
+                removed[0] += len(lines) - len(kept)
+                removed[1] += sum(len(l[0]) for l in lines) - sum(len(l[0]) for l in kept)
+                if not any(l[0].strip() for l in kept):
+                    continue
+                lines = kept
+            sizes: Counter = sum((l[1] for l in lines), Counter())
+            text = "\n".join(l[0] for l in lines) + "\n"
+            out.append(LayoutBlock(page_no, offset, text, sizes.most_common(1)[0][0] if sizes else 0.0,
+                                   all(l[2] for l in lines if l[0].strip())))
+            offset += len(text)
+        pages.append(out)
+    if removed[0]:
+        BOILERPLATE_LINES.inc(removed[0])
+        BOILERPLATE_CHARS.inc(removed[1])
+    return pages
+
+
+class LayoutChunker:
+    """
+    Section-coherent chunks from PDF layout. Blocks set in a font clearly
+    larger than the body text (or bold at body size) and short enough to be
+    a title are headings; their size ranks give the heading level. Chunks
+    never cross a heading and are packed from whole blocks (paragraphs,
+    table cells) up to `chunk_size`. When a section continues into the next
+    chunk, that chunk repeats the trailing whole blocks of the previous one
+    that fit in `chunk_overlap` characters. A block longer than `chunk_size`
+    is cut by the recursive splitter with the same overlap.
+
+    Chunk metadata adds section_path ("Title > Section > Subsection"),
+    page/start_index and end_page/end_index (character offsets into the page
+    texts extract_pdf_pages returns).
+    """
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 0, heading_ratio: float = 1.15,
+                 max_heading_chars: int = 120):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.heading_ratio = heading_ratio
+        self.max_heading_chars = max_heading_chars
+        self._oversized = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                         add_start_index=True)
+
+    def split_pdf(self, path: Path, metadata: Optional[Dict[str, Any]] = None) -> List[Document]:
+        pages = extract_pdf_layout(Path(path))
+        return self.split_layout(pages, {"source": str(path), "total_pages": len(pages), **(metadata or {})})
+
+    def _heading_levels(self, pages: List[List[LayoutBlock]]) -> Tuple[float, Dict[float, int]]:
+        """Body font size (most characters) and the level of each larger, heading-only font size."""
+        chars: Counter = Counter()
+        for blocks in pages:
+            for b in blocks:
+                chars[b.size] += len(b.text)
+        body = chars.most_common(1)[0][0] if chars else 0.0
+        sizes = sorted({b.size for blocks in pages for b in blocks
+                        if b.size >= body * self.heading_ratio and self._title_like(b)}, reverse=True)
+        return body, {size: level for level, size in enumerate(sizes, 1)}
+
+    def _title_like(self, block: LayoutBlock) -> bool:
+        text = block.text.strip()
+        return (0 < len(text) <= self.max_heading_chars and text.count("\n") < 3
+                and any(c.isalpha() for c in text))
+
+    def split_layout(self, pages: List[List[LayoutBlock]], metadata: Dict[str, Any]) -> List[Document]:
+        body, levels = self._heading_levels(pages)
+        bold_level = len(levels) + 1
+        chunks: List[Document] = []
+        section: List[Tuple[int, str]] = []
+        parts: List[Tuple[LayoutBlock, str]] = []  # (block, its text without the trailing newline)
+        carried = 0  # leading parts repeated from the previous chunk as overlap
+        size = 0
+        only_headings = True  # nothing but headings since the carried parts
+
+        def flush(room: int = 0):
+            """Emit the packed blocks; keep as overlap the trailing ones that fit in chunk_overlap and `room`."""
+            nonlocal parts, carried, size, only_headings
+            if len(parts) > carried:
+                first, last = parts[0][0], parts[-1][0]
+                chunks.append(Document(page_content="\n".join(text for _, text in parts), metadata={
+                    **metadata, "page": first.page, "start_index": first.start,
+                    "end_page": last.page, "end_index": last.start + len(parts[-1][1]),
+                    "section_path": " > ".join(title for _, title in section)}))
+            carry: List[Tuple[LayoutBlock, str]] = []
+            budget = min(self.chunk_overlap, room)
+            for part in reversed(parts[1:]):  # never the whole chunk again
+                if len(part[1]) + 1 > budget:
+                    break
+                carry.insert(0, part)
+                budget -= len(part[1]) + 1
+            parts, carried, size, only_headings = carry, len(carry), sum(len(t) + 1 for _, t in carry), True
+
+        for blocks in pages:
+            for block in blocks:
+                text = block.text.rstrip("\n")
+                if not text.strip():
+                    continue
+                level = None
+                if self._title_like(block):
+                    if block.size in levels:
+                        level = levels[block.size]
+                    elif block.bold and body and block.size >= body:
+                        level = bold_level
+                if level is not None:
+                    if not only_headings:
+                        flush()
+                    elif carried:  # overlap never runs into a new section
+                        parts, size = parts[carried:], size - sum(len(t) + 1 for _, t in parts[:carried])
+                        carried = 0
+                    while section and section[-1][0] >= level:
+                        section.pop()
+                    section.append((level, " ".join(text.split())))
+                elif len(text) > self.chunk_size:
+                    # headings (not carried overlap) are kept with the first piece of their section
+                    headings = parts[carried:] if only_headings else []
+                    if not only_headings:
+                        flush()
+                    for i, piece in enumerate(self._oversized.create_documents([text])):
+                        start = block.start + piece.metadata["start_index"]
+                        lead = headings if i == 0 else []
+                        chunks.append(Document(
+                            page_content="\n".join([t for _, t in lead] + [piece.page_content]),
+                            metadata={**metadata, "page": lead[0][0].page if lead else block.page,
+                                      "start_index": lead[0][0].start if lead else start, "end_page": block.page,
+                                      "end_index": start + len(piece.page_content),
+                                      "section_path": " > ".join(title for _, title in section)}))
+                    parts, carried, size, only_headings = [], 0, 0, True
+                    continue
+                elif size + len(text) + 1 > self.chunk_size and not only_headings:
+                    flush(room=self.chunk_size - len(text) - 1)  # same section continues: overlap allowed
+                parts.append((block, text))
+                size += len(text) + 1
+                only_headings = only_headings and level is not None
+        flush()
+        return chunks
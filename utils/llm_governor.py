@@ -0,0 +1,289 @@
+from __future__ import annotations
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from logger import GLOBAL_LOGGER as log
+from utils.metrics import REGISTRY
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("docportal_llm_queue_wait_seconds",
+                                        "Time LLM calls waited for the provider budget", ("provider", "priority"))
+QUEUE_DEPTH = REGISTRY.gauge("docportal_llm_queue_depth", "LLM calls waiting for the provider budget", ("provider",))
+
+# Lower runs first; unknown classes count as "batch"
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+_PRIORITY: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_priority", default=None)
+_TENANT: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_tenant", default=None)
+
+
+@contextmanager
+def llm_context(priority: Optional[str] = None, tenant: Optional[str] = None) -> Iterator[None]:
+    """Priority class and tenant for every LLM call made inside the block (threads and tasks inherit it)."""
+    tokens = [(_PRIORITY, _PRIORITY.set(priority)) if priority else None,
+              (_TENANT, _TENANT.set(tenant)) if tenant else None]
+    try:
+        yield
+    finally:
+        for var, token in (t for t in tokens if t):
+            var.reset(token)
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously; the level may dip below zero after usage corrections."""
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        self.level = max(-self.capacity, min(self.capacity, self.level - delta))
+
+
+class _Waiter:
+    __slots__ = ("priority", "tenant", "tokens", "tag", "seq", "enqueued", "granted", "event", "loop", "future")
+
+    def __init__(self, priority: int, tenant: str, tokens: int, seq: int):
+        self.priority, self.tenant, self.tokens, self.seq = priority, tenant, tokens, seq
+        self.tag = 0.0
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+
+    def wake(self):
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(lambda f=self.future: f.done() or f.set_result(None))  # type: ignore
+        elif self.event is not None:
+            self.event.set()
+
+
+class ProviderBudget:
+    """
+    Requests-per-minute and tokens-per-minute buckets for one provider, with
+    one wait queue in front of them. The queue is ordered by priority class
+    (a waiter older than `starvation_s` is promoted to the top class), then
+    by start-time fair queuing per tenant weighted by token cost, so one
+    tenant's burst cannot crowd out the others of the same class. Only the
+    head may take budget: a large request is never overtaken indefinitely.
+    """
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 starvation_s: float = 30.0):
+        self.name = name
+        self.buckets: Dict[str, TokenBucket] = {}
+        if rpm:
+            self.buckets["requests"] = TokenBucket(rpm)
+        if tpm:
+            self.buckets["tokens"] = TokenBucket(tpm)
+        self.starvation_s = starvation_s
+        self.queue: List[_Waiter] = []
+        self._virtual: Dict[int, float] = {}
+        self._finish: Dict[Tuple[int, str], float] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _cost(self, waiter: _Waiter) -> Dict[str, float]:
+        return {"requests": 1, "tokens": waiter.tokens}
+
+    def _wait_time(self, waiter: _Waiter, now: float) -> float:
+        cost = self._cost(waiter)
+        return max((bucket.wait_time(cost[kind], now) for kind, bucket in self.buckets.items()), default=0.0)
+
+    def _grant(self, waiter: _Waiter):
+        cost = self._cost(waiter)
+        for kind, bucket in self.buckets.items():
+            bucket.take(cost[kind])
+        waiter.granted = True
+        self._virtual[waiter.priority] = max(self._virtual.get(waiter.priority, 0.0), waiter.tag)
+
+    def _head(self, now: float) -> _Waiter:
+        return min(self.queue, key=lambda w: (0 if now - w.enqueued >= self.starvation_s else w.priority,
+                                              w.tag, w.seq))
+
+    def _dispatch(self) -> Optional[float]:
+        """Grant queue heads while the budget allows; seconds until the next head fits, None if the queue is empty."""
+        with self._lock:
+            now = time.monotonic()
+            while self.queue:
+                head = self._head(now)
+                wait = self._wait_time(head, now)
+                if wait > 0:
+                    return wait
+                self.queue.remove(head)
+                self._grant(head)
+                head.wake()
+            QUEUE_DEPTH.set(0, provider=self.name)
+            self._virtual.clear()  # nobody waiting: fairness history no longer matters
+            self._finish.clear()
+            return None
+
+    def _enqueue(self, tokens: int, priority: int, tenant: str) -> _Waiter:
+        waiter = _Waiter(priority, tenant, tokens, next(self._seq))
+        with self._lock:
+            if not self.queue and self._wait_time(waiter, waiter.enqueued) == 0:
+                self._grant(waiter)  # fast path: nobody waiting and budget available
+                return waiter
+            key = (priority, tenant)
+            waiter.tag = max(self._virtual.get(priority, 0.0), self._finish.get(key, 0.0))
+            self._finish[key] = waiter.tag + max(1, tokens)
+            self.queue.append(waiter)
+            QUEUE_DEPTH.set(len(self.queue), provider=self.name)
+        return waiter
+
+    def acquire(self, tokens: int, priority: int, tenant: str) -> float:
+        """Block until the call may start; returns the seconds waited."""
+        waiter = self._enqueue(tokens, priority, tenant)
+        if not waiter.granted:
+            waiter.event = threading.Event()
+            while not waiter.granted:
+                wait = self._dispatch()
+                if waiter.granted:
+                    break
+                waiter.event.wait(timeout=wait)
+        return time.monotonic() - waiter.enqueued
+
+    async def aacquire(self, tokens: int, priority: int, tenant: str) -> float:
+        """Async acquire; a cancelled waiter leaves the queue (or returns its budget if already granted)."""
+        waiter = self._enqueue(tokens, priority, tenant)
+        if waiter.granted:
+            return 0.0
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        try:
+            while not waiter.granted:
+                wait = self._dispatch()
+                if waiter.granted:
+                    break
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self.queue:
+                    self.queue.remove(waiter)
+                    QUEUE_DEPTH.set(len(self.queue), provider=self.name)
+            if waiter.granted:
+                self.settle(waiter.tokens, 0, requests=-1)
+            raise
+        return time.monotonic() - waiter.enqueued
+
+    def settle(self, estimated: int, actual: int, requests: int = 0):
+        """Correct the token bucket once the real usage is known (and optionally hand back requests)."""
+        with self._lock:
+            if "tokens" in self.buckets:
+                self.buckets["tokens"].adjust(actual - estimated)
+            if requests and "requests" in self.buckets:
+                self.buckets["requests"].adjust(requests)
+        self._dispatch()
+
+
+class LLMGovernor:
+    """Process-wide registry of provider budgets; providers without configured limits are not queued."""
+    def __init__(self, providers: Optional[Dict[str, Dict[str, Any]]] = None, completion_tokens: int = 512,
+                 default_priority: str = "batch", starvation_s: float = 30.0):
+        self.completion_tokens = completion_tokens
+        self.default_priority = default_priority
+        self.budgets = {name: ProviderBudget(name, limits.get("rpm"), limits.get("tpm"), starvation_s)
+                        for name, limits in (providers or {}).items() if limits and (limits.get("rpm") or limits.get("tpm"))}
+
+    @classmethod
+    def from_config(cls, block: Optional[Dict[str, Any]]) -> "LLMGovernor":
+        block = block or {}
+        return cls(providers=block.get("providers") or {},
+                   completion_tokens=int(block.get("completion_tokens", 512)),
+                   default_priority=str(block.get("default_priority", "batch")),
+                   starvation_s=float(block.get("starvation_s", 30)))
+
+    def request_context(self) -> Tuple[str, int, str]:
+        name = _PRIORITY.get() or self.default_priority
+        return name, PRIORITIES.get(name, PRIORITIES["batch"]), _TENANT.get() or "default"
+
+
+_GOVERNOR: Optional[LLMGovernor] = None
+_GOVERNOR_LOCK = threading.Lock()
+
+
+def get_governor(block: Optional[Dict[str, Any]] = None) -> LLMGovernor:
+    """The process-wide governor, built from the first config block it is asked with."""
+    global _GOVERNOR
+    with _GOVERNOR_LOCK:
+        if _GOVERNOR is None:
+            _GOVERNOR = LLMGovernor.from_config(block)
+            log.info("LLM governor configured", providers=list(_GOVERNOR.budgets))
+    return _GOVERNOR
+
+
+def _estimate_tokens(messages: List[BaseMessage]) -> int:
+    return sum(len(str(m.content)) for m in messages) // 4 + 1
+
+
+def _usage(message: BaseMessage) -> Optional[int]:
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class GovernedChatModel(BaseChatModel):
+    """
+    A provider client whose every call first takes budget from the governor
+    (`budget` names the provider's limits). The estimate (prompt tokens +
+    completion_tokens) is corrected with the provider's reported usage.
+    """
+    inner: Any
+    budget: str
+    governor: Any
+    model_name: str = "governed"
+
+    @property
+    def _llm_type(self) -> str:
+        return "governed"
+
+    def _book(self, messages: List[BaseMessage]) -> Tuple[Optional[ProviderBudget], int, str, int, str]:
+        budget = self.governor.budgets.get(self.budget)
+        priority_name, priority, tenant = self.governor.request_context()
+        return budget, _estimate_tokens(messages) + self.governor.completion_tokens, priority_name, priority, tenant
+
+    def _settle(self, budget: Optional[ProviderBudget], estimated: int, message: BaseMessage):
+        actual = _usage(message)
+        if budget is not None and actual is not None:
+            budget.settle(estimated, actual)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        budget, tokens, priority_name, priority, tenant = self._book(messages)
+        if budget is not None:
+            waited = budget.acquire(tokens, priority, tenant)
+            QUEUE_WAIT_SECONDS.observe(waited, provider=self.budget, priority=priority_name)
+        message = self.inner.invoke(messages, stop=stop, **kwargs)
+        self._settle(budget, tokens, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        budget, tokens, priority_name, priority, tenant = self._book(messages)
+        if budget is not None:
+            waited = await budget.aacquire(tokens, priority, tenant)
+            QUEUE_WAIT_SECONDS.observe(waited, provider=self.budget, priority=priority_name)
+        message = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+        self._settle(budget, tokens, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,222 @@
+from __future__ import annotations
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+from logger import GLOBAL_LOGGER as log
+from utils.metrics import REGISTRY
+
+LLM_CALLS = REGISTRY.counter("docportal_llm_calls_total", "LLM provider calls by outcome",
+                             ("provider", "outcome"))
+LLM_PROVIDER_SECONDS = REGISTRY.histogram("docportal_llm_provider_seconds",
+                                          "Latency of successful LLM provider calls", ("provider",))
+LLM_HEDGES = REGISTRY.counter("docportal_llm_hedges_total",
+                              "Backup requests sent because the first provider passed its p95", ("provider",))
+LLM_FAILOVERS = REGISTRY.counter("docportal_llm_failovers_total",
+                                 "Requests moved to another provider after an error or timeout", ("provider",))
+
+
+class ProviderHealth:
+    """
+    Rolling latency window (successful calls) and a consecutive-failure
+    circuit breaker for one provider: after `failure_threshold` failures in a
+    row the provider is tried last for `cooldown_s`.
+    """
+    def __init__(self, window: int = 200, failure_threshold: int = 3, cooldown_s: float = 30.0):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown_s
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def p95(self, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95(1)
+        return {"available": self.available, "successes": self.successes, "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None}
+
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Background event loop that runs the async work of synchronous callers (router races, cancellable calls)."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-router", daemon=True).start()
+            _LOOP = loop
+    return _LOOP
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model over several providers (same prompt, interchangeable answers).
+
+    Providers are tried in configured order, healthy ones first. A call that
+    errors or runs past `timeout_s` fails over to the next provider. With
+    `hedge` on, a backup request goes to the next provider once the first has
+    been outstanding for its observed p95 (`hedge_after_s` until `min_samples`
+    latencies are known). The first successful response wins and every other
+    in-flight request is cancelled.
+
+    Sync calls run the race on a background event loop; cancellation is real
+    for providers with native async clients (ChatOpenAI, ChatGroq), while a
+    sync-only provider's thread finishes on its own and its result is dropped.
+    """
+    providers: List[Any]
+    names: List[str]
+    model_name: str = "router"
+    hedge: bool = True
+    hedge_after_s: float = 1.5
+    min_samples: int = 20
+    timeout_s: float = 30.0
+    failure_threshold: int = 3
+    cooldown_s: float = 30.0
+    _health: Dict[str, ProviderHealth] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        if len(self.providers) != len(self.names) or not self.providers:
+            raise ValueError("HedgedChatModel needs one name per provider and at least one provider")
+        self._health = {name: ProviderHealth(failure_threshold=self.failure_threshold, cooldown_s=self.cooldown_s)
+                        for name in self.names}
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged-router"
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        return {name: h.snapshot() for name, h in self._health.items()}
+
+    def _order(self) -> List[int]:
+        # open circuits are a last resort, not skipped: a request never fails just because all are unhealthy
+        up = [i for i, name in enumerate(self.names) if self._health[name].available]
+        return up + [i for i in range(len(self.names)) if i not in up]
+
+    def _hedge_delay(self, name: str) -> float:
+        p95 = self._health[name].p95(self.min_samples)
+        return min(p95 if p95 is not None else self.hedge_after_s, self.timeout_s)
+
+    async def _race(self, messages: List[BaseMessage], stop: Optional[List[str]],
+                    kwargs: Dict[str, Any]) -> Tuple[BaseMessage, str]:
+        order = self._order()
+        pending: Dict[asyncio.Future, Tuple[str, float]] = {}
+        last_error: Optional[BaseException] = None
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            i = order[launched]
+            launched += 1
+            task = asyncio.ensure_future(self.providers[i].ainvoke(messages, stop=stop, **kwargs))
+            pending[task] = (self.names[i], time.monotonic())
+
+        launch()
+        try:
+            while pending:
+                wake = min(started + self.timeout_s for _, started in pending.values())
+                hedge_at = None
+                if self.hedge and len(pending) == 1 and launched < len(order):
+                    name, started = next(iter(pending.values()))
+                    hedge_at = started + self._hedge_delay(name)
+                    wake = min(wake, hedge_at)
+                done, _ = await asyncio.wait(list(pending), timeout=max(0.0, wake - time.monotonic()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name, started = pending.pop(task)
+                    if task.cancelled():
+                        continue
+                    error = task.exception()
+                    if error is None:
+                        elapsed = time.monotonic() - started
+                        self._health[name].record_success(elapsed)
+                        LLM_CALLS.inc(provider=name, outcome="ok")
+                        LLM_PROVIDER_SECONDS.observe(elapsed, provider=name)
+                        return task.result(), name
+                    last_error = error
+                    self._health[name].record_failure()
+                    LLM_CALLS.inc(provider=name, outcome="error")
+                    log.warning("LLM provider failed", provider=name, error=str(error))
+
+                now = time.monotonic()
+                for task, (name, started) in list(pending.items()):
+                    if now >= started + self.timeout_s:
+                        task.cancel()
+                        pending.pop(task)
+                        last_error = TimeoutError(f"LLM provider {name} timed out after {self.timeout_s}s")
+                        self._health[name].record_failure()
+                        LLM_CALLS.inc(provider=name, outcome="timeout")
+                        log.warning("LLM provider timed out", provider=name, timeout_s=self.timeout_s)
+
+                if launched < len(order):
+                    if not pending:
+                        LLM_FAILOVERS.inc(provider=self.names[order[launched]])
+                        launch()
+                    elif hedge_at is not None and now >= hedge_at:
+                        LLM_HEDGES.inc(provider=self.names[order[launched]])
+                        launch()
+            raise last_error or RuntimeError("No LLM provider available")
+        finally:
+            for task, (name, _) in pending.items():  # losers and, on outer cancellation, everything
+                task.cancel()
+                LLM_CALLS.inc(provider=name, outcome="cancelled")
+
+    @staticmethod
+    def _result(message: BaseMessage, provider: str) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"provider": provider})
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return self._result(*await self._race(messages, stop, kwargs))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        context = contextvars.copy_context()  # trace id, LLM priority/tenant, ... follow the call onto the loop
+
+        async def race():
+            for var, value in context.items():
+                var.set(value)
+            return await self._race(messages, stop, kwargs)
+
+        future = asyncio.run_coroutine_threadsafe(race(), background_loop())
+        try:
+            return self._result(*future.result())
+        except BaseException:
+            future.cancel()
+            raise
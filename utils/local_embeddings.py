@@ -0,0 +1,147 @@
+from __future__ import annotations
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+TOKEN_PATTERN = r"\w\w+"
+
+
+class LocalHashingEmbeddings(Embeddings):
+    """
+    CPU-only embeddings with no network and no downloaded weights.
+
+    Texts are turned into signed, hashed word n-gram counts (`n_features`
+    buckets, crc32 so vectors are stable across processes), with sublinear tf.
+    Tokens are `token_pattern` matches in the lower-cased text; the fake
+    provider uses r"\w+" unigrams, which keeps one-character codes.
+    If a projection file from `fit_projection()` is configured, counts are
+    IDF-weighted and projected onto its SVD components (LSA); otherwise the
+    hashed vector itself is the embedding. Rows are L2-normalised, so FAISS
+    L2 search ranks by cosine similarity.
+
+    Encoding is done `batch_size` texts at a time with NumPy. Instances hold no
+    mutable state after construction apart from the token cache, so one
+    instance can serve concurrent requests.
+    """
+    def __init__(self, n_features: int = 4096, ngram_range: Tuple[int, int] = (1, 2), batch_size: int = 256,
+                 projection_path: Optional[str | Path] = None, cache_size: int = 200_000,
+                 token_pattern: str = TOKEN_PATTERN):
+        self.n_features = int(n_features)
+        self._token_re = re.compile(token_pattern, re.UNICODE)
+        self.ngram_range = (int(ngram_range[0]), int(ngram_range[1]))
+        self.batch_size = int(batch_size)
+        self.cache_size = cache_size
+        self._cache: Dict[str, Tuple[int, float]] = {}
+        self._cache_lock = threading.Lock()
+        self.idf: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        if projection_path:
+            self._load_projection(Path(projection_path))
+
+    @classmethod
+    def from_config(cls, block: Dict) -> "LocalHashingEmbeddings":
+        return cls(
+            n_features=block.get("n_features", 4096),
+            ngram_range=tuple(block.get("ngram_range", (1, 2))),  # type: ignore[arg-type]
+            batch_size=block.get("batch_size", 256),
+            projection_path=block.get("projection_path"),
+            token_pattern=block.get("token_pattern", TOKEN_PATTERN),
+        )
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[1] if self.components is not None else self.n_features
+
+    def _load_projection(self, path: Path):
+        with np.load(path) as data:
+            if int(data["n_features"]) != self.n_features or tuple(data["ngram_range"]) != self.ngram_range:
+                raise ValueError(f"Projection {path} was fitted with different hashing settings")
+            self.idf = data["idf"].astype(np.float32)
+            self.components = data["components"].astype(np.float32)
+
+    # ---------- hashing ----------
+    def _features(self, text: str) -> Iterable[str]:
+        tokens = self._token_re.findall(text.lower())
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            if n == 1:
+                yield from tokens
+            else:
+                for i in range(len(tokens) - n + 1):
+                    yield " ".join(tokens[i:i + n])
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        hit = self._cache.get(feature)
+        if hit is not None:
+            return hit
+        h = zlib.crc32(feature.encode("utf-8"))
+        hit = (h % self.n_features, 1.0 if h & 0x80000000 else -1.0)
+        if len(self._cache) < self.cache_size:
+            with self._cache_lock:
+                self._cache[feature] = hit
+        return hit
+
+    def _counts(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        for r, text in enumerate(texts):
+            for feature in self._features(text):
+                idx, sign = self._bucket(feature)
+                rows.append(r)
+                cols.append(idx)
+                vals.append(sign)
+        flat = np.asarray(rows, dtype=np.int64) * self.n_features + np.asarray(cols, dtype=np.int64)
+        counts = np.bincount(flat, weights=np.asarray(vals, dtype=np.float64),
+                             minlength=len(texts) * self.n_features)
+        counts = counts.astype(np.float32).reshape(len(texts), self.n_features)
+        return np.sign(counts) * np.log1p(np.abs(counts))  # sublinear tf, sign kept
+
+    def _encode(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            x = self._counts(texts[start:start + self.batch_size])
+            if self.components is not None:
+                x = (x * self.idf) @ self.components
+            norms = np.linalg.norm(x, axis=1, keepdims=True)
+            out[start:start + len(x)] = x / np.where(norms == 0, 1.0, norms)
+        return out
+
+    # ---------- Embeddings API ----------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def fit_projection(texts: Sequence[str], out_path: str | Path, dim: int = 256, n_features: int = 4096,
+                   ngram_range: Tuple[int, int] = (1, 2), sample: int = 20_000, seed: int = 0) -> Path:
+    """
+    Fit IDF weights and an SVD projection (LSA) on a sample of `texts` and save
+    them to `out_path` (.npz) for `LocalHashingEmbeddings(projection_path=...)`.
+    """
+    rng = np.random.default_rng(seed)
+    texts = list(texts)
+    if len(texts) > sample:
+        texts = [texts[i] for i in rng.choice(len(texts), size=sample, replace=False)]
+    enc = LocalHashingEmbeddings(n_features=n_features, ngram_range=ngram_range)
+    x = enc._counts(texts)
+    df = np.count_nonzero(x, axis=0)
+    idf = (np.log((1 + len(texts)) / (1 + df)) + 1.0).astype(np.float32)
+    x *= idf
+    # randomized range finder + SVD of the small projected matrix
+    k = min(dim, min(x.shape) - 1) if min(x.shape) > 1 else 1
+    omega = rng.standard_normal((x.shape[1], k + 10)).astype(np.float32)
+    q, _ = np.linalg.qr(x.T @ (x @ omega))
+    _, _, vt = np.linalg.svd(x @ q, full_matrices=False)
+    components = (q @ vt.T)[:, :k].astype(np.float32)
+    out_path = Path(out_path).with_suffix(".npz")  # np.savez would add it anyway
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(out_path, idf=idf, components=components,
+             n_features=np.int64(n_features), ngram_range=np.asarray(ngram_range))
+    return out_path
@@ -0,0 +1,236 @@
+from __future__ import annotations
+import functools
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import structlog
+
+# Off -> span()/timed() are no-ops and /metrics is empty.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Seconds; the long tail is there for LLM calls and whole-document ingestion.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _fmt(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return super().render() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        self._observe(self._key(labels), value)
+
+    def _observe(self, key: LabelValues, value: float):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[idx] += 1
+            row[-1] += value
+
+    def snapshot(self, **labels: str) -> Dict[str, float]:
+        """count/sum for one label set (for /admin style JSON views)."""
+        row = self._values.get(self._key(labels))
+        if row is None:
+            return {"count": 0, "sum": 0.0}
+        return {"count": sum(row[:-1]), "sum": row[-1]}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = super().render()
+        for key, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(row[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics rendered in the Prometheus text exposition format."""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("docportal_stage_seconds", "Latency of pipeline stages", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("docportal_stage_errors_total", "Pipeline stages that raised", ("stage",))
+HTTP_SECONDS = REGISTRY.histogram("docportal_http_request_seconds", "HTTP request latency",
+                                  ("method", "route", "status"))
+
+
+# ---------- spans ----------
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """Times one stage into docportal_stage_seconds{stage=...}; counts it as an error if the block raises."""
+    __slots__ = ("key", "start", "seconds")
+
+    def __init__(self, stage: str):
+        self.key = (stage,)
+        self.start = 0.0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        STAGE_SECONDS._observe(self.key, self.seconds)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.key[0])
+        return False
+
+
+def span(stage: str):
+    """`with span("chat.retrieve"): ...` -- a shared no-op when metrics are disabled."""
+    return Span(stage) if METRICS_ENABLED else _NOOP
+
+
+def timed(stage: str) -> Callable:
+    """Decorator form of span(); leaves the function untouched when metrics are disabled."""
+    def decorator(func: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------- trace ids ----------
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def bind_trace_id(trace_id: Optional[str] = None) -> str:
+    """Attach a trace id to every log line of the current context (request, job) and return it."""
+    trace_id = trace_id or new_trace_id()
+    structlog.contextvars.clear_contextvars()
+    structlog.contextvars.bind_contextvars(trace_id=trace_id)
+    return trace_id
+
+
+def current_trace_id() -> Optional[str]:
+    return structlog.contextvars.get_contextvars().get("trace_id")
+
+
+def render_latest() -> str:
+    return REGISTRY.render() if METRICS_ENABLED else ""
@@ -1,17 +1,29 @@
 from dotenv import load_dotenv
+import json
 import os, sys
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_groq import ChatGroq
+import threading
+from typing import Any, Callable, Dict
 from utils.config_loader import load_config
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentPortalException
 
+# "live" -> OpenAI/Groq clients; "fake" -> offline hash embeddings + stub chat model (benchmarks, CI)
+PROVIDER_MODES = {"live", "fake"}
+
+# Clients are built once per process per distinct settings (config + provider env) and shared by every
+# ModelLoader: requests, index jobs and the startup warm-up all get the same instances
+_CLIENTS: Dict[tuple, Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+_CLIENT_ENV_PREFIXES = ("MODEL_PROVIDER", "LLM_", "FAKE_", "EMBEDDING_")
 
 
 class ModelLoader:
     def __init__(self) -> None:
         load_dotenv()
         self.log = CustomLogger().get_logger(__name__)
+        self.mode = os.getenv("MODEL_PROVIDER", "live").lower()
+        if self.mode not in PROVIDER_MODES:
+            raise DocumentPortalException(f"Unsupported MODEL_PROVIDER: {self.mode}", sys) #type: ignore
         self._validate_env()
         self.config = load_config("config/config.yaml")
         self.log.info("Configuration loaded successfully.", config_keys = list(self.config.keys()))
@@ -21,7 +33,7 @@ class ModelLoader:
         Validate that the required environment variables are set.
         Ensure API keys exist.
         """
-        required_vars = ["OPENAI_API_KEY", "GROQ_API_KEY"]
+        required_vars = [] if self.mode == "fake" else ["OPENAI_API_KEY", "GROQ_API_KEY"]
         self.api_keys = {var: os.getenv(var) for var in required_vars}
         missing_vars = [var for var, value in self.api_keys.items() if value is None]
         if missing_vars:
@@ -29,13 +41,41 @@ class ModelLoader:
             raise DocumentPortalException("Missing environment variables", sys) #type: ignore
         self.log.info("Environment variables validated successfully.", api_keys=list(self.api_keys.keys()))
 
+    def _shared(self, kind: str, build: Callable[[], Any]) -> Any:
+        env = tuple(sorted((k, v) for k, v in os.environ.items() if k.startswith(_CLIENT_ENV_PREFIXES)))
+        key = (kind, self.mode, json.dumps(self.config, sort_keys=True, default=str), env)
+        with _CLIENTS_LOCK:
+            client = _CLIENTS.get(key)
+        if client is None:
+            client = build()
+            with _CLIENTS_LOCK:
+                client = _CLIENTS.setdefault(key, client)
+        return client
+
     def load_embeddings(self):
         """
-        Load and return the embedding model.
+        Load and return the embedding model (shared by all loaders with the same settings).
         """
+        return self._shared("embeddings", self._load_embeddings)
+
+    def _load_embeddings(self):
         try:
+            if self.mode == "fake":
+                # the local hashing embedder at unigram settings: offline, deterministic, cheap
+                from utils.local_embeddings import LocalHashingEmbeddings
+                dim = int(self.config.get("fake", {}).get("embedding_dim", 256))
+                self.log.info("Loading hash embeddings (fake provider).", dim=dim)
+                return LocalHashingEmbeddings(n_features=dim, ngram_range=(1, 1), token_pattern=r"\w+")
+            block = self.config["embedding_model"]
+            provider = os.getenv("EMBEDDING_PROVIDER", block.get("provider", "OpenAI")).lower()
+            if provider == "local":
+                from utils.local_embeddings import LocalHashingEmbeddings
+                local_block = block.get("local", {})
+                self.log.info("Loading local hashing embeddings.", **local_block)
+                return LocalHashingEmbeddings.from_config(local_block)
+            from langchain_openai import OpenAIEmbeddings  # provider SDKs are imported on first use only
             self.log.info("Loading OpenAI embeddings model.")
-            model_name = self.config["embeddings_model"]["model_name"]
+            model_name = block["model_name"]
             return OpenAIEmbeddings(model=model_name)
         except Exception as e:
             self.log.error("Error loading model embeddings", error=str(e))
@@ -43,13 +83,85 @@ class ModelLoader:
 
     def load_llm(self):
         """
-        Load and return the language model.
+        Load and return the language model: one provider, or a HedgedChatModel
+        when two or more are configured (LLM_PROVIDERS / llm_router.providers,
+        or fake.providers in fake mode), made cancellable by request deadlines.
+        Shared by all loaders with the same settings.
         """
+        return self._shared("llm", lambda: self._cancellable(self._load_llm()))
 
-        llm_block = self.config["llm"]
+    def _cancellable(self, llm):
+        """Stop the model's calls when the current request's deadline expires or its client disconnects."""
+        if not (self.config.get("deadlines", {}) or {}).get("enabled", True):
+            return llm
+        from utils.deadline import CancellableChatModel
+        return CancellableChatModel(inner=llm, model_name=getattr(llm, "model_name", "llm"))
+
+    def _load_llm(self):
+        router = self.config.get("llm_router", {}) or {}
 
-        self.log.info("Loading LLM")
+        if self.mode == "fake":
+            specs = self.config.get("fake", {}).get("providers") or []
+            if len(specs) >= 2:
+                names = [str(spec.get("name", f"stub{i}")) for i, spec in enumerate(specs)]
+                return self._build_router(names, [self._governed(n, self._load_stub(spec))
+                                                  for n, spec in zip(names, specs)], router)
+            return self._governed("fake", self._load_stub({}))
+
+        keys = [k.strip() for k in os.getenv("LLM_PROVIDERS", ",".join(router.get("providers") or [])).split(",")
+                if k.strip()]
+        if len(keys) >= 2:
+            return self._build_router(keys, [self._governed(k, self._load_provider(k)) for k in keys], router)
         provider_key = os.getenv("LLM_PROVIDER", "OpenAI")
+        return self._governed(provider_key, self._load_provider(provider_key))
+
+    def _governed(self, budget: str, llm):
+        """Route the client's calls through the process-wide LLM governor when `budget` has limits configured."""
+        block = self.config.get("llm_governor", {}) or {}
+        if not block.get("enabled", True):
+            return llm
+        from utils.llm_governor import GovernedChatModel, get_governor
+        governor = get_governor(block)
+        if budget not in governor.budgets:
+            return llm
+        return GovernedChatModel(inner=llm, budget=budget, governor=governor,
+                                 model_name=getattr(llm, "model_name", budget))
+
+    def _load_stub(self, spec: dict):
+        """Stub chat model; `spec` (a fake.providers entry) overrides the fake block and FAKE_LLM_* env."""
+        from utils.fake_providers import StubChatModel
+        fake = self.config.get("fake", {})
+        params = {
+            "latency_ms": float(os.getenv("FAKE_LLM_LATENCY_MS", fake.get("llm_latency_ms", 0))),
+            "jitter_ms": float(os.getenv("FAKE_LLM_JITTER_MS", fake.get("llm_jitter_ms", 0))),
+            "ms_per_1k_tokens": float(os.getenv("FAKE_LLM_MS_PER_1K_TOKENS", fake.get("llm_ms_per_1k_tokens", 0))),
+            "malformed_rate": float(os.getenv("FAKE_LLM_MALFORMED_RATE", fake.get("llm_malformed_rate", 0))),
+        }
+        params.update({k: v for k, v in spec.items() if k != "name"})
+        if "name" in spec:
+            params["model_name"] = f"stub-{spec['name']}"
+        self.log.info("Loading stub LLM (fake provider).", **params)
+        return StubChatModel(**params)
+
+    def _build_router(self, names, providers, router: dict):
+        from utils.llm_router import HedgedChatModel
+        self.log.info("Loading hedged LLM router.", providers=names, hedge=router.get("hedge", True))
+        return HedgedChatModel(
+            providers=providers,
+            names=names,
+            model_name="+".join(getattr(p, "model_name", n) for p, n in zip(providers, names)),
+            hedge=bool(router.get("hedge", True)),
+            hedge_after_s=float(router.get("hedge_after_ms", 1500)) / 1000.0,
+            min_samples=int(router.get("min_samples", 20)),
+            timeout_s=float(router.get("timeout_s", 30)),
+            failure_threshold=int(router.get("failure_threshold", 3)),
+            cooldown_s=float(router.get("cooldown_s", 30)),
+        )
+
+    def _load_provider(self, provider_key: str):
+        llm_block = self.config["llm"]
+
+        self.log.info("Loading LLM", provider_key=provider_key)
 
         if provider_key not in llm_block:
             self.log.error("LLM provider not found in configuration", provider_key=provider_key)
@@ -63,6 +175,7 @@ class ModelLoader:
         provider = provider.lower()
 
         if provider == "groq":
+            from langchain_groq import ChatGroq  # only the configured provider's SDK gets imported
             llm = ChatGroq(
                 model=model_name,
                 api_key=self.api_keys["GROQ_API_KEY"], #type: ignore
@@ -72,6 +185,7 @@ class ModelLoader:
             return llm
         
         elif provider == "openai":
+            from langchain_openai import ChatOpenAI
             llm = ChatOpenAI(
                 model=model_name,
                 api_key=self.api_keys["OPENAI_API_KEY"], #type: ignore
@@ -82,5 +196,3 @@ class ModelLoader:
         else:
             self.log.error("Unsupported LLM provider", provider=provider)
             raise ValueError(f"Unsupported LLM provider: {provider}")
-
-    
\ No newline at end of file
@@ -0,0 +1,240 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from logger import GLOBAL_LOGGER as log
+from utils.metrics import REGISTRY
+
+STORAGE_BYTES = REGISTRY.gauge("docportal_storage_bytes", "Disk used by session directories at the last janitor scan",
+                               ("root",))
+STORAGE_SESSIONS = REGISTRY.gauge("docportal_storage_sessions", "Session directories at the last janitor scan", ("root",))
+SESSIONS_EVICTED = REGISTRY.counter("docportal_sessions_evicted_total", "Session directories removed by the janitor",
+                                    ("root",))
+
+
+@dataclass
+class SessionEntry:
+    path: Path
+    root: Path
+    size_bytes: int
+    last_access: float
+
+
+def _dir_size(path: Path, seen: Optional[Set[Tuple[int, int]]] = None) -> int:
+    """Bytes under `path`; a file whose inode is already in `seen` (a hardlinked blob) is not counted again."""
+    seen = set() if seen is None else seen
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                st = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            if st.st_nlink > 1:
+                inode = (st.st_dev, st.st_ino)
+                if inode in seen:
+                    continue
+                seen.add(inode)
+            total += st.st_size
+    return total
+
+
+class SessionJanitor:
+    """
+    Background cleanup for per-session directories (uploads, analysis/compare
+    sessions, FAISS indexes).
+
+    Every immediate sub-directory of a root is treated as one session. Access is
+    recorded with `touch()`; sessions never touched fall back to their mtime.
+    Each `run_once()` evicts sessions older than `max_age_seconds`, then the
+    least recently used ones until the total is under `max_total_bytes`, at
+    most `batch_size` per run so deletions never pile up behind requests.
+
+    Hardlinked blobs are counted once, charged to the most recently used
+    session that links them, so evicting the least recently used sessions
+    frees about what their size says. `on_evict` is called with each evicted
+    entry, e.g. to drop the session's vectors from a shared index. `in_use`
+    returns the names of sessions that must not be evicted whatever their
+    age, e.g. those with index jobs still queued or running.
+    """
+    def __init__(
+        self,
+        roots: Iterable[str | Path],
+        state_path: str | Path = "data/.janitor_state.json",
+        max_total_bytes: int = 5 * 1024 ** 3,
+        max_age_seconds: float = 72 * 3600,
+        min_idle_seconds: float = 600,
+        batch_size: int = 20,
+        interval_seconds: float = 60,
+        exclude: Iterable[str] = (),
+        blob_store=None,
+        on_evict: Optional[Callable[[SessionEntry], None]] = None,
+        in_use: Optional[Callable[[], Iterable[str]]] = None,
+    ):
+        self.roots = [Path(r) for r in roots]
+        self.state_path = Path(state_path)
+        self.max_total_bytes = max_total_bytes
+        self.max_age_seconds = max_age_seconds
+        self.min_idle_seconds = min_idle_seconds
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.exclude = set(exclude)
+        self.blob_store = blob_store  # orphaned blobs are collected after session evictions
+        self.on_evict = on_evict
+        self.in_use = in_use
+        self._lock = threading.Lock()
+        self._access: Dict[str, float] = self._load_state()
+        self._footprint: Dict[str, object] = {"total_bytes": 0, "sessions": 0, "roots": {}, "scanned_at": None}
+        self.evicted_total = 0
+
+    # ---------- access tracking ----------
+    def _load_state(self) -> Dict[str, float]:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8")) if self.state_path.exists() else {}
+        except Exception:
+            return {}
+
+    def _save_state(self):
+        with self._lock:
+            snapshot = dict(self._access)
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    def touch(self, *paths: str | Path):
+        """Record an access to one or more session directories (cheap, in-memory)."""
+        now = time.time()
+        with self._lock:
+            for p in paths:
+                if p:
+                    self._access[str(Path(p).resolve())] = now
+
+    # ---------- scanning ----------
+    def _is_session_dir(self, child: Path, resolved_roots: set) -> bool:
+        if not child.is_dir() or child.is_symlink():
+            return False
+        if child.name in self.exclude or child.name.startswith((".", "_")):
+            return False
+        return str(child.resolve()) not in resolved_roots  # nested roots (data/document_analysis) are scanned separately
+
+    def scan(self) -> List[SessionEntry]:
+        resolved_roots = {str(r.resolve()) for r in self.roots}
+        found: List[Tuple[Path, Path, float]] = []
+        with self._lock:
+            access = dict(self._access)
+        for root in self.roots:
+            if not root.is_dir():
+                continue
+            for child in root.iterdir():
+                if not self._is_session_dir(child, resolved_roots):
+                    continue
+                try:
+                    last = access.get(str(child.resolve())) or child.stat().st_mtime
+                except OSError:
+                    continue
+                found.append((child, root, last))
+
+        # most recent first, so a blob linked from several sessions is charged to the one evicted last
+        seen: Set[Tuple[int, int]] = set()
+        entries: List[SessionEntry] = []
+        per_root: Dict[str, Dict[str, int]] = {str(root): {"bytes": 0, "sessions": 0} for root in self.roots}
+        for child, root, last in sorted(found, key=lambda f: f[2], reverse=True):
+            size = _dir_size(child, seen)
+            entries.append(SessionEntry(path=child, root=root, size_bytes=size, last_access=last))
+            per_root[str(root)]["bytes"] += size
+            per_root[str(root)]["sessions"] += 1
+        for root, stats in per_root.items():
+            STORAGE_BYTES.set(stats["bytes"], root=root)
+            STORAGE_SESSIONS.set(stats["sessions"], root=root)
+        self._footprint = {
+            "total_bytes": sum(e.size_bytes for e in entries),
+            "sessions": len(entries),
+            "roots": per_root,
+            "scanned_at": time.time(),
+        }
+        return entries
+
+    def plan_evictions(self, entries: List[SessionEntry], now: Optional[float] = None,
+                       in_use: Iterable[str] = ()) -> List[SessionEntry]:
+        """
+        Expired sessions first, then LRU until under the size quota; recently
+        used sessions and those named in `in_use` are never picked.
+        """
+        now = now or time.time()
+        in_use = set(in_use)
+        candidates = sorted((e for e in entries
+                             if now - e.last_access >= self.min_idle_seconds and e.path.name not in in_use),
+                            key=lambda e: e.last_access)
+        expired = [e for e in candidates if now - e.last_access >= self.max_age_seconds]
+        chosen = {id(e) for e in expired}
+        total = sum(e.size_bytes for e in entries) - sum(e.size_bytes for e in expired)
+        plan = list(expired)
+        for e in candidates:
+            if total <= self.max_total_bytes:
+                break
+            if id(e) in chosen:
+                continue
+            plan.append(e)
+            total -= e.size_bytes
+        return plan
+
+    def footprint(self) -> Dict[str, object]:
+        """Footprint from the last scan, plus eviction counters."""
+        footprint = {**self._footprint, "evicted_total": self.evicted_total,
+                     "max_total_bytes": self.max_total_bytes, "max_age_seconds": self.max_age_seconds}
+        if self.blob_store is not None:
+            footprint["blobs"] = self.blob_store.footprint()
+        return footprint
+
+    # ---------- eviction ----------
+    def run_once(self) -> int:
+        in_use = self.in_use() if self.in_use is not None else ()
+        plan = self.plan_evictions(self.scan(), in_use=in_use)[: self.batch_size]
+        for e in plan:
+            shutil.rmtree(e.path, ignore_errors=True)
+            with self._lock:
+                self._access.pop(str(e.path.resolve()), None)
+            self.evicted_total += 1
+            SESSIONS_EVICTED.inc(root=str(e.root))
+            self._footprint["total_bytes"] = int(self._footprint["total_bytes"]) - e.size_bytes  # type: ignore
+            self._footprint["sessions"] = int(self._footprint["sessions"]) - 1  # type: ignore
+            root_stats = self._footprint["roots"].get(str(e.root))  # type: ignore
+            if root_stats:
+                root_stats["bytes"] -= e.size_bytes
+                root_stats["sessions"] -= 1
+                STORAGE_BYTES.set(root_stats["bytes"], root=str(e.root))
+                STORAGE_SESSIONS.set(root_stats["sessions"], root=str(e.root))
+            if self.on_evict is not None:
+                try:
+                    self.on_evict(e)
+                except Exception as err:
+                    log.error("Eviction hook failed", path=str(e.path), error=str(err))
+            log.info("Session evicted", path=str(e.path), size_bytes=e.size_bytes,
+                     idle_seconds=round(time.time() - e.last_access))
+        if self.blob_store is not None:
+            self.blob_store.gc(limit=self.batch_size)
+        self._save_state()
+        return len(plan)
+
+    async def run_forever(self):
+        """Loop for the FastAPI lifespan task; the blocking work runs in a worker thread."""
+        log.info("Session janitor started", roots=[str(r) for r in self.roots],
+                 max_total_bytes=self.max_total_bytes, max_age_seconds=self.max_age_seconds)
+        while True:
+            try:
+                evicted = await asyncio.to_thread(self.run_once)
+                if evicted:
+                    log.info("Session janitor pass complete", evicted=evicted, **{
+                        k: self._footprint[k] for k in ("total_bytes", "sessions")})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error("Session janitor pass failed", error=str(e))
+            await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+from logger import GLOBAL_LOGGER as log
+from utils.deadline import Deadline, RequestCancelled, current_deadline, deadline_scope
+from utils.metrics import REGISTRY
+
+SINGLE_FLIGHT_CALLS = REGISTRY.counter("docportal_single_flight_calls_total",
+                                       "Coalesced operations by role: leader ran the work, follower shared it",
+                                       ("flight", "role"))
+SINGLE_FLIGHT_DETACHED = REGISTRY.counter("docportal_single_flight_detached_total",
+                                          "Callers that stopped waiting (deadline/disconnect) while the work went on",
+                                          ("flight",))
+SINGLE_FLIGHT_ABANDONED = REGISTRY.counter("docportal_single_flight_abandoned_total",
+                                           "Shared operations cancelled because every caller had gone", ("flight",))
+
+T = TypeVar("T")
+
+# Off -> every call runs its own work (the behaviour before coalescing)
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+# how often a waiting follower re-checks its own request's deadline
+_POLL_SECONDS = 0.05
+
+
+def content_key(*parts: Any) -> str:
+    """Stable key for inputs too large to keep around as dict keys (prompts, page texts)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters", "deadline")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.deadline = Deadline()  # the work's own: cancelled only once every caller has gone
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution: the first caller
+    (leader) runs the work on its thread, later ones (followers) wait for its
+    result or error. Nothing is cached: once the work finishes, the next call
+    runs it again.
+
+    The work runs under the flight's own Deadline, not the leader's, so a
+    caller whose request is cancelled only stops waiting; the work is
+    cancelled (its LLM calls aborted) when the last caller has gone.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        if not SINGLE_FLIGHT_ENABLED:
+            return fn()
+        caller = current_deadline()
+        if caller is not None:
+            caller.check(self.name)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            flight.waiters += 1
+        SINGLE_FLIGHT_CALLS.inc(flight=self.name, role="leader" if leader else "follower")
+
+        unregister = (caller.on_cancel(lambda: self._leave(key, flight, caller))  # type: ignore[union-attr]
+                      if caller is not None else (lambda: None))
+        try:
+            if leader:
+                return self._run(key, flight, fn)
+            while not flight.done.wait(None if caller is None else _POLL_SECONDS):
+                if caller.cancelled:  # type: ignore[union-attr]
+                    raise RequestCancelled(caller.reason or "deadline", self.name)  # type: ignore[union-attr]
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        finally:
+            unregister()
+
+    def _run(self, key: Hashable, flight: _Flight, fn: Callable[[], T]) -> T:
+        try:
+            with deadline_scope(flight.deadline):
+                flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _leave(self, key: Hashable, flight: _Flight, caller: Deadline):
+        with self._lock:
+            flight.waiters -= 1
+            abandoned = flight.waiters == 0 and not flight.done.is_set()
+            if abandoned and self._flights.get(key) is flight:
+                del self._flights[key]  # later callers start fresh instead of joining cancelled work
+        if flight.done.is_set():
+            return
+        SINGLE_FLIGHT_DETACHED.inc(flight=self.name)
+        if abandoned:
+            SINGLE_FLIGHT_ABANDONED.inc(flight=self.name)
+            log.info("Shared operation abandoned by all callers", flight=self.name)
+            flight.deadline.cancel(caller.reason or "disconnect")
@@ -0,0 +1,398 @@
+from __future__ import annotations
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Union, get_args, get_origin
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, RootModel, ValidationError
+from logger import GLOBAL_LOGGER as log
+from utils.metrics import REGISTRY, span
+
+OUTPUT_PARSES = REGISTRY.counter("docportal_output_parses_total",
+                                 "Structured LLM outputs by the stage that produced valid JSON "
+                                 "(parser | local_repair | llm_fixer)", ("component", "stage"))
+OUTPUT_FIXES = REGISTRY.counter("docportal_output_fixes_total",
+                                "LLM outputs that failed to parse and went through OutputFixingParser", ("component",))
+SCHEMA_COERCIONS = REGISTRY.counter("docportal_output_schema_coercions_total",
+                                    "Parsed outputs that needed field renames or type coercion to fit the schema",
+                                    ("component",))
+
+NOT_AVAILABLE = "Not Available"  # same filler as utils.document_ops.NOT_AVAILABLE
+
+# Clients whose API has a JSON mode (response_format={"type": "json_object"})
+JSON_MODE_CLIENTS = {"ChatOpenAI", "AzureChatOpenAI", "ChatGroq"}
+
+_THINK_RE = re.compile(r"<think>.*?</think>", re.S | re.I)
+_FENCE_RE = re.compile(r"```[ \t]*(?:json|JSON|javascript|js)?[ \t]*\n?(.*?)(?:```|$)", re.S)
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_\-]*")
+_NUMBER_RE = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false",
+             "None": "null", "NaN": "null", "Infinity": "null", "undefined": "null"}
+_QUOTES = {'"': '"', "'": "'", "“": "”", "‘": "’"}
+_ESCAPES = set('"\\/bfnrtu')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+# ---------------------------------------------------------------- repair
+
+def extract_json_text(text: str) -> str:
+    """
+    The JSON part of an LLM reply: reasoning (<think>) blocks and markdown
+    fences dropped, then everything from the first { or [ to its matching
+    bracket (or to the end, when the reply was cut off).
+    """
+    text = _THINK_RE.sub("", text)
+    for block in _FENCE_RE.findall(text):
+        if "{" in block or "[" in block:
+            text = block
+            break
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise ValueError("No JSON object or array in the output")
+    depth, quote, escaped = 0, None, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch in _QUOTES:
+            quote = _QUOTES[ch]
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _next_significant(text: str, i: int) -> str:
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return text[i] if i < len(text) else ""
+
+
+def _normalize(text: str) -> str:
+    """
+    One pass over JSON-ish text that fixes what LLMs commonly get wrong:
+    single or curly quotes, Python literals (True/None), bare keys and words,
+    comments, trailing and missing commas, raw control characters and
+    invalid escapes in strings, unescaped inner quotes, and unclosed
+    strings/brackets of a truncated reply.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    i, n = 0, len(text)
+    after_value = False  # the last token ended a value (a comma or closer must follow)
+
+    def separate():
+        # two values in a row inside a container: the comma was forgotten
+        if after_value and stack:
+            out.append(",")
+
+    while i < n:
+        ch = text[i]
+        if ch in _QUOTES:
+            separate()
+            closer = _QUOTES[ch]
+            out.append('"')
+            i += 1
+            while i < n:
+                c = text[i]
+                if c == "\\" and i + 1 < n:
+                    nxt = text[i + 1]
+                    if nxt == "'":
+                        out.append("'")
+                    elif nxt in _ESCAPES:
+                        out.append(c + nxt)
+                    else:
+                        out.append("\\\\" + nxt)
+                    i += 2
+                    continue
+                if c == closer:
+                    # an inner quote is only the end of the string if JSON structure follows it
+                    if _next_significant(text, i + 1) in ("", ",", ":", "}", "]"):
+                        break
+                    out.append('\\"' if c == '"' else c)
+                elif c == '"':
+                    out.append('\\"')
+                elif c == "\n":
+                    out.append("\\n")
+                elif c == "\r":
+                    out.append("\\r")
+                elif c == "\t":
+                    out.append("\\t")
+                elif ord(c) < 0x20:
+                    out.append(" ")
+                else:
+                    out.append(c)
+                i += 1
+            out.append('"')
+            i += 1
+            after_value = True
+            continue
+        if ch == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if ch == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        if ch in "{[":
+            separate()
+            stack.append(_CLOSERS[ch])
+            out.append(ch)
+            after_value = False
+        elif ch in "}]":
+            while out and out[-1] == ",":
+                out.pop()
+            if stack and ch in stack:
+                while stack[-1] != ch:  # close whatever was left open inside
+                    out.append(stack.pop())
+                out.append(stack.pop())
+            after_value = True
+        elif ch == ",":
+            if after_value and _next_significant(text, i + 1) not in ("}", "]", ""):
+                out.append(",")
+            after_value = False
+        elif ch == ":":
+            out.append(":")
+            after_value = False
+        elif ch.isspace():
+            out.append(ch)
+        else:
+            number = _NUMBER_RE.match(text, i)
+            ident = _IDENT_RE.match(text, i)
+            separate()
+            if number and (ch.isdigit() or ch in "-."):
+                token = number.group()
+                out.append(("0" + token if token.startswith(".") else token).rstrip("."))
+                i = number.end()
+            elif ident:
+                word = ident.group()
+                if _next_significant(text, ident.end()) == ":":
+                    out.append(json.dumps(word))  # bare key
+                else:
+                    out.append(_LITERALS.get(word) or json.dumps(word))
+                i = ident.end()
+            else:
+                i += 1  # stray character
+                continue
+            after_value = True
+            continue
+        i += 1
+
+    text = "".join(out).rstrip()
+    while text.endswith(","):
+        text = text[:-1].rstrip()
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Any:
+    """
+    Parse an LLM reply that should have been JSON but is not quite: cheap,
+    local and deterministic. Raises ValueError when nothing usable is left.
+    """
+    candidate = extract_json_text(text)
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_normalize(candidate))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Could not repair JSON output: {e}") from e
+
+
+# ---------------------------------------------------------------- schema coercion
+
+def _squash(name: str) -> str:
+    return re.sub(r"[\s_\-]", "", name).lower()
+
+
+def _as_str(value: Any) -> str:
+    if value is None:
+        return NOT_AVAILABLE
+    if isinstance(value, (list, tuple)):
+        return "; ".join(_as_str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _coerce_value(value: Any, annotation: Any) -> Any:
+    origin, args = get_origin(annotation), get_args(annotation)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _coerce(value, annotation)
+    if origin in (list, List):
+        item = args[0] if args else Any
+        if value is None:
+            return []
+        if isinstance(value, str):
+            # "a\n- b" or one sentence where a list was asked for
+            lines = [line.strip(" -*•\t") for line in value.splitlines()]
+            value = [line for line in lines if line] or [value]
+        elif not isinstance(value, list):
+            value = [value]
+        return [_coerce_value(v, item) for v in value]
+    if origin is Union:
+        if value is None:
+            return NOT_AVAILABLE if str in args else None
+        if int in args and isinstance(value, float) and value.is_integer():
+            return int(value)
+        if int in args and isinstance(value, str) and value.strip().isdigit():
+            return int(value.strip())
+        if isinstance(value, (str, int)) and not isinstance(value, bool):
+            return value
+        return _as_str(value) if str in args else value
+    if annotation is str:
+        return value if isinstance(value, str) else _as_str(value)
+    if annotation is int and isinstance(value, (str, float)):
+        try:
+            return int(float(value))
+        except ValueError:
+            return value
+    return value
+
+
+def _missing(annotation: Any) -> Any:
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin in (list, List):
+        return []
+    if annotation is str or (origin is Union and str in args):
+        return NOT_AVAILABLE
+    return None
+
+
+def _coerce(data: Any, schema: type[BaseModel]) -> Any:
+    if issubclass(schema, RootModel):
+        annotation = schema.model_fields["root"].annotation
+        if get_origin(annotation) in (list, List) and isinstance(data, dict):
+            # JSON mode (objects only) or a chatty model: {"changes": [...]} or a bare single item
+            lists = [v for v in data.values() if isinstance(v, list)]
+            data = lists[0] if lists else [data]
+        return _coerce_value(data, annotation)
+
+    if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object for {schema.__name__}, got {type(data).__name__}")
+    if len(data) == 1 and isinstance(next(iter(data.values())), dict) and not set(data) & set(schema.model_fields):
+        data = next(iter(data.values()))  # {"metadata": {...}}
+    by_squashed = {_squash(k): k for k in data}
+    result: Dict[str, Any] = {}
+    for name, field in schema.model_fields.items():
+        key = name if name in data else by_squashed.get(_squash(name))
+        if key is None:
+            result[name] = field.default if not field.is_required() else _missing(field.annotation)
+        else:
+            result[name] = _coerce_value(data[key], field.annotation)
+    return result
+
+
+def coerce_to_schema(data: Any, schema: type[BaseModel]) -> Any:
+    """
+    Fit parsed JSON to a pydantic schema the way a lenient reader would:
+    field names matched case/underscore-insensitively, missing strings as
+    "Not Available", a string where a list belongs split into lines, numbers
+    and lists turned into strings where strings belong, an object that wraps
+    the expected array unwrapped. Returns plain JSON data (what
+    JsonOutputParser returns); raises ValueError if it still does not validate.
+    """
+    try:
+        return schema.model_validate(_coerce(data, schema)).model_dump()
+    except ValidationError as e:
+        raise ValueError(f"Output does not fit {schema.__name__}: {e}") from e
+
+
+# ---------------------------------------------------------------- pipeline
+
+def _message_text(message: Any) -> str:
+    content = getattr(message, "content", message)
+    if isinstance(content, list):  # content blocks
+        return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return str(content)
+
+
+def parse_structured(message: Any, parser: Any, fixing_parser: Any, component: str,
+                     local_repair: bool = True) -> Any:
+    """
+    Parse an LLM reply into the parser's pydantic schema, cheapest first:
+    the parser itself (already tolerant of fences and truncation), then
+    local repair, and only then `fixing_parser`, which costs another LLM
+    round trip. The result is coerced to the schema whichever stage produced
+    it; OUTPUT_PARSES counts the stages, OUTPUT_FIXES the LLM fixes.
+    """
+    schema = getattr(parser, "pydantic_object", None)
+    try:
+        with span(f"{component}.parse"):
+            data = parser.invoke(message)
+        stage = "parser"
+    except OutputParserException as error:
+        data, stage = None, "llm_fixer"
+        if local_repair:
+            try:
+                with span(f"{component}.local_repair"):
+                    data = repair_json(_message_text(message))
+                    if schema is not None:
+                        data = coerce_to_schema(data, schema)
+                stage = "local_repair"
+            except ValueError as e:
+                log.info("Local JSON repair failed; asking the LLM", component=component, error=str(e))
+        if stage == "llm_fixer":
+            OUTPUT_FIXES.inc(component=component)
+            with span(f"{component}.output_fix"):
+                data = fixing_parser.invoke(message)
+        else:
+            log.info("LLM output repaired locally", component=component, parse_error=str(error)[:200])
+    OUTPUT_PARSES.inc(component=component, stage=stage)
+
+    if schema is None or stage == "local_repair":
+        return data
+    try:
+        coerced = coerce_to_schema(data, schema)
+    except ValueError as e:
+        log.warning("LLM output does not fit the schema; returning it as parsed", component=component, error=str(e))
+        return data
+    if coerced != data:
+        SCHEMA_COERCIONS.inc(component=component)
+    return coerced
+
+
+def _clients(llm: Any) -> Iterator[Any]:
+    """The provider clients behind the governor/router wrappers."""
+    if hasattr(llm, "inner"):
+        yield from _clients(llm.inner)
+    elif isinstance(getattr(llm, "providers", None), list):
+        for provider in llm.providers:
+            yield from _clients(provider)
+    else:
+        yield llm
+
+
+def json_mode(llm: Any, enabled: bool = True, schema: Optional[type[BaseModel]] = None) -> Any:
+    """
+    `llm` bound to the provider's native JSON mode when every client behind
+    it supports one (the router/governor wrappers pass the kwarg through);
+    otherwise `llm` unchanged. JSON mode only ever returns an object, so it
+    stays off when `schema` is a top-level array (e.g. a RootModel list):
+    the model would have to invent a wrapper, and one list picked out of it
+    could miss items.
+    """
+    if schema is not None and schema.model_json_schema().get("type") == "array":
+        return llm
+    clients = list(_clients(llm))
+    if enabled and clients and all(type(c).__name__ in JSON_MODE_CLIENTS for c in clients):
+        return llm.bind(response_format={"type": "json_object"})
+    return llm
+
+
+def structured_output_settings(config: Optional[Dict[str, Any]]) -> Dict[str, bool]:
+    block = (config or {}).get("structured_output", {}) or {}
+    return {"native_json": bool(block.get("native_json", True)), "local_repair": bool(block.get("local_repair", True))}
@@ -0,0 +1,278 @@
+from __future__ import annotations
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from logger import GLOBAL_LOGGER as log
+from utils.metrics import REGISTRY, span
+
+RETRIEVAL_QUERIES = REGISTRY.counter("docportal_retrieval_queries_total",
+                                     "Queries answered by the retriever", ("mode",))
+RETRIEVAL_CHUNKS = REGISTRY.counter("docportal_retrieval_chunks_total",
+                                    "Chunks handed to the LLM as context", ("mode",))
+RETRIEVAL_TOKENS_SAVED = REGISTRY.counter("docportal_retrieval_tokens_saved_total",
+                                          "Estimated context tokens dropped by adaptive top-k")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); good enough for budgeting context."""
+    return max(1, len(text) // 4)
+
+
+def similarity(distance: float) -> float:
+    """Cosine similarity from a FAISS squared-L2 distance; every provider here yields unit-length vectors."""
+    return 1.0 - distance / 2.0
+
+
+@dataclass(frozen=True)
+class AdaptiveTopK:
+    """
+    Trim a ranked hit list (FAISS distances, best first) to the chunks that
+    are actually close to the query. The retriever's `k` is the ceiling; from
+    there the list is cut at the first hit whose cosine similarity is
+      - below `min_similarity`, or
+      - below `best * (1 - relative_drop)`,
+    or that would push the context past `token_budget` (estimated tokens),
+    but never below `min_k` hits. None disables a rule.
+    """
+    min_k: int = 1
+    min_similarity: Optional[float] = None
+    relative_drop: Optional[float] = None
+    token_budget: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, block: Optional[dict]) -> Optional["AdaptiveTopK"]:
+        """Policy from the `retriever.adaptive` config block; None when disabled."""
+        if not block or not block.get("enabled", False):
+            return None
+        return cls(min_k=int(block.get("min_k", 1)),
+                   min_similarity=block.get("min_similarity"),
+                   relative_drop=block.get("relative_drop"),
+                   token_budget=block.get("token_budget"))
+
+    def select(self, hits: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """The kept prefix of `hits`."""
+        if not hits:
+            return hits
+        floor = self.min_similarity if self.min_similarity is not None else float("-inf")
+        if self.relative_drop is not None:
+            floor = max(floor, similarity(hits[0][1]) * (1 - self.relative_drop))
+        kept, tokens = 0, 0
+        for doc, score in hits:
+            cost = estimate_tokens(doc.page_content)
+            if kept >= self.min_k and (similarity(score) < floor or
+                                       (self.token_budget is not None and tokens + cost > self.token_budget)):
+                break
+            kept += 1
+            tokens += cost
+        return hits[:kept]
+
+    def apply(self, hits: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """select() plus accounting: chunk/token-saved counters and a log line with the running average."""
+        kept = self.select(hits)
+        saved = sum(estimate_tokens(doc.page_content) for doc, _ in hits[len(kept):])
+        RETRIEVAL_QUERIES.inc(mode="adaptive")
+        RETRIEVAL_CHUNKS.inc(len(kept), mode="adaptive")
+        RETRIEVAL_TOKENS_SAVED.inc(saved)
+        queries = RETRIEVAL_QUERIES.value(mode="adaptive")
+        log.info("Adaptive top-k", fetched=len(hits), kept=len(kept), tokens_saved=saved,
+                 avg_chunks=round(RETRIEVAL_CHUNKS.value(mode="adaptive") / queries, 2) if queries else None,
+                 total_tokens_saved=int(RETRIEVAL_TOKENS_SAVED.value()))
+        return kept
+
+
+def _trim(hits: List[Tuple[Document, float]], policy: Optional[AdaptiveTopK]) -> List[Tuple[Document, float]]:
+    if policy is None:
+        RETRIEVAL_QUERIES.inc(mode="fixed")
+        RETRIEVAL_CHUNKS.inc(len(hits), mode="fixed")
+        return hits
+    return policy.apply(hits)
+
+
+def _id_selector(positions: np.ndarray):
+    """Build the cheapest FAISS IDSelector for a set of index positions."""
+    import faiss
+
+    lo, hi = int(positions.min()), int(positions.max()) + 1
+    if hi - lo == len(positions):
+        return faiss.IDSelectorRange(lo, hi)  # contiguous block (the common case)
+    return faiss.IDSelectorBatch(positions)
+
+
+def search_by_vectors(vs, vectors: Sequence[Sequence[float]], k: int,
+                      positions: Optional[np.ndarray] = None) -> List[List[Tuple[Document, float]]]:
+    """
+    Search a LangChain FAISS store with precomputed query vectors, all in one
+    `index.search` call. When `positions` is given only those index rows are
+    considered (FAISS ID selector), so one shared index can serve many sessions
+    without post-filtering. Returns one hit list per vector.
+    """
+    import faiss
+
+    empty: List[List[Tuple[Document, float]]] = [[] for _ in vectors]
+    if positions is not None:
+        if len(positions) == 0:
+            return empty
+        k = min(k, len(positions))
+    k = min(k, vs.index.ntotal)
+    if k <= 0 or not len(vectors):
+        return empty
+
+    queries = np.asarray(vectors, dtype=np.float32)
+    if positions is not None:
+        selector = _id_selector(positions)  # keep a reference for the duration of the search
+        scores, idx = vs.index.search(queries, k, params=faiss.SearchParameters(sel=selector))
+    else:
+        scores, idx = vs.index.search(queries, k)
+
+    results: List[List[Tuple[Document, float]]] = []
+    for row_idx, row_scores in zip(idx, scores):
+        hits: List[Tuple[Document, float]] = []
+        for pos, score in zip(row_idx, row_scores):
+            if pos == -1:
+                continue
+            doc = vs.docstore.search(vs.index_to_docstore_id[int(pos)])
+            if isinstance(doc, Document):
+                hits.append((doc, float(score)))
+        results.append(hits)
+    return results
+
+
+def search_by_vector(vs, vector: Sequence[float], k: int,
+                     positions: Optional[np.ndarray] = None) -> List[Tuple[Document, float]]:
+    """Single-vector form of search_by_vectors."""
+    return search_by_vectors(vs, [vector], k, positions)[0]
+
+
+class SessionScopedRetriever(BaseRetriever):
+    """
+    Retriever over a shared index restricted to the rows owned by one session.
+    `shard` must expose `vs`, `embeddings` and `positions(session_id)`.
+    """
+    shard: Any
+    session_id: str
+    k: int = 5
+    policy: Optional[AdaptiveTopK] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector = self.shard.embeddings.embed_query(query)
+        with self.shard.lock:
+            hits = search_by_vector(self.shard.vs, vector, self.k, self.shard.positions(self.session_id))
+        return [doc for doc, _ in _trim(hits, self.policy)]
+
+    def batch_documents(self, queries: List[str], k: Optional[int] = None) -> List[List[Document]]:
+        """All queries embedded in one call and searched in one FAISS call."""
+        with span("chat.batch_embed"):
+            vectors = self.shard.embeddings.embed_documents(queries)
+        with span("chat.batch_search"), self.shard.lock:
+            hits = search_by_vectors(self.shard.vs, vectors, k or self.k, self.shard.positions(self.session_id))
+        return [[doc for doc, _ in _trim(row, self.policy)] for row in hits]
+
+
+# Federated retrieval: FAISS releases the GIL while searching, so one pool serves all requests.
+FEDERATED_WORKERS = int(os.getenv("FEDERATED_SEARCH_WORKERS", "8"))
+# below this many vectors in total, pool dispatch costs more than the searches themselves
+FEDERATED_PARALLEL_MIN_VECTORS = int(os.getenv("FEDERATED_PARALLEL_MIN_VECTORS", "20000"))
+_FEDERATED_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def federated_pool() -> ThreadPoolExecutor:
+    global _FEDERATED_POOL
+    if _FEDERATED_POOL is None:
+        _FEDERATED_POOL = ThreadPoolExecutor(max_workers=FEDERATED_WORKERS, thread_name_prefix="federated-search")
+    return _FEDERATED_POOL
+
+
+class StoreTarget:
+    """A whole FAISS store (per-session directory) as one federated search target."""
+    def __init__(self, session_id: str, vs):
+        self.session_id = session_id
+        self.vs = vs
+
+    @property
+    def size(self) -> int:
+        return self.vs.index.ntotal
+
+    def search_many(self, vectors, k: int) -> List[List[Tuple[Document, float]]]:
+        return search_by_vectors(self.vs, vectors, k)
+
+
+class ShardTarget:
+    """One session's rows inside a shared-index shard."""
+    def __init__(self, session_id: str, shard):
+        self.session_id = session_id
+        self.shard = shard
+
+    @property
+    def size(self) -> int:
+        return len(self.shard.positions(self.session_id))
+
+    def search_many(self, vectors, k: int) -> List[List[Tuple[Document, float]]]:
+        with self.shard.lock:
+            return search_by_vectors(self.shard.vs, vectors, k, self.shard.positions(self.session_id))
+
+
+class FederatedRetriever(BaseRetriever):
+    """
+    One query over several session indexes: the query is embedded once, every
+    target is searched in parallel on a shared thread pool (inline when the
+    indexes are small), and the per-target top-k lists are heap-merged into a
+    global top-k (smallest L2 distance), then trimmed by `policy` if set.
+    Returned documents are copies carrying `session_id` and `score` metadata.
+    All targets must have been built with the same embedding model. A single
+    target is fine too; that is how adaptive top-k runs over one FAISS store.
+    """
+    targets: List[Any]
+    embeddings: Any
+    k: int = 5
+    policy: Optional[AdaptiveTopK] = None
+
+    def _merge(self, per_target: List[List[Tuple[Document, float]]], k: int) -> List[Document]:
+        tagged = ((score, t, doc) for t, hits in enumerate(per_target) for doc, score in hits)
+        best = heapq.nsmallest(k, tagged, key=lambda item: (item[0], item[1]))
+        kept = len(_trim([(doc, score) for score, _, doc in best], self.policy))  # a prefix of `best`
+        return [Document(page_content=doc.page_content,
+                         metadata={**(doc.metadata or {}), "session_id": self.targets[t].session_id, "score": score})
+                for score, t, doc in best[:kept]]
+
+    def _search_all(self, vectors, k: int) -> List[List[List[Tuple[Document, float]]]]:
+        """Per target, per vector hit lists."""
+        with span("chat.federated_search"):
+            if len(self.targets) < 2 or sum(t.size for t in self.targets) < FEDERATED_PARALLEL_MIN_VECTORS:
+                return [target.search_many(vectors, k) for target in self.targets]
+            return list(federated_pool().map(lambda target: target.search_many(vectors, k), self.targets))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        results = self._search_all([vector], self.k)
+        return self._merge([hits[0] for hits in results], self.k)
+
+    def batch_documents(self, queries: List[str], k: Optional[int] = None) -> List[List[Document]]:
+        k = k or self.k
+        with span("chat.batch_embed"):
+            vectors = self.embeddings.embed_documents(queries)
+        results = self._search_all(vectors, k)
+        return [self._merge([hits[q] for hits in results], k) for q in range(len(queries))]
+
+
+def retrieve_batch(retriever, queries: List[str], k: int) -> List[List[Document]]:
+    """
+    Documents for many queries at once: one embedding call and one multi-vector
+    FAISS search for session-scoped and FAISS vector-store retrievers; any other
+    retriever falls back to its own `batch()`.
+    """
+    if isinstance(retriever, (SessionScopedRetriever, FederatedRetriever)):
+        return retriever.batch_documents(queries, k)
+    vs = getattr(retriever, "vectorstore", None)
+    if vs is not None and hasattr(vs, "index") and hasattr(vs, "docstore"):
+        with span("chat.batch_embed"):
+            vectors = vs.embeddings.embed_documents(queries)
+        with span("chat.batch_search"):
+            hits = search_by_vectors(vs, vectors, k)
+        return [[doc for doc, _ in row] for row in hits]
+    return retriever.batch(queries)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from logger import GLOBAL_LOGGER as log
+from utils.metrics import REGISTRY
+
+WARM_START_SECONDS = REGISTRY.histogram("docportal_warm_start_seconds", "Duration of startup warm-up steps", ("step",))
+WARM_START_PRELOADED = REGISTRY.gauge("docportal_warm_start_preloaded_sessions",
+                                      "Sessions whose index was preloaded at startup")
+READY = REGISTRY.gauge("docportal_ready", "1 once the startup warm-up has finished (readiness), 0 before")
+
+
+class SessionUsage:
+    """
+    How hot each chat session is: an exponentially decayed query count
+    (`half_life_s`) plus the last use, persisted as JSON so the next process
+    knows which indexes to preload. Recording is in-memory; save() writes.
+    """
+    def __init__(self, state_path: str | Path, half_life_s: float = 24 * 3600, max_sessions: int = 10_000):
+        self.state_path = Path(state_path)
+        self.half_life_s = half_life_s
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._usage: Dict[str, List[float]] = self._load()  # session -> [score at last_used, last_used]
+
+    def _load(self) -> Dict[str, List[float]]:
+        try:
+            return json.loads(self.state_path.read_text(encoding="utf-8")) if self.state_path.exists() else {}
+        except Exception:
+            return {}
+
+    def _decayed(self, score: float, last_used: float, now: float) -> float:
+        return score * math.pow(0.5, max(0.0, now - last_used) / self.half_life_s)
+
+    def record(self, *session_ids: Optional[str]):
+        now = time.time()
+        with self._lock:
+            for sid in session_ids:
+                if sid:
+                    score, last = self._usage.get(sid, (0.0, now))
+                    self._usage[sid] = [self._decayed(score, last, now) + 1.0, now]
+                    self._dirty = True
+
+    def hottest(self, limit: int) -> List[str]:
+        """Sessions by decayed use, hottest first."""
+        now = time.time()
+        with self._lock:
+            scored = [(self._decayed(score, last, now), sid) for sid, (score, last) in self._usage.items()]
+        return [sid for _, sid in sorted(scored, reverse=True)[:limit]]
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            keep = sorted(self._usage.items(), key=lambda kv: kv[1][1], reverse=True)[:self.max_sessions]
+            self._usage, self._dirty = dict(keep), False
+            snapshot = dict(keep)
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+
+class WarmStart:
+    """
+    Readiness of the process: liveness is answered as soon as the server is
+    up, readiness once the warm-up steps (client construction, index
+    preloading, warm-up calls) have run. A failed step is logged and
+    skipped; it only means a colder first request.
+    """
+    def __init__(self):
+        self.ready = False
+        self.started = time.monotonic()
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        READY.set(0)
+
+    def step(self, name: str, fn: Callable[[], Any]) -> Any:
+        t0 = time.perf_counter()
+        try:
+            result = fn()
+            self.steps[name] = {"ok": True}
+            return result
+        except Exception as e:
+            self.steps[name] = {"ok": False, "error": str(e)}
+            log.warning("Warm-up step failed", step=name, error=str(e))
+            return None
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.steps[name]["seconds"] = round(elapsed, 3)
+            WARM_START_SECONDS.observe(elapsed, step=name)
+
+    def mark_ready(self, **details: Any):
+        self.steps.update(details)
+        self.ready = True
+        READY.set(1)
+        log.info("Service ready", warm_up_s=round(time.monotonic() - self.started, 3))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "uptime_s": round(time.monotonic() - self.started, 3), "warm_up": self.steps}
+
+
+def preload_within_budget(candidates: List[str], size_of: Callable[[str], int], load: Callable[[str], Any],
+                          budget_bytes: int) -> Dict[str, Any]:
+    """Load `candidates` in order while their summed size stays within `budget_bytes`; skips what does not fit."""
+    loaded, skipped, used = [], [], 0
+    for name in candidates:
+        try:
+            size = size_of(name)
+        except FileNotFoundError:
+            continue  # deleted since it was last used
+        if used + size > budget_bytes:
+            skipped.append(name)
+            continue
+        try:
+            load(name)
+        except Exception as e:
+            log.warning("Preload failed", session_id=name, error=str(e))
+            continue
+        loaded.append(name)
+        used += size
+    WARM_START_PRELOADED.set(len(loaded))
+    return {"preloaded": loaded, "skipped_over_budget": skipped, "bytes": used}